@@ -1,24 +1,40 @@
-import json
 import os
-from flask import Flask, jsonify, request, session
+import time
+from flask import Flask, Response, g, jsonify, request, session
+from flask import stream_with_context
 import uuid
+import click
 from flask_cors import CORS
 from config import API_KEY, SECRET_KEY  # RSA_PASSPHRASE
-from helpers import validate_api_key
-from helpers import add_user_to_session, load_sessions
-from helpers import load_subjects, is_duplicate_subject, save_subjects_atomic
-from helpers import load_students, is_duplicate_student, save_students_atomic
+from config import NAME_ENCRYPTION_FORMAT, STUDENTS_FILE, SUBJECTS_FILE
+from config import STORAGE_BACKEND, BASE_DIR, SESSION_TTL
+from config import USERS_FILE, STREAM_CHUNK_SIZE, BULK_MAX_ROWS
+from config import PAGE_MAX_LIMIT, STUDENTS_FORMAT, STUDENTS_BINARY_FILE
+from config import LOOKUP_MAX_IDS, STATS_AGE_BUCKET
+from file_cache import CachedFileVersion, CachedJsonFile, iter_chunks
+from helpers import validate_api_key, validate_student_input
+from helpers import encode_cursor, decode_cursor
+import metrics
+import serializer
+from session_store import create_session_store
 from datetime import timedelta
-from models import db
-from rsa_utils import generate_or_load_keys
+from models import db, outdated_tables
+from repository import StudentRepository, SubjectRepository, page_key
+from repository import WriteConflict, subject_age_counts
+from sql_repository import SqlStudentRepository, SqlSubjectRepository
+from rsa_utils import get_keys, encrypt_name_field
+from rsa_utils import decrypt_name_field, decrypt_name_fields, is_envelope
+from rsa_utils import name_cache, encrypt_name_fields, iter_decrypted
 from datetime import datetime
-from filelock import FileLock
-from typing import Dict, Union
+from typing import Dict, Iterator, Optional, Union
 
 APP_VERSION = "1.0.0"
 
 # Flask app; AWS expects the variable to be named 'application'
 application = Flask(__name__)
+# jsonify() and request.get_json() go through serializer.py (orjson when
+# installed)
+application.json = serializer.JSONProvider(application)
 CORS(
     application,
     supports_credentials=True,
@@ -31,12 +47,77 @@ application.config.from_object('config')
 # Initialize DB
 db.init_app(application)
 
-# Generate or load RSA keys (persisted in root/keys)
-private_key, public_key = generate_or_load_keys()
+# Generate or load RSA keys (persisted in root/keys); routes reuse the
+# cached pair through get_keys()
+get_keys()
+
+# Student/subject storage: indexed in-memory views of the JSON data files,
+# or the SQLAlchemy models
+DB_LOCK_PREFIX = os.path.join(BASE_DIR, "root/database/application.db")
+# Students snapshot file per STUDENTS_FORMAT
+STUDENTS_PATHS = {"json": STUDENTS_FILE, "binary": STUDENTS_BINARY_FILE}
+if STORAGE_BACKEND == "sqlite":
+    students_repo = SqlStudentRepository(f"{DB_LOCK_PREFIX}.students.lock")
+    subjects_repo = SqlSubjectRepository(f"{DB_LOCK_PREFIX}.subjects.lock")
+    if os.path.exists(DB_LOCK_PREFIX):
+        with application.app_context():
+            if outdated_tables():
+                application.logger.error(
+                    "The SQLite tables predate the current schema; run "
+                    "'flask --app application import-json' to recreate "
+                    "and fill them"
+                )
+else:
+    students_repo = StudentRepository(STUDENTS_PATHS[STUDENTS_FORMAT])
+    subjects_repo = SubjectRepository(SUBJECTS_FILE)
+
+# data/users.json, parsed and serialized once per file version
+users_file = CachedJsonFile(
+    USERS_FILE, dumps=lambda obj: application.json.dumps(obj)
+)
+
+# Storage for sessions created by /add_user_session
+session_store = create_session_store()
 
 # Secret key for Flask sessions
 application.secret_key = SECRET_KEY
-application.permanent_session_lifetime = timedelta(hours=1)
+application.permanent_session_lifetime = timedelta(seconds=SESSION_TTL)
+
+# Gauges read when /metrics is scraped
+metrics.register_gauge(
+    "name_cache", "Decrypted-name cache statistics.",
+    lambda: {k: v for k, v in name_cache.stats().items()
+             if not isinstance(v, bool)},
+    label="stat"
+)
+metrics.register_gauge(
+    "sessions", "Session store statistics.",
+    lambda: {k: v for k, v in session_store.stats().items()
+             if isinstance(v, (int, float))},
+    label="stat"
+)
+
+
+@application.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@application.after_request
+def record_request_duration(response):
+    """
+    Observe the request latency per route template. For streamed
+    responses this is the time until the response starts.
+    """
+    start = g.get("request_start")
+    if start is not None:
+        metrics.request_duration.observe(
+            time.perf_counter() - start,
+            request.url_rule.rule if request.url_rule else "<unmatched>",
+            request.method,
+            str(response.status_code)
+        )
+    return response
 
 
 @application.route("/", methods=["GET"])
@@ -54,16 +135,63 @@ def version():
     })
 
 
+@application.route("/metrics", methods=["GET"])
+def get_metrics():
+    """
+    Return this process's request, stage, FileLock and group-commit
+    histograms and cache/session gauges in the Prometheus text format.
+    """
+    return Response(metrics.render(),
+                    mimetype="text/plain; version=0.0.4")
+
+
+def send_cached(cached: CachedFileVersion) -> Response:
+    """
+    Answer with the prebuilt bodies of cached: the encoding picked from
+    Accept-Encoding, ETag and Last-Modified, and 304 Not Modified for a
+    matching conditional request.
+    """
+    encoding = request.accept_encodings.best_match(
+        [e for e in ("br", "gzip") if e in cached.bodies] + ["identity"],
+        default="identity"
+    )
+    body = cached.bodies[encoding]
+
+    # Stream large bodies instead of handing over one big buffer
+    if len(body) > STREAM_CHUNK_SIZE:
+        response = Response(iter_chunks(body, STREAM_CHUNK_SIZE),
+                            mimetype="application/json")
+        response.content_length = len(body)
+    else:
+        response = Response(body, mimetype="application/json")
+
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    # Each encoding is a different representation, so a different tag
+    response.set_etag(
+        cached.etag if encoding == "identity"
+        else f"{cached.etag}-{encoding}"
+    )
+    response.last_modified = cached.last_modified
+    return response.make_conditional(request)
+
+
 @application.route("/users", methods=["GET"])
 def get_users():
-    """Return list of users from data/users.json."""
+    """
+    Return list of users from data/users.json.
+
+    The file is parsed, serialized and compressed once per version, so a
+    request only picks prebuilt bytes. Responses carry ETag and
+    Last-Modified, conditional requests get 304 Not Modified, and gzip or
+    brotli bodies are served according to Accept-Encoding.
+    """
     try:
-        with open("data/users.json", "r", encoding="utf-8") as file:
-            users = json.load(file)
-        return jsonify(users), 200
+        return send_cached(users_file.get())
     except FileNotFoundError:
         return jsonify({"error": "users.json file not found"}), 404
-    except json.JSONDecodeError:
+    except serializer.JSONDecodeError:
         return jsonify({"error": "Error decoding JSON file"}), 500
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -93,8 +221,7 @@ def add_user_session():
 
         # --- 3. Check duplicate in users.json ---
         try:
-            with open("data/users.json", "r", encoding="utf-8") as file:
-                users = json.load(file)
+            users = users_file.get().data
         except FileNotFoundError:
             users = []
 
@@ -103,17 +230,20 @@ def add_user_session():
                 "error": "Email already exists in users database"
             }), 409
 
-        # --- 4. Check duplicate in session storage (sessions.json) ---
-        sessions = load_sessions()
-        if any(user.get("email")
-               == data["email"] for user in sessions.values()):
+        # --- 4. Check duplicate in session storage (email index) ---
+        if session_store.email_exists(data["email"]):
             return jsonify({
                 "error": "Email already exists in another session"
             }), 409
 
-        # --- 5. Add user to session (sessions.json) ---
-        session_id = add_user_to_session(data)
-        application.permanent_session_lifetime = timedelta(hours=1)
+        # --- 5. Add user to session storage ---
+        # The store re-checks the email atomically with the insert
+        session_id = session_store.add(data)
+        if session_id is None:
+            return jsonify({
+                "error": "Email already exists in another session"
+            }), 409
+        application.permanent_session_lifetime = timedelta(seconds=SESSION_TTL)
         session["session_id"] = session_id  # Save in Flask session
 
         return jsonify({
@@ -147,9 +277,8 @@ def get_user_info():
         if not session_id:
             return jsonify({"error": "Session ID required"}), 400
 
-        # Load sessions from file
-        sessions = load_sessions()
-        user_info = sessions.get(session_id)
+        # Look up the session in the session store
+        user_info = session_store.get(session_id)
         if not user_info:
             return jsonify({"error": "Session ID does not exist"}), 404
 
@@ -188,9 +317,6 @@ def add_subject() -> tuple[Dict[str, Union[str, bool]], int]:
     if validation_response:
         return validation_response
 
-    subjects_path = "data/subjects.json"
-    lock_path = f"{subjects_path}.lock"
-
     try:
         # Validate and sanitize input
         data = request.get_json()
@@ -205,34 +331,40 @@ def add_subject() -> tuple[Dict[str, Union[str, bool]], int]:
                 {"error": "Subject name too long (max 100 chars)"}
             ), 400
 
-        # Ensure data directory exists
-        os.makedirs(os.path.dirname(subjects_path), exist_ok=True)
-
-        # Thread-safe file operations
-        with FileLock(lock_path):
-            subjects = load_subjects(subjects_path)
-            # Check for duplicate subject name (case insensitive)
-            if is_duplicate_subject(subjects, subject_name):
-                return jsonify({"error": "Subject name already exists"}), 409
-
-            # Create and add new subject
-            subject_id = str(uuid.uuid4())
-            subject_entry = {
-                "subject_id": subject_id,
-                "subject_name": subject_name,
-                "created_at": datetime.utcnow().isoformat()
-            }
-            subjects.append(subject_entry)
+        # Check for duplicate subject name (case insensitive); checked
+        # again under the lock by the commit
+        def check_name(repo):
+            if repo.get_by_name(subject_name):
+                raise WriteConflict("Subject name already exists")
 
-            # Save changes atomically
-            if not save_subjects_atomic(subjects, subjects_path):
-                return jsonify({"error": "Failed to save subject"}), 500
+        try:
+            check_name(subjects_repo)
+        except WriteConflict as e:
+            return jsonify({"error": str(e)}), 409
 
-            return jsonify({
-                "message": "Subject added successfully",
-                "subject_id": subject_id,
-                "subject_name": subject_name
-            }), 201
+        # Create and add new subject
+        subject_id = str(uuid.uuid4())
+        subject_entry = {
+            "subject_id": subject_id,
+            "subject_name": subject_name,
+            "created_at": datetime.utcnow().isoformat()
+        }
+
+        # Save changes atomically (group commit)
+        try:
+            saved = subjects_repo.commit(
+                [{"op": "insert", "record": subject_entry}], check_name
+            )
+        except WriteConflict as e:
+            return jsonify({"error": str(e)}), 409
+        if not saved:
+            return jsonify({"error": "Failed to save subject"}), 500
+
+        return jsonify({
+            "message": "Subject added successfully",
+            "subject_id": subject_id,
+            "subject_name": subject_name
+        }), 201
 
     except Exception as e:
         application.logger.error(f"Error in add_subject: {str(e)}")
@@ -262,10 +394,6 @@ def add_student() -> tuple[Dict[str, Union[str, bool]], int]:
                 "error": "<error message>"
             }
     """
-    students_path = "data/students.json"
-    subjects_path = "data/subjects.json"
-    lock_path = f"{students_path}.lock"
-
     try:
         # --- 1. API Key Validation ---
         validation_response = validate_api_key()
@@ -273,92 +401,307 @@ def add_student() -> tuple[Dict[str, Union[str, bool]], int]:
             return validation_response
 
         # --- 2. Input Validation ---
-        data = request.get_json()
-        required_fields = ["name", "age", "email", "subject_id"]
-        if not data or not all(
-            field in data and data[field] for field in required_fields
-        ):
-            return jsonify(
-                {"error": "All fields are required and must be non-empty"}
-            ), 400
+        fields, error = validate_student_input(request.get_json())
+        if error:
+            return jsonify({"error": error}), 400
+
+        name = fields["name"]
+        email = fields["email"]
+        subject_id = fields["subject_id"]
+        age = fields["age"]
+
+        # --- 3. Validate Subject ID Existence ---
+        if not subjects_repo.get(subject_id):
+            return jsonify({"error": "Invalid subject_id"}), 404
 
-        name = str(data["name"]).strip()
-        email = str(data["email"]).strip().lower()
-        subject_id = str(data["subject_id"]).strip()
+        # --- 4. Early Duplicate Check (re-checked by the commit) ---
+        # Email index is keyed by lowercased email
+        def check_email(repo):
+            if repo.get_by_email(email):
+                raise WriteConflict("Email already exists")
 
-        # Robust age validation
-        age_raw = data.get("age")
         try:
-            age = int(age_raw)
-        except (TypeError, ValueError):
-            return jsonify({"error": "Age must be a positive integer"}), 400
+            check_email(students_repo)
+        except WriteConflict as e:
+            return jsonify({"error": str(e)}), 409
+
+        # --- 5. Encrypt Name & Build Entry (outside the lock) ---
+        _, public_key = get_keys()
+        student_id = str(uuid.uuid4())
+        student_entry = {
+            "student_id": student_id,
+            "name_encrypted": encrypt_name_field(name, public_key),
+            "age": age,
+            "email": email,
+            "subject_id": subject_id,
+            "created_at": datetime.utcnow().isoformat()
+        }
 
-        if not name or not email or not subject_id or age <= 0:
-            return jsonify({"error": "Invalid field values"}), 400
-        if len(name) > 100 or len(email) > 100:
-            return jsonify({"error": "Name/email too long"}), 400
+        # --- 6. Group Commit: Duplicate Check & Write under the lock ---
+        try:
+            saved = students_repo.commit(
+                [{"op": "insert", "record": student_entry}], check_email
+            )
+        except WriteConflict as e:
+            return jsonify({"error": str(e)}), 409
+        if not saved:
+            return jsonify({"error": "Failed to save student"}), 500
 
-        # --- 3. Validate Subject ID Existence ---
-        subjects = load_subjects(subjects_path)
-        if not any(s.get("subject_id") == subject_id for s in subjects):
-            return jsonify({"error": "Invalid subject_id"}), 404
+        return jsonify({
+            "message": "Student added successfully",
+            "student_id": student_id
+        }), 201
+
+    except Exception as e:
+        application.logger.error(
+            f"Error in add_student: {str(e)}", exc_info=True
+        )
+        return jsonify({"error": "Internal server error"}), 500
 
-        # --- 4. Thread-safe File Lock & Load Students ---
-        os.makedirs(os.path.dirname(students_path), exist_ok=True)
 
-        with FileLock(lock_path):
-            students = load_students(students_path)
+# Placeholder for an NDJSON line that is not valid JSON
+INVALID_JSON_ROW = object()
 
-            # Ensure all stored emails are compared in lowercase
-            students_lower = [
-                {**student, "email": student.get("email", "").lower()}
-                for student in students
-            ]
-            if is_duplicate_student(students_lower, email):
-                return jsonify({"error": "Email already exists"}), 409
-
-            # --- 5. RSA Encrypt Name ---
-            from rsa_utils import generate_or_load_keys, encrypt_name
-            _, public_key = generate_or_load_keys()
-            encrypted_name_bytes = encrypt_name(name, public_key)
-            # Store as hex for JSON compatibility
-            encrypted_name_b64 = encrypted_name_bytes.hex()
-
-            # --- 6. Create Student Entry ---
-            student_id = str(uuid.uuid4())
-            student_entry = {
-                "student_id": student_id,
-                "name_encrypted": encrypted_name_b64,
-                "age": age,
-                "email": email,
-                "subject_id": subject_id,
-                "created_at": datetime.utcnow().isoformat()
+
+def read_bulk_rows() -> Union[list, None]:
+    """
+    Read the rows of a bulk request: a JSON array, or NDJSON (one JSON
+    object per line) when Content-Type is application/x-ndjson. NDJSON is
+    read line by line from the request stream; a line that is not valid
+    JSON becomes INVALID_JSON_ROW so it can be reported per row.
+    """
+    if request.mimetype == "application/x-ndjson":
+        rows = []
+        for line in request.stream:
+            if not line.strip():
+                continue
+            try:
+                rows.append(serializer.loads(line))
+            except serializer.JSONDecodeError:
+                rows.append(INVALID_JSON_ROW)
+            if len(rows) > BULK_MAX_ROWS:
+                break
+        return rows
+
+    data = request.get_json(silent=True)
+    return data if isinstance(data, list) else None
+
+
+def student_row_conflict(fields: Dict) -> Optional[str]:
+    """
+    Return why a validated student row cannot be stored next to the
+    current subjects and students, or None. Bulk imports check rows with
+    it before encrypting and again under the students lock.
+    """
+    if not subjects_repo.get(fields["subject_id"]):
+        return "Invalid subject_id"
+    if students_repo.get_by_email(fields["email"]):
+        return "Email already exists"
+    return None
+
+
+@application.route("/students/bulk", methods=["POST"])
+def add_students_bulk() -> tuple[Dict[str, Union[str, int, list]], int]:
+    """
+    Add many students in one request.
+
+    Expected input: a JSON array of add_student bodies, or the same
+    objects as NDJSON (Content-Type: application/x-ndjson):
+        [
+            {"name": "<string>", "age": <int>, "email": "<string>",
+             "subject_id": "<uuid>"},
+            ...
+        ]
+
+    Rows are validated against the subject index and deduplicated by
+    email within the batch and against stored students. Names are
+    encrypted as one batch outside the lock, and all accepted rows are
+    written with a single lock acquisition and a single write; the
+    subject and email checks are repeated under the lock.
+
+    Returns:
+        tuple: (JSON response, HTTP status code)
+            Success (200): {
+                "created": <int>,
+                "failed": <int>,
+                "results": [
+                    {"index": 0, "status": "created", "student_id": "<uuid>"},
+                    {"index": 1, "status": "error", "error": "<message>"},
+                    ...
+                ]
             }
+            Error (400/401/403/413/500): {
+                "error": "<error message>"
+            }
+    """
+    try:
+        # --- 1. API Key Validation ---
+        validation_response = validate_api_key()
+        if validation_response:
+            return validation_response
+
+        # --- 2. Read Rows ---
+        rows = read_bulk_rows()
+        if rows is None:
+            return jsonify(
+                {"error": "Expected a JSON array or NDJSON body"}
+            ), 400
+        if len(rows) > BULK_MAX_ROWS:
+            return jsonify(
+                {"error": f"Too many rows (max {BULK_MAX_ROWS})"}
+            ), 413
+
+        # --- 3. Validate Rows (fields, subject index, batch duplicates) ---
+        results = [None] * len(rows)
+        accepted = []
+        batch_emails = set()
+        for index, row in enumerate(rows):
+            if row is INVALID_JSON_ROW:
+                fields, error = None, "Invalid JSON"
+            else:
+                fields, error = validate_student_input(row)
+            if not error:
+                error = student_row_conflict(fields)
+            if not error and fields["email"] in batch_emails:
+                error = "Duplicate email in batch"
+            if error:
+                results[index] = {
+                    "index": index, "status": "error", "error": error
+                }
+                continue
+            batch_emails.add(fields["email"])
+            accepted.append((index, fields))
+
+        # --- 4. Encrypt Names as a Batch (outside the lock) ---
+        _, public_key = get_keys()
+        encrypted_names = encrypt_name_fields(
+            (fields["name"] for _, fields in accepted), public_key
+        )
 
-            students.append(student_entry)
+        # --- 5. Single Lock Acquisition & Single Write ---
+        entries = []
+        with students_repo.lock():
+            created_at = datetime.utcnow().isoformat()
+            for (index, fields), encrypted_name in zip(
+                accepted, encrypted_names
+            ):
+                # Re-check against writes that landed since step 3,
+                # including subjects removed or replaced meanwhile
+                error = student_row_conflict(fields)
+                if error:
+                    results[index] = {
+                        "index": index, "status": "error", "error": error
+                    }
+                    continue
+                student_id = str(uuid.uuid4())
+                entries.append({
+                    "student_id": student_id,
+                    "name_encrypted": encrypted_name,
+                    "age": fields["age"],
+                    "email": fields["email"],
+                    "subject_id": fields["subject_id"],
+                    "created_at": created_at
+                })
+                results[index] = {
+                    "index": index,
+                    "status": "created",
+                    "student_id": student_id
+                }
+
+            if entries and not students_repo.insert_many(entries):
+                return jsonify({"error": "Failed to save students"}), 500
 
-            if not save_students_atomic(students, students_path):
-                return jsonify({"error": "Failed to save student"}), 500
-            return jsonify({
-                "message": "Student added successfully",
-                "student_id": student_id
-            }), 201
+        return jsonify({
+            "created": len(entries),
+            "failed": len(rows) - len(entries),
+            "results": results
+        }), 200
 
     except Exception as e:
         application.logger.error(
-            f"Error in add_student: {str(e)}", exc_info=True
+            f"Error in add_students_bulk: {str(e)}", exc_info=True
         )
         return jsonify({"error": "Internal server error"}), 500
 
 
+# Fields a students_by_subject caller may select with "fields"
+STUDENT_LIST_FIELDS = ("student_id", "name", "age", "email", "created_at")
+
+
+def read_page_params(data: Dict, allowed_fields: tuple) -> tuple:
+    """
+    Validate the "fields", "limit" and "cursor" of a paged student
+    request. Return (fields, limit, after, error): error is None, or the
+    message to answer with a 400 when a parameter is invalid.
+    """
+    fields = data.get("fields", allowed_fields)
+    if (not isinstance(fields, (list, tuple)) or
+            any(f not in allowed_fields for f in fields)):
+        return None, None, None, (
+            "fields must be a list of: " + ", ".join(allowed_fields)
+        )
+
+    limit = data.get("limit", PAGE_MAX_LIMIT)
+    if (isinstance(limit, bool) or not isinstance(limit, int) or
+            not 1 <= limit <= PAGE_MAX_LIMIT):
+        return None, None, None, (
+            f"limit must be an integer between 1 and {PAGE_MAX_LIMIT}"
+        )
+
+    after = None
+    if data.get("cursor") is not None:
+        after = decode_cursor(str(data["cursor"]))
+        if after is None:
+            return None, None, None, "Invalid cursor"
+    return fields, limit, after, None
+
+
+def render_students(records: list, fields) -> list:
+    """
+    Build the output of a page of student records, keeping only the
+    requested fields. Names are decrypted only when "name" is requested.
+    """
+    if "name" in fields:
+        private_key, _ = get_keys()
+        decrypted_names = decrypt_name_fields(
+            (s.get("name_encrypted", "") for s in records),
+            private_key,
+            error_value="<decryption error>"
+        )
+    else:
+        decrypted_names = [None] * len(records)
+
+    students_output = []
+    for s, decrypted_name in zip(records, decrypted_names):
+        student = {
+            "student_id": s["student_id"],
+            "name": decrypted_name,
+            "age": s["age"],
+            "email": s["email"],
+            "created_at": s.get("created_at", "N/A"),
+            "subject_id": s.get("subject_id")
+        }
+        students_output.append({f: student[f] for f in fields})
+    return students_output
+
+
 @application.route("/students_by_subject", methods=["POST"])
 def get_students_by_subject() -> tuple[Dict[str, Union[str, list]], int]:
     """
-    Retrieve all students enrolled in a particular subject.
+    Retrieve the students enrolled in a particular subject.
+
+    Without "limit" or "cursor" every student is returned in insertion
+    order. With either, students are returned one page at a time, ordered
+    by (created_at, student_id); pass the returned "next_cursor" back as
+    "cursor" to get the next page. Only the names on the page are
+    decrypted, and none at all when "fields" leaves out "name".
 
     Expected JSON input:
         {
-            "subject_id": "<uuid>"
+            "subject_id": "<uuid>",
+            "limit": <int>,                  # optional, 1..PAGE_MAX_LIMIT
+            "cursor": "<next_cursor>",       # optional
+            "fields": ["student_id", ...]    # optional, default all
         }
 
     Returns:
@@ -374,7 +717,8 @@ def get_students_by_subject() -> tuple[Dict[str, Union[str, list]], int]:
                     "created_at": "<timestamp>"
                 },
                 ...
-            ]
+            ],
+            "next_cursor": "<opaque string>" or null   # paginated only
         }
 
         Error (400/404/500):
@@ -382,9 +726,6 @@ def get_students_by_subject() -> tuple[Dict[str, Union[str, list]], int]:
             "error": "<error message>"
         }
     """
-    subjects_path = "data/subjects.json"
-    students_path = "data/students.json"
-
     try:
         # --- 1. API Key Validation ---
         validation_response = validate_api_key()
@@ -398,46 +739,317 @@ def get_students_by_subject() -> tuple[Dict[str, Union[str, list]], int]:
         if not subject_id:
             return jsonify({"error": "subject_id is required"}), 400
 
+        fields, limit, after, error = read_page_params(
+            data, STUDENT_LIST_FIELDS
+        )
+        if error:
+            return jsonify({"error": error}), 400
+        paginated = "limit" in data or "cursor" in data
+
         # --- 3. Validate Subject Exists ---
-        subjects = load_subjects(subjects_path)
-        if not any(s.get("subject_id") == subject_id for s in subjects):
+        if not subjects_repo.get(subject_id):
             return jsonify({"error": "Subject not found"}), 404
 
-        # --- 4. Load and Filter Students ---
-        students = load_students(students_path)
-        filtered_students = [
-            s for s in students if s.get("subject_id") == subject_id
-        ]
+        # --- 4. Look Up Students (subject index) ---
+        if paginated:
+            filtered_students, has_more = students_repo.page_by_subject(
+                subject_id, after, limit
+            )
+        else:
+            filtered_students = students_repo.by_subject(subject_id)
+            has_more = False
+
+        # --- 5. Decrypt Names on this page only, if requested ---
+        response = {
+            "subject_id": subject_id,
+            "students": render_students(filtered_students, fields)
+        }
+        if paginated:
+            response["next_cursor"] = (
+                encode_cursor(page_key(filtered_students[-1]))
+                if has_more else None
+            )
+        return jsonify(response), 200
+
+    except Exception as e:
+        application.logger.error(
+            f"Error in get_students_by_subject: {str(e)}", exc_info=True
+        )
+        return jsonify({"error": "Internal server error"}), 500
 
-        # --- 5. Decrypt Names ---
-        from rsa_utils import generate_or_load_keys, decrypt_name
-        private_key, _ = generate_or_load_keys()
 
-        students_output = []
-        for s in filtered_students:
-            try:
-                decrypted_name = decrypt_name(
-                                bytes.fromhex(s["name_encrypted"]), private_key
-                                )
-            except Exception:
-                decrypted_name = "<decryption error>"
-
-            students_output.append({
-                "student_id": s["student_id"],
-                "name": decrypted_name,
-                "age": s["age"],
-                "email": s["email"],
-                "created_at": s.get("created_at", "N/A")
-            })
+STUDENT_SEARCH_FIELDS = STUDENT_LIST_FIELDS + ("subject_id",)
+
+
+@application.route("/students/search", methods=["POST"])
+def search_students() -> tuple[Dict[str, Union[str, list]], int]:
+    """
+    Search students by subject, age range and email prefix.
+
+    Every filter is optional and the given ones must all match. Results
+    are returned one page at a time, ordered by (created_at, student_id);
+    pass the returned "next_cursor" back as "cursor" to get the next
+    page. Filters are answered from in-memory indexes (sorted age and
+    email lists, the subject index) and only the names on the page are
+    decrypted, and none at all when "fields" leaves out "name".
+
+    Expected JSON input:
+        {
+            "subject_id": "<uuid>",          # optional
+            "min_age": <int>,                # optional, inclusive
+            "max_age": <int>,                # optional, inclusive
+            "email_prefix": "<string>",      # optional, case insensitive
+            "limit": <int>,                  # optional, 1..PAGE_MAX_LIMIT
+            "cursor": "<next_cursor>",       # optional
+            "fields": ["student_id", ...]    # optional, default all
+        }
+
+    Returns:
+        Success (200):
+        {
+            "students": [
+                {
+                    "student_id": "<uuid>",
+                    "name": "<decrypted string>",
+                    "age": <int>,
+                    "email": "<string>",
+                    "created_at": "<timestamp>",
+                    "subject_id": "<uuid>"
+                },
+                ...
+            ],
+            "next_cursor": "<opaque string>" or null
+        }
+
+        Error (400/401/403/404/500):
+        {
+            "error": "<error message>"
+        }
+    """
+    try:
+        # --- 1. API Key Validation ---
+        validation_response = validate_api_key()
+        if validation_response:
+            return validation_response
+
+        # --- 2. Validate Input ---
+        data = request.get_json()
+
+        subject_id = data.get("subject_id")
+        if subject_id is not None:
+            subject_id = str(subject_id).strip()
+
+        ages = {}
+        for field in ("min_age", "max_age"):
+            value = data.get(field)
+            if value is not None and (isinstance(value, bool) or
+                                      not isinstance(value, int)):
+                return jsonify({"error": f"{field} must be an integer"}), 400
+            ages[field] = value
+        if (ages["min_age"] is not None and ages["max_age"] is not None and
+                ages["min_age"] > ages["max_age"]):
+            return jsonify({"error": "min_age exceeds max_age"}), 400
+
+        email_prefix = data.get("email_prefix")
+        if email_prefix is not None:
+            if not isinstance(email_prefix, str) or len(email_prefix) > 100:
+                return jsonify({"error": "Invalid email_prefix"}), 400
+            email_prefix = email_prefix.strip().lower()
+
+        fields, limit, after, error = read_page_params(
+            data, STUDENT_SEARCH_FIELDS
+        )
+        if error:
+            return jsonify({"error": error}), 400
+
+        # --- 3. Validate Subject Exists ---
+        if subject_id is not None and not subjects_repo.get(subject_id):
+            return jsonify({"error": "Subject not found"}), 404
+
+        # --- 4. Intersect the Filters (indexes) ---
+        found, has_more = students_repo.search(
+            subject_id=subject_id, min_age=ages["min_age"],
+            max_age=ages["max_age"], email_prefix=email_prefix,
+            after=after, limit=limit
+        )
 
+        # --- 5. Decrypt Names on this page only, if requested ---
         return jsonify({
-            "subject_id": subject_id,
-            "students": students_output
+            "students": render_students(found, fields),
+            "next_cursor": (encode_cursor(page_key(found[-1]))
+                            if has_more else None)
         }), 200
 
     except Exception as e:
         application.logger.error(
-            f"Error in get_students_by_subject: {str(e)}", exc_info=True
+            f"Error in search_students: {str(e)}", exc_info=True
+        )
+        return jsonify({"error": "Internal server error"}), 500
+
+
+def summarize_ages(count: int, ages: Dict[int, int], bucket: int) -> Dict:
+    """Build the statistics of one subject from its age counts."""
+    aged = sum(ages.values())
+    histogram: Dict[int, int] = {}
+    for age, n in ages.items():
+        start = age - age % bucket
+        histogram[start] = histogram.get(start, 0) + n
+    return {
+        "count": count,
+        "age_min": min(ages) if ages else None,
+        "age_max": max(ages) if ages else None,
+        "age_mean": (round(sum(a * n for a, n in ages.items()) / aged, 2)
+                     if aged else None),
+        "age_histogram": [
+            {"min_age": start, "max_age": start + bucket - 1,
+             "count": histogram[start]}
+            for start in sorted(histogram)
+        ]
+    }
+
+
+# GET /subjects response for one version of the subject catalog
+subjects_listing: Optional[CachedFileVersion] = None
+
+
+@application.route("/subjects", methods=["GET"])
+def get_subjects():
+    """
+    List every subject in the catalog.
+
+    Served from the subject repository's cache: the response is
+    serialized and compressed once per catalog version and only rebuilt
+    after subjects.json changes. Responses carry an ETag, and
+    conditional requests get 304 Not Modified.
+
+    Returns:
+        Success (200):
+        {
+            "subjects": [
+                {
+                    "subject_id": "<uuid>",
+                    "subject_name": "<string>",
+                    "created_at": "<timestamp>"
+                },
+                ...
+            ]
+        }
+
+        Error (401/403/500):
+        {
+            "error": "<error message>"
+        }
+    """
+    global subjects_listing
+    try:
+        # --- 1. API Key Validation ---
+        validation_response = validate_api_key()
+        if validation_response:
+            return validation_response
+
+        # --- 2. Reuse or Rebuild the Listing ---
+        version = subjects_repo.version()
+        cached = subjects_listing
+        if version is None or cached is None or cached.stamp != version:
+            subjects = subjects_repo.all()
+            body = (application.json.dumps({"subjects": subjects}) +
+                    "\n").encode("utf-8")
+            cached = CachedFileVersion(version, subjects, body, None)
+            if version is not None:
+                subjects_listing = cached
+
+        return send_cached(cached)
+
+    except Exception as e:
+        application.logger.error(
+            f"Error in get_subjects: {str(e)}", exc_info=True
+        )
+        return jsonify({"error": "Internal server error"}), 500
+
+
+@application.route("/subjects/stats", methods=["GET"])
+def get_subject_stats() -> tuple[Dict[str, Union[str, list]], int]:
+    """
+    Enrollment count and age statistics per subject.
+
+    Served from per-subject age counts that are kept up to date as
+    students are added, updated or moved between subjects, so no student
+    is read or decrypted per request.
+
+    Query parameters:
+        subject_id (str): optional, only this subject
+        bucket (int): optional, histogram bucket width in years
+                      (default STATS_AGE_BUCKET)
+
+    Returns:
+        Success (200):
+        {
+            "subjects": [
+                {
+                    "subject_id": "<uuid>",
+                    "subject_name": "<string>",
+                    "count": <int>,
+                    "age_min": <int> or null,
+                    "age_max": <int> or null,
+                    "age_mean": <float> or null,
+                    "age_histogram": [
+                        {"min_age": <int>, "max_age": <int>,
+                         "count": <int>},
+                        ...
+                    ]
+                },
+                ...
+            ]
+        }
+
+        Error (400/401/403/404/500):
+        {
+            "error": "<error message>"
+        }
+    """
+    try:
+        # --- 1. API Key Validation ---
+        validation_response = validate_api_key()
+        if validation_response:
+            return validation_response
+
+        # --- 2. Validate Input ---
+        subject_id = request.args.get("subject_id", "").strip()
+        try:
+            bucket = int(request.args.get("bucket", STATS_AGE_BUCKET))
+            if not 1 <= bucket <= 200:
+                raise ValueError
+        except ValueError:
+            return jsonify({
+                "error": "bucket must be an integer between 1 and 200"
+            }), 400
+
+        if subject_id:
+            subject = subjects_repo.get(subject_id)
+            if not subject:
+                return jsonify({"error": "Subject not found"}), 404
+            subjects = [subject]
+        else:
+            subjects = subjects_repo.all()
+
+        # --- 3. Read the Aggregates ---
+        stats = students_repo.subject_stats()
+        empty = {"count": 0, "ages": {}}
+
+        subjects_output = []
+        for s in subjects:
+            entry = stats.get(s.get("subject_id"), empty)
+            subjects_output.append({
+                "subject_id": s.get("subject_id"),
+                "subject_name": s.get("subject_name"),
+                **summarize_ages(entry["count"], entry["ages"], bucket)
+            })
+
+        return jsonify({"subjects": subjects_output}), 200
+
+    except Exception as e:
+        application.logger.error(
+            f"Error in get_subject_stats: {str(e)}", exc_info=True
         )
         return jsonify({"error": "Internal server error"}), 500
 
@@ -466,10 +1078,6 @@ def update_student() -> tuple[Dict[str, Union[str, bool]], int]:
                 "error": "<error message>"
             }
     """
-    students_path = "data/students.json"
-    subjects_path = "data/subjects.json"
-    lock_path = f"{students_path}.lock"
-
     try:
         # --- 1. API Key Validation ---
         validation_response = validate_api_key()
@@ -506,62 +1114,62 @@ def update_student() -> tuple[Dict[str, Union[str, bool]], int]:
 
         if subject_id is not None:
             subject_id = str(subject_id).strip()
-            subjects = load_subjects(subjects_path)
-            if not any(s.get("subject_id") == subject_id for s in subjects):
+            if not subjects_repo.get(subject_id):
                 return jsonify({"error": "Subject ID does not exist"}), 404
 
-        # --- 3. Load and update student record ---
-        os.makedirs(os.path.dirname(students_path), exist_ok=True)
-
-        with FileLock(lock_path):
-            students = load_students(students_path)
-            student_found = False
-
-            for student in students:
-                if student.get("student_id") == student_id:
-                    student_found = True
-
-                    if name:
-                        from rsa_utils import (
-                            generate_or_load_keys,
-                            encrypt_name
-                        )
-                        _, public_key = generate_or_load_keys()
-                        encrypted = encrypt_name(name.strip(), public_key)
-                        student["name_encrypted"] = encrypted.hex()
-
-                    if age:
-                        student["age"] = age
-
-                    if email:
-                        lower_email = email.strip().lower()
-                        for other in students:
-                            if (other.get("student_id") != student_id and
-                                    other.get("email", "").lower()
-                                    == lower_email):
-                                return jsonify(
-                                    {"error": "Email already exists"}
-                                ), 409
-                        student["email"] = lower_email
-
-                    if subject_id:
-                        student["subject_id"] = subject_id
-
-                    student["updated_at"] = datetime.utcnow().isoformat()
-                    break
-
-            if not student_found:
-                return jsonify({"error": "Student not found"}), 404
-
-            if not save_students_atomic(students, students_path):
-                return jsonify(
-                    {"error": "Failed to save student updates"}
-                ), 500
+        # --- 3. Build the changes (outside the lock) ---
+        # None of this depends on the stored record, so it is computed
+        # once; the checks that do run under the lock in step 4
+        if not students_repo.get(student_id):
+            return jsonify({"error": "Student not found"}), 404
 
-            return jsonify({
-                "message": "Student updated successfully",
-                "student_id": student_id
-            }), 200
+        changes = {}
+        if name:
+            _, public_key = get_keys()
+            changes["name_encrypted"] = encrypt_name_field(
+                name.strip(), public_key
+            )
+
+        if age:
+            changes["age"] = age
+
+        if email:
+            changes["email"] = email.strip().lower()
+
+        if subject_id:
+            changes["subject_id"] = subject_id
+
+        changes["updated_at"] = datetime.utcnow().isoformat()
+
+        # --- 4. Group Commit: Re-check & Write under the lock ---
+        student = None
+
+        def check(repo):
+            nonlocal student
+            student = repo.get(student_id)
+            if email:
+                other = repo.get_by_email(changes["email"])
+                if other and other.get("student_id") != student_id:
+                    raise WriteConflict("Email already exists")
+
+        try:
+            saved = students_repo.commit(
+                [{"op": "update", "key": student_id, "changes": changes}],
+                check
+            )
+        except WriteConflict as e:
+            return jsonify({"error": str(e)}), 409
+        if not saved:
+            return jsonify({"error": "Failed to save student updates"}), 500
+
+        if name and student:
+            # Drop the cached plaintext of the old name
+            name_cache.invalidate(student.get("name_encrypted", ""))
+
+        return jsonify({
+            "message": "Student updated successfully",
+            "student_id": student_id
+        }), 200
 
     except Exception as e:
         application.logger.error(
@@ -571,6 +1179,85 @@ def update_student() -> tuple[Dict[str, Union[str, bool]], int]:
         return jsonify({"error": "Internal server error"}), 500
 
 
+def export_student_lines(private_key) -> Iterator[str]:
+    """
+    Yield every student as an NDJSON line with the name decrypted,
+    reading the store incrementally and decrypting in pipelined batches.
+    """
+    dumps = application.json.dumps
+    for student, name in iter_decrypted(
+        students_repo.iter_records(), private_key,
+        error_value="<decryption error>"
+    ):
+        yield dumps({
+            "student_id": student.get("student_id"),
+            "name": name,
+            "age": student.get("age"),
+            "email": student.get("email"),
+            "subject_id": student.get("subject_id"),
+            "created_at": student.get("created_at"),
+            "updated_at": student.get("updated_at")
+        }) + "\n"
+
+
+@application.route("/students/export", methods=["GET"])
+def export_students():
+    """
+    Stream every student, with decrypted names, as NDJSON
+    (application/x-ndjson, one JSON object per line).
+
+    The students store is read incrementally and names are decrypted in
+    batches of EXPORT_BATCH_SIZE, so memory use does not grow with the
+    number of students. Lines are sent in chunks of about
+    STREAM_CHUNK_SIZE bytes.
+
+    Returns:
+        Success (200): one line per student
+        {"student_id": "<uuid>", "name": "<decrypted string>", "age": <int>,
+         "email": "<string>", "subject_id": "<uuid>",
+         "created_at": "<timestamp>", "updated_at": "<timestamp>"}
+
+        Error (401/403/500):
+        {
+            "error": "<error message>"
+        }
+    """
+    try:
+        # --- 1. API Key Validation ---
+        validation_response = validate_api_key()
+        if validation_response:
+            return validation_response
+
+        # --- 2. Stream Lines in Chunks ---
+        private_key, _ = get_keys()
+
+        def generate() -> Iterator[str]:
+            chunk, size = [], 0
+            try:
+                for line in export_student_lines(private_key):
+                    chunk.append(line)
+                    size += len(line)
+                    if size >= STREAM_CHUNK_SIZE:
+                        yield "".join(chunk)
+                        chunk, size = [], 0
+                if chunk:
+                    yield "".join(chunk)
+            except Exception as e:
+                # Headers are already sent; all we can do is stop early
+                application.logger.error(
+                    f"Error in export_students: {str(e)}", exc_info=True
+                )
+
+        return Response(stream_with_context(generate()),
+                        mimetype="application/x-ndjson")
+
+    except Exception as e:
+        application.logger.error(
+            f"Error in export_students: {str(e)}", exc_info=True
+        )
+        return jsonify({"error": "Internal server error"}), 500
+
+
 @application.route("/student/<student_id>", methods=["GET"])
 def get_student(student_id: str) -> tuple[Dict[str, Union[str, bool]], int]:
     """
@@ -596,34 +1283,28 @@ def get_student(student_id: str) -> tuple[Dict[str, Union[str, bool]], int]:
                 "error": "<error message>"
             }
     """
-    students_path = "data/students.json"
-
     try:
         # --- 1. API Key Validation ---
         validation_response = validate_api_key()
         if validation_response:
             return validation_response
 
-        # --- 2. Load Students File ---
-        students = load_students(students_path)
-        if not students:
+        # --- 2. Check Students Exist ---
+        if not students_repo.count():
             return jsonify({"error": "No students found"}), 404
 
-        # --- 3. Find Matching Student ---
-        student = next(
-            (s for s in students if s.get("student_id") == student_id), None
-        )
+        # --- 3. Find Matching Student (id index) ---
+        student = students_repo.get(student_id)
         if not student:
             return jsonify({"error": "Student not found"}), 404
 
         # --- 4. Decrypt Name ---
-        from rsa_utils import generate_or_load_keys, decrypt_name
-        private_key, _ = generate_or_load_keys()
+        private_key, _ = get_keys()
 
         try:
-            encrypted_name_hex = student.get("name_encrypted", "")
-            encrypted_name_bytes = bytes.fromhex(encrypted_name_hex)
-            decrypted_name = decrypt_name(encrypted_name_bytes, private_key)
+            decrypted_name = decrypt_name_field(
+                student.get("name_encrypted", ""), private_key
+            )
         except Exception:
             decrypted_name = "Decryption failed"
 
@@ -647,6 +1328,254 @@ def get_student(student_id: str) -> tuple[Dict[str, Union[str, bool]], int]:
         return jsonify({"error": "Internal server error"}), 500
 
 
+@application.route("/students/lookup", methods=["POST"])
+def lookup_students() -> tuple[Dict[str, Union[str, list]], int]:
+    """
+    Retrieve several students by ID in one request.
+
+    All ids are resolved in one pass over the id index and the names of
+    the students found are decrypted as one batch. Results come back in
+    the order of the request; an id that does not exist gets a
+    not-found entry in its place.
+
+    Expected JSON input:
+        {
+            "student_ids": ["<uuid>", ...]   # 1..LOOKUP_MAX_IDS ids
+        }
+
+    Returns:
+        Success (200):
+        {
+            "students": [
+                {
+                    "student_id": "<uuid>",
+                    "found": true,
+                    "name": "<decrypted name>",
+                    "age": <int>,
+                    "email": "<string>",
+                    "subject_id": "<uuid>",
+                    "created_at": "<timestamp>",
+                    "updated_at": "<timestamp>"
+                },
+                {"student_id": "<uuid>", "found": false},
+                ...
+            ],
+            "not_found": <int>
+        }
+
+        Error (400/401/403/500):
+        {
+            "error": "<error message>"
+        }
+    """
+    try:
+        # --- 1. API Key Validation ---
+        validation_response = validate_api_key()
+        if validation_response:
+            return validation_response
+
+        # --- 2. Validate Input ---
+        data = request.get_json()
+        student_ids = data.get("student_ids")
+        if (not isinstance(student_ids, list) or
+                not 1 <= len(student_ids) <= LOOKUP_MAX_IDS or
+                any(not isinstance(i, str) for i in student_ids)):
+            return jsonify({
+                "error": f"student_ids must be a list of 1 to "
+                         f"{LOOKUP_MAX_IDS} strings"
+            }), 400
+        student_ids = [i.strip() for i in student_ids]
+
+        # --- 3. Find Students (id index, one pass) ---
+        students = students_repo.get_many(student_ids)
+        found = [s for s in students if s]
+
+        # --- 4. Decrypt Names as one batch ---
+        private_key, _ = get_keys()
+        names = iter(decrypt_name_fields(
+            (s.get("name_encrypted", "") for s in found), private_key,
+            error_value="Decryption failed"
+        ))
+
+        # --- 5. Build Response in request order ---
+        results = []
+        for student_id, student in zip(student_ids, students):
+            if not student:
+                results.append({"student_id": student_id, "found": False})
+                continue
+            results.append({
+                "student_id": student.get("student_id"),
+                "found": True,
+                "name": next(names),
+                "age": student.get("age"),
+                "email": student.get("email"),
+                "subject_id": student.get("subject_id"),
+                "created_at": student.get("created_at"),
+                "updated_at": student.get("updated_at")
+            })
+
+        return jsonify({
+            "students": results,
+            "not_found": len(students) - len(found)
+        }), 200
+
+    except Exception as e:
+        application.logger.error(
+            f"Error in lookup_students: {str(e)}", exc_info=True
+        )
+        return jsonify({"error": "Internal server error"}), 500
+
+
+@application.cli.command("migrate-names")
+def migrate_names() -> None:
+    """
+    Rewrite the students store in place so every name_encrypted value uses
+    the envelope (v2) format. Legacy RSA hex values are decrypted and
+    re-encrypted; records that fail to decrypt are left untouched.
+
+    Usage: flask --app application migrate-names
+    """
+    if NAME_ENCRYPTION_FORMAT == "legacy":
+        raise SystemExit("NAME_ENCRYPTION_FORMAT is 'legacy'; nothing to do")
+
+    with students_repo.lock():
+        # Work on copies; repository records are shared and read-only
+        students = [dict(s) for s in students_repo.all()]
+        legacy = [
+            s for s in students
+            if s.get("name_encrypted") and not is_envelope(s["name_encrypted"])
+        ]
+        if not legacy:
+            print("No legacy records to migrate")
+            return
+
+        private_key, public_key = get_keys()
+        # Stored names are never empty, so "" marks a decryption failure
+        names = decrypt_name_fields(
+            (s["name_encrypted"] for s in legacy), private_key, error_value=""
+        )
+
+        migrated = failed = 0
+        for student, name in zip(legacy, names):
+            if not name:
+                failed += 1
+                continue
+            student["name_encrypted"] = encrypt_name_field(name, public_key)
+            migrated += 1
+
+        if migrated and not students_repo.replace_all(students):
+            raise SystemExit("Failed to save students")
+
+    print(f"Migrated {migrated} record(s), {failed} failed to decrypt")
+
+
+@application.cli.command("export-students")
+@click.option("--output", "-o", type=click.File("w", encoding="utf-8"),
+              default="-", help="File to write to (default: stdout).")
+def export_students_command(output) -> None:
+    """
+    Write every student, with decrypted names, as NDJSON; the same
+    output as GET /students/export.
+
+    Usage: flask --app application export-students [-o students.ndjson]
+    """
+    private_key, _ = get_keys()
+    for line in export_student_lines(private_key):
+        output.write(line)
+
+
+@application.cli.command("compact-storage")
+def compact_storage() -> None:
+    """
+    Fold the write-ahead logs into students.json/subjects.json
+    (STORAGE_MODE=wal only).
+
+    Usage: flask --app application compact-storage
+    """
+    for repo in (students_repo, subjects_repo):
+        if repo.compact():
+            print(f"Compacted {repo.file_path}")
+
+
+@application.cli.command("convert-students")
+@click.option("--to", "target", type=click.Choice(["json", "binary"]),
+              required=True, help="Format to convert to.")
+def convert_students(target: str) -> None:
+    """
+    Convert the students store between data/students.json and the binary
+    data/students.bin, folding in the write-ahead log (STORAGE_MODE=wal).
+    The source file is left in place; set STUDENTS_FORMAT to the new
+    format afterwards.
+
+    Usage: flask --app application convert-students --to binary|json
+    """
+    source_format = "json" if target == "binary" else "binary"
+    source = StudentRepository(STUDENTS_PATHS[source_format],
+                               fmt=source_format)
+    destination = StudentRepository(STUDENTS_PATHS[target], fmt=target)
+    with source.lock(), destination.lock():
+        students = source.all()
+        if not destination.replace_all(students):
+            raise SystemExit(f"Could not write {destination.file_path}")
+    print(f"Converted {len(students)} student(s) to {destination.file_path}")
+
+
+@application.cli.command("subject-stats")
+@click.option("--bucket", type=click.IntRange(1, 200),
+              default=STATS_AGE_BUCKET, help="Histogram bucket width.")
+def subject_stats_command(bucket: int) -> None:
+    """
+    Recompute the per-subject statistics of GET /subjects/stats from the
+    students store, without the cached aggregates, and print them as
+    JSON.
+
+    Usage: flask --app application subject-stats [--bucket 5]
+    """
+    stats = subject_age_counts(students_repo.iter_records())
+    print(serializer.dumps({
+        subject_id: summarize_ages(entry["count"], entry["ages"], bucket)
+        for subject_id, entry in stats.items()
+    }, indent=4, sort_keys=True))
+
+
+@application.cli.command("import-json")
+@click.option("--reset", is_flag=True,
+              help="Drop and recreate the tables before importing.")
+def import_json(reset: bool) -> None:
+    """
+    Load data/subjects.json and data/students.json (students.bin with
+    STUDENTS_FORMAT=binary) into the SQLite database
+    (STORAGE_BACKEND=sqlite). Existing rows are replaced. Tables left
+    from an older schema are recreated; --reset recreates all of them.
+
+    Usage: flask --app application import-json [--reset]
+    """
+    os.makedirs(os.path.join(BASE_DIR, "root/database"), exist_ok=True)
+    if reset:
+        db.drop_all()
+    else:
+        outdated = outdated_tables()
+        if outdated:
+            print(f"Recreating tables with an old schema: "
+                  f"{', '.join(outdated)}")
+            # Students reference subjects; drop both together
+            db.drop_all()
+    db.create_all()
+
+    subjects = SubjectRepository(SUBJECTS_FILE).all()
+    students = StudentRepository(STUDENTS_PATHS[STUDENTS_FORMAT]).all()
+
+    # Students reference subjects, so clear them first
+    sql_students = SqlStudentRepository(f"{DB_LOCK_PREFIX}.students.lock")
+    sql_subjects = SqlSubjectRepository(f"{DB_LOCK_PREFIX}.subjects.lock")
+    if not (sql_students.replace_all([]) and
+            sql_subjects.replace_all(subjects) and
+            sql_students.replace_all(students)):
+        raise SystemExit("Import failed")
+
+    print(f"Imported {len(subjects)} subject(s), {len(students)} student(s)")
+
+
 if __name__ == "__main__":
     with application.app_context():
         os.makedirs("root/database", exist_ok=True)
@@ -0,0 +1,184 @@
+"""
+asgi.py
+
+ASGI entry point for the Flask application in application.py, e.g.:
+
+    uvicorn asgi:app --workers 4
+
+The event loop only accepts connections and moves request and response
+bytes. Every request runs the unchanged Flask view on a bounded thread
+pool (ASGI_THREADS), so file I/O, FileLock waits and RSA/AES work never
+block the loop, and responses are exactly those of the WSGI build. A slow
+or idle client costs a coroutine instead of a worker: the request body is
+received on the loop before a pool thread is taken, and streamed
+responses (/students/export, large /users bodies) are pulled from the
+pool one chunk at a time as the client accepts them, and no longer once
+it has disconnected.
+
+asgiref's WsgiToAsgi is not used: it runs every request on one shared
+thread (sync_to_async is thread sensitive by default), which would
+serialize the views this module exists to run side by side.
+"""
+
+import asyncio
+import contextvars
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+from application import application
+from config import ASGI_THREADS
+
+# Marks the end of a WSGI response iterator
+_END = object()
+
+
+class WsgiToAsgi:
+    """Serve a WSGI application over ASGI (HTTP and lifespan scopes)."""
+
+    def __init__(self, wsgi_app: Callable, threads: int = ASGI_THREADS):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix="asgi"
+        )
+
+    async def __call__(self, scope: Dict, receive: Callable,
+                       send: Callable) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+        else:
+            raise NotImplementedError(f"Unsupported scope {scope['type']}")
+
+    async def _lifespan(self, receive: Callable, send: Callable) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope: Dict, receive: Callable,
+                    send: Callable) -> None:
+        # Receive the whole body on the loop before taking a pool thread
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        loop = asyncio.get_running_loop()
+        # Every step of the request runs in one context, whichever pool
+        # thread picks it up, so Flask's context variables (including
+        # those of stream_with_context generators) carry over
+        context = contextvars.copy_context()
+        environ = self._environ(scope, bytes(body))
+        response: Dict = {}
+
+        def start_response(status: str, headers: List[Tuple[str, str]],
+                           exc_info=None):
+            if exc_info and "sent" in response:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [
+                (name.lower().encode("latin-1"), value.encode("latin-1"))
+                for name, value in headers
+            ]
+
+        def start() -> Tuple[Iterable[bytes], Iterator[bytes], object]:
+            result = self.wsgi_app(environ, start_response)
+            chunks = iter(result)
+            return result, chunks, next(chunks, _END)
+
+        # The body has been read, so the only message left to receive is
+        # the disconnect; stop streaming when it comes
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect() -> None:
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        watcher = asyncio.create_task(watch_disconnect())
+        result = None
+        try:
+            result, chunks, chunk = await loop.run_in_executor(
+                self.executor, context.run, start
+            )
+            response["sent"] = True
+            await send({
+                "type": "http.response.start",
+                "status": response["status"],
+                "headers": response["headers"]
+            })
+            while chunk is not _END and not disconnected.is_set():
+                if chunk:
+                    await send({"type": "http.response.body",
+                                "body": chunk, "more_body": True})
+                chunk = await loop.run_in_executor(
+                    self.executor, context.run, next, chunks, _END
+                )
+            if not disconnected.is_set():
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            watcher.cancel()
+            if result is not None and hasattr(result, "close"):
+                # Flask tears down the request context in close()
+                await loop.run_in_executor(
+                    self.executor, context.run, result.close
+                )
+
+    @staticmethod
+    def _environ(scope: Dict, body: bytes) -> Dict:
+        """Build the WSGI environ for an ASGI http scope."""
+        server = scope.get("server") or ("localhost", 80)
+        client = scope.get("client") or ("", 0)
+        root_path = scope.get("root_path", "")
+        path = scope["path"]
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            # WSGI carries paths as latin-1 decoded bytes
+            "SCRIPT_NAME": root_path.encode("utf-8").decode("latin-1"),
+            "PATH_INFO": path.encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+            "SERVER_NAME": server[0],
+            "SERVER_PORT": str(server[1]),
+            "REMOTE_ADDR": client[0],
+            "REMOTE_PORT": str(client[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": True,
+            "wsgi.run_once": False
+        }
+        for name, value in scope.get("headers", []):
+            name = name.decode("latin-1")
+            value = value.decode("latin-1")
+            if name == "content-length":
+                continue
+            if name == "content-type":
+                environ["CONTENT_TYPE"] = value
+                continue
+            key = "HTTP_" + name.upper().replace("-", "_")
+            if key in environ:
+                separator = "; " if name == "cookie" else ","
+                value = environ[key] + separator + value
+            environ[key] = value
+        return environ
+
+
+app = WsgiToAsgi(application)
@@ -0,0 +1,12 @@
+"""
+benchmarks
+
+Standalone performance scripts for the API and its helpers. Run from the
+repository root, e.g. ``python -m benchmarks.bench_decrypt``.
+
+``python -m benchmarks.run`` is the reproducible suite: it generates
+seeded datasets (benchmarks.datasets), runs the helper microbenchmarks
+(bench_micro) and every route through the test client (bench_routes),
+and writes the results as JSON; ``python -m benchmarks.compare base.json
+head.json`` flags regressions between two such files.
+"""
@@ -0,0 +1,231 @@
+"""
+bench_asgi.py
+
+Compares how many concurrent clients the WSGI build (application.py on
+sync workers) and the ASGI build (asgi.py) sustain, at increasing numbers
+of concurrent clients sending POST /students_by_subject.
+
+Each client can be made slow with --client-delay-ms: its request body
+arrives that long after the headers, as it would from a mobile or
+distant client. A sync worker is held for that whole time, while the
+ASGI build only waits on the event loop.
+
+By default both builds run in-process on a scratch data directory with a
+throwaway key pair: the WSGI build as --sync-workers threads (a sync
+server with that many workers) and the ASGI build as asgi.app on an
+event loop. With --wsgi-url/--asgi-url the same load is sent over HTTP
+to running servers, e.g. ``gunicorn -w 4 application:application`` and
+``uvicorn asgi:app --workers 4``.
+
+Usage:
+    python -m benchmarks.bench_asgi [--concurrency 8 32 128]
+        [--requests 4] [--client-delay-ms 50] [--sync-workers 8]
+        [--wsgi-url http://127.0.0.1:8000] [--asgi-url http://...]
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+import urllib.parse
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+def wsgi_request(app, path: str, body: bytes, api_key: str,
+                 delay: float) -> int:
+    """Call the WSGI app directly, as a sync server worker would."""
+    # The worker is held while the slow client's body trickles in
+    time.sleep(delay)
+    environ = {
+        "REQUEST_METHOD": "POST", "SCRIPT_NAME": "", "PATH_INFO": path,
+        "QUERY_STRING": "", "SERVER_NAME": "bench", "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1", "CONTENT_TYPE": "application/json",
+        "CONTENT_LENGTH": str(len(body)), "HTTP_X_API_KEY": api_key,
+        "wsgi.version": (1, 0), "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(body), "wsgi.errors": io.StringIO(),
+        "wsgi.multithread": True, "wsgi.multiprocess": False,
+        "wsgi.run_once": False
+    }
+    status = []
+    result = app(environ, lambda s, h, e=None: status.append(int(s[:3])))
+    try:
+        for _ in result:
+            pass
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return status[0]
+
+
+async def asgi_request(app, path: str, body: bytes, api_key: str,
+                       delay: float) -> int:
+    """Call the ASGI app directly, as an ASGI server would."""
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "root_path": "",
+        "query_string": b"", "server": ("bench", 80),
+        "client": ("127.0.0.1", 0),
+        "headers": [(b"content-type", b"application/json"),
+                    (b"x-api-key", api_key.encode("latin-1"))]
+    }
+    sent_body = False
+    status = []
+
+    async def receive():
+        nonlocal sent_body
+        if sent_body:
+            return {"type": "http.disconnect"}
+        sent_body = True
+        await asyncio.sleep(delay)
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await app(scope, receive, send)
+    return status[0]
+
+
+async def http_request(url: str, path: str, body: bytes, api_key: str,
+                       delay: float) -> int:
+    """Send one request over a fresh connection, body after delay."""
+    parts = urllib.parse.urlsplit(url)
+    reader, writer = await asyncio.open_connection(
+        parts.hostname, parts.port or 80
+    )
+    try:
+        writer.write(
+            f"POST {path} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+            f"Content-Type: application/json\r\nX-API-Key: {api_key}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+            .encode("latin-1")
+        )
+        await writer.drain()
+        await asyncio.sleep(delay)
+        writer.write(body)
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def run_level(call, clients: int, requests: int) -> tuple:
+    """Run clients concurrent clients, requests each; return stats."""
+    latencies = []
+    errors = 0
+
+    async def client():
+        nonlocal errors
+        for _ in range(requests):
+            start = time.perf_counter()
+            try:
+                status = await call()
+            except Exception:
+                status = None
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return time.perf_counter() - start, latencies, errors
+
+
+def report(name: str, clients: int, elapsed: float, latencies,
+           errors: int) -> None:
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name:<6} {clients:>8} {len(latencies) / elapsed:>10.0f} "
+          f"{statistics.median(latencies) * 1000:>9.1f} "
+          f"{p99 * 1000:>9.1f} {errors:>7}")
+
+
+def prepare(api_key: str) -> str:
+    """Set up a scratch data directory; return a subject_id to query."""
+    os.chdir(tempfile.mkdtemp(prefix="bench-asgi-"))
+    os.environ.setdefault("API_KEY", api_key)
+    os.environ.setdefault("SECRET_SESSION_KEY", "bench")
+    import application
+    client = application.application.test_client()
+    headers = {"x-api-key": os.environ["API_KEY"]}
+    subject_id = client.post(
+        "/add_subject", json={"subject_name": "Bench"}, headers=headers
+    ).get_json()["subject_id"]
+    client.post("/students/bulk", headers=headers, json=[
+        {"name": f"Student {i}", "age": 20, "email": f"s{i}@bench.example",
+         "subject_id": subject_id}
+        for i in range(50)
+    ])
+    return subject_id
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--concurrency", type=int, nargs="+",
+                        default=[8, 32, 128])
+    parser.add_argument("--requests", type=int, default=4,
+                        help="Requests per client")
+    parser.add_argument("--client-delay-ms", type=float, default=50)
+    parser.add_argument("--sync-workers", type=int, default=8,
+                        help="Workers of the in-process WSGI build")
+    parser.add_argument("--wsgi-url", default=None)
+    parser.add_argument("--asgi-url", default=None)
+    parser.add_argument("--subject-id", default=None,
+                        help="Subject to query on the servers")
+    parser.add_argument("--api-key", default=os.getenv("API_KEY", "bench"))
+    args = parser.parse_args()
+
+    delay = args.client_delay_ms / 1000
+    path = "/students_by_subject"
+    if args.wsgi_url or args.asgi_url:
+        api_key = args.api_key
+        subject_id = args.subject_id or str(uuid.uuid4())
+    else:
+        subject_id = prepare(args.api_key)
+        api_key = os.environ["API_KEY"]
+    body = json.dumps({"subject_id": subject_id}).encode("utf-8")
+
+    if args.wsgi_url:
+        def wsgi_call():
+            return http_request(args.wsgi_url, path, body, api_key, delay)
+    else:
+        import application
+        workers = ThreadPoolExecutor(max_workers=args.sync_workers)
+
+        def wsgi_call():
+            return asyncio.get_running_loop().run_in_executor(
+                workers, wsgi_request, application.application, path, body,
+                api_key, delay
+            )
+
+    if args.asgi_url:
+        def asgi_call():
+            return http_request(args.asgi_url, path, body, api_key, delay)
+    else:
+        import asgi
+
+        def asgi_call():
+            return asgi_request(asgi.app, path, body, api_key, delay)
+
+    print(f"client delay {args.client_delay_ms:.0f} ms, "
+          f"{args.requests} requests per client")
+    print(f"{'build':<6} {'clients':>8} {'req/s':>10} {'p50 ms':>9} "
+          f"{'p99 ms':>9} {'errors':>7}")
+    for clients in args.concurrency:
+        for name, call in (("wsgi", wsgi_call), ("asgi", asgi_call)):
+            elapsed, latencies, errors = asyncio.run(
+                run_level(call, clients, args.requests)
+            )
+            report(name, clients, elapsed, latencies, errors)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+bench_contention.py
+
+Measures throughput and latency of POST /add_student and PUT
+/update_student with many concurrent writers spread over several worker
+processes that share one data directory, and so one students.json lock,
+the way gunicorn workers do.
+
+By default every worker process drives the app through Flask's test
+client in a scratch directory with a throwaway key pair. With --url the
+requests go over HTTP to a running deployment instead, e.g. one started
+with ``gunicorn -w 4 application:application``. Storage settings
+(STORAGE_MODE, STORAGE_BACKEND, ...) are taken from the environment.
+
+Usage:
+    python -m benchmarks.bench_contention [--workers 4] [--writers 8]
+        [--requests 50] [--url http://127.0.0.1:8000]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+
+def make_call(url, api_key):
+    """Return call(method, path, body) -> (status, json) for one thread."""
+    headers = {"x-api-key": api_key, "Content-Type": "application/json"}
+    if url is None:
+        import application
+        client = application.application.test_client()
+
+        def call(method, path, body):
+            response = client.open(path, method=method, json=body,
+                                   headers=headers)
+            return response.status_code, response.get_json()
+        return call
+
+    def call(method, path, body):
+        request = urllib.request.Request(
+            url + path, data=json.dumps(body).encode("utf-8"),
+            headers=headers, method=method
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read() or b"{}")
+    return call
+
+
+def writer(call, subject_id, requests, tag, latencies, errors):
+    """Add a student, then keep renaming it: one write per request."""
+    student_id = None
+    for i in range(requests):
+        email = f"{tag}-{i}@bench.example"
+        if student_id is None:
+            method, path = "POST", "/add_student"
+            body = {"name": f"Student {tag}", "age": 20, "email": email,
+                    "subject_id": subject_id}
+        else:
+            method, path = "PUT", "/update_student"
+            body = {"student_id": student_id, "name": f"Student {tag} {i}"}
+
+        start = time.perf_counter()
+        status, data = call(method, path, body)
+        latencies[path].append(time.perf_counter() - start)
+        if status >= 300:
+            errors.append(f"{method} {path}: {status} {data}")
+        elif student_id is None:
+            student_id = data["student_id"]
+
+
+def worker(url, api_key, subject_id, writers, requests, results):
+    latencies = {"/add_student": [], "/update_student": []}
+    errors = []
+    threads = [
+        threading.Thread(target=writer, args=(
+            make_call(url, api_key), subject_id, requests,
+            f"{os.getpid()}-{n}-{uuid.uuid4().hex[:8]}", latencies, errors
+        ))
+        for n in range(writers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put((latencies, errors))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(workers: int, writers: int, requests: int, url, api_key) -> None:
+    if url is None:
+        # Relative data paths resolve against the scratch directory
+        os.chdir(tempfile.mkdtemp(prefix="bench-contention-"))
+        os.environ.setdefault("API_KEY", api_key)
+        os.environ.setdefault("SECRET_SESSION_KEY", "bench")
+        api_key = os.environ["API_KEY"]
+        import application
+        application.get_keys()
+
+    status, data = make_call(url, api_key)(
+        "POST", "/add_subject",
+        {"subject_name": f"Bench {uuid.uuid4().hex[:8]}"}
+    )
+    if status != 201:
+        raise SystemExit(f"Could not create a subject: {status} {data}")
+    subject_id = data["subject_id"]
+
+    # Fork so workers inherit the imported app and the key pair
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(
+            url, api_key, subject_id, writers, requests, results
+        ))
+        for _ in range(workers)
+    ]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    elapsed = time.perf_counter() - start
+    for process in processes:
+        process.join()
+
+    latencies = {"/add_student": [], "/update_student": []}
+    errors = []
+    for worker_latencies, worker_errors in collected:
+        for path, values in worker_latencies.items():
+            latencies[path].extend(values)
+        errors.extend(worker_errors)
+
+    total = sum(len(values) for values in latencies.values())
+    print(f"workers={workers} writers/worker={writers} "
+          f"requests/writer={requests} target={url or 'test client'}")
+    print(f"{total} writes in {elapsed:.2f}s: {total / elapsed:.0f} writes/s,"
+          f" {len(errors)} errors")
+    print(f"{'endpoint':<16} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'mean ms':>8}")
+    for path, values in latencies.items():
+        if values:
+            print(f"{path:<16} {len(values):>6} "
+                  f"{percentile(values, 0.50) * 1000:>8.1f} "
+                  f"{percentile(values, 0.95) * 1000:>8.1f} "
+                  f"{percentile(values, 0.99) * 1000:>8.1f} "
+                  f"{statistics.mean(values) * 1000:>8.1f}")
+    for error in errors[:5]:
+        print(f"  {error}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Worker processes sharing the data files")
+    parser.add_argument("--writers", type=int, default=8,
+                        help="Concurrent writer threads per worker")
+    parser.add_argument("--requests", type=int, default=50,
+                        help="Writes per writer (one add, then updates)")
+    parser.add_argument("--url", default=None,
+                        help="Base URL of a running deployment")
+    parser.add_argument("--api-key", default=os.getenv("API_KEY", "bench"))
+    args = parser.parse_args()
+    run(args.workers, args.writers, args.requests, args.url, args.api_key)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+bench_decrypt.py
+
+Measures decrypt_name_fields() throughput against the number of worker
+threads, using legacy RSA-OAEP ciphertexts (one private-key operation per
+record) and a throwaway in-memory key pair.
+
+Usage:
+    python -m benchmarks.bench_decrypt [--records 2000] [--workers 1 2 4 8]
+"""
+
+import argparse
+import os
+import time
+
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from rsa_utils import decrypt_name_fields, encrypt_name
+
+
+def run(records: int, workers_list, chunk_size: int, repeat: int) -> None:
+    private_key = rsa.generate_private_key(public_exponent=65537,
+                                           key_size=2048)
+    public_key = private_key.public_key()
+    values = [
+        encrypt_name(f"Student {i}", public_key).hex()
+        for i in range(records)
+    ]
+
+    print(f"records={records} chunk_size={chunk_size} "
+          f"cpus={os.cpu_count()}")
+    print(f"{'workers':>8} {'seconds':>10} {'records/s':>12} {'speedup':>8}")
+
+    baseline = None
+    for workers in workers_list:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            names = decrypt_name_fields(values, private_key,
+                                        error_value="<decryption error>",
+                                        workers=workers,
+                                        chunk_size=chunk_size)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        assert names[-1] == f"Student {records - 1}"
+
+        baseline = baseline or best
+        print(f"{workers:>8} {best:>10.3f} {records / best:>12.0f} "
+              f"{baseline / best:>7.2f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--records", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=[1, 2, 4, 8])
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.records, args.workers, args.chunk_size, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+bench_json.py
+
+Times parsing and writing JSON data files with every available serializer
+backend (serializer.py). Round-trip compatibility of the backends is
+checked by tests/test_serializer.py.
+
+Usage:
+    python -m benchmarks.bench_json [files ...] [--repeat 5]
+        (default: data/*.json and the session file)
+"""
+
+import argparse
+import glob
+import time
+
+import serializer
+from config import SESSION_FILE
+
+
+def backends():
+    return ["stdlib"] + (["orjson"] if serializer.orjson is not None else [])
+
+
+def best_of(func, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def time_file(path: str, repeat: int) -> None:
+    with open(path, "rb") as f:
+        raw = f.read()
+    timings = []
+    selected = serializer.BACKEND
+    try:
+        for backend in backends():
+            serializer.BACKEND = backend
+            parsed = serializer.loads(raw)
+            timings.append((
+                backend,
+                best_of(lambda: serializer.loads(raw), repeat),
+                best_of(lambda: serializer.dumps_bytes(parsed), repeat),
+                len(serializer.dumps_bytes(parsed))
+            ))
+    finally:
+        serializer.BACKEND = selected
+
+    print(f"{path}: {len(raw)} bytes")
+    for backend, parse, dump, size in timings:
+        print(f"  {backend:<7} parse {parse * 1000:>9.2f} ms  "
+              f"dump {dump * 1000:>9.2f} ms  compact {size} bytes")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("files", nargs="*")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    files = args.files or sorted(glob.glob("data/*.json")) + glob.glob(
+        SESSION_FILE
+    )
+    print(f"backends: {', '.join(backends())} "
+          f"(selected: {serializer.BACKEND})")
+    for path in files:
+        time_file(path, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+bench_micro.py
+
+Microbenchmarks of the helpers every request leans on, run against a
+dataset from benchmarks.datasets:
+
+- load_students / save_students_atomic on the dataset's students.json
+  (saved to a scratch copy, so the dataset is left untouched)
+- is_duplicate_student for a present email and a missing one (full scan)
+- encrypt_name / decrypt_name (RSA-OAEP, the legacy format) and
+  encrypt_name_field / decrypt_name_field (the envelope format), the
+  latter with the name cache cleared and warm
+- generate_or_load_keys, loading the dataset's key pair and generating a
+  new one in a scratch directory
+
+Prints the results as JSON.
+
+Usage:
+    python -m benchmarks.bench_micro --data bench-data/1k [--repeat 20]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+
+from benchmarks.stats import measure
+
+# Samples of the per-name crypto operations
+CRYPTO_REPEAT = 200
+
+
+def run(directory: str, repeat: int = None) -> dict:
+    """Run every microbenchmark against the dataset in directory."""
+    # Relative data and key paths resolve against the dataset
+    os.chdir(directory)
+    import rsa_utils
+    from config import STUDENTS_FILE
+    from helpers import (is_duplicate_student, load_students,
+                         save_students_atomic)
+
+    students = load_students(STUDENTS_FILE)
+    # Whole-file operations get fewer repeats on bigger datasets
+    if repeat is None:
+        repeat = max(3, min(50, 200_000 // max(len(students), 1)))
+    present = students[len(students) // 2]["email"].upper()
+    scratch = tempfile.mkdtemp(prefix="bench-micro-")
+    private_key, public_key = rsa_utils.get_keys()
+    legacy = rsa_utils.encrypt_name("Alice Johnson", public_key)
+    # Written by another process, so a cold decrypt unwraps its data key
+    stored = students[0]["name_encrypted"]
+
+    def decrypt_cold():
+        rsa_utils.name_cache.clear()
+        rsa_utils.decrypt_name_field(stored, private_key)
+
+    def generate_keys():
+        os.chdir(tempfile.mkdtemp(dir=scratch))
+        try:
+            rsa_utils.generate_or_load_keys()
+        finally:
+            os.chdir(directory)
+
+    results = {
+        "load_students": measure(
+            lambda: load_students(STUDENTS_FILE), repeat
+        ),
+        "save_students_atomic": measure(
+            lambda: save_students_atomic(
+                students, os.path.join(scratch, "students.json")
+            ), repeat
+        ),
+        "is_duplicate_student.hit": measure(
+            lambda: is_duplicate_student(students, present), repeat
+        ),
+        "is_duplicate_student.miss": measure(
+            lambda: is_duplicate_student(students, "missing@example.com"),
+            repeat
+        ),
+        "encrypt_name": measure(
+            lambda: rsa_utils.encrypt_name("Alice Johnson", public_key),
+            CRYPTO_REPEAT
+        ),
+        "decrypt_name": measure(
+            lambda: rsa_utils.decrypt_name(legacy, private_key),
+            CRYPTO_REPEAT
+        ),
+        "encrypt_name_field": measure(
+            lambda: rsa_utils.encrypt_name_field("Alice Johnson"),
+            CRYPTO_REPEAT
+        ),
+        "decrypt_name_field.cold": measure(decrypt_cold, CRYPTO_REPEAT),
+        "decrypt_name_field.cached": measure(
+            lambda: rsa_utils.decrypt_name_field(stored, private_key),
+            CRYPTO_REPEAT
+        ),
+        "generate_or_load_keys.load": measure(
+            rsa_utils.generate_or_load_keys, max(3, repeat // 5)
+        ),
+        "generate_or_load_keys.generate": measure(generate_keys, 3)
+    }
+    shutil.rmtree(scratch, ignore_errors=True)
+    return {"records": len(students), "repeat": repeat, "results": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--data", required=True,
+                        help="Dataset directory from benchmarks.datasets")
+    parser.add_argument("--repeat", type=int, default=None,
+                        help="Samples of whole-file operations")
+    args = parser.parse_args()
+    print(json.dumps(run(os.path.abspath(args.data), args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+bench_routes.py
+
+End-to-end throughput and latency of every route, driven through Flask's
+test client against a scratch copy of a dataset from benchmarks.datasets
+(writes never touch the dataset itself). Storage settings (STORAGE_MODE,
+STORAGE_BACKEND, ...) are taken from the environment.
+
+Requests of a route run back to back on one thread; a route's ops_per_s
+is its requests divided by their wall time. Routes whose cost grows with
+the dataset (writes that rewrite a whole JSON file, session lookups,
+full listings and the export) get fewer requests on bigger datasets.
+
+Prints the results as JSON.
+
+Usage:
+    python -m benchmarks.bench_routes --data bench-data/1k [--requests 200]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Callable, Dict
+
+from benchmarks.stats import summarize
+
+
+def drive(name: str, call: Callable, requests: int,
+          results: Dict) -> None:
+    """Send requests calls of route name; record them in results."""
+    samples = []
+    start = time.perf_counter()
+    for i in range(requests):
+        began = time.perf_counter()
+        response = call(i)
+        # Streamed bodies are produced as they are read
+        body = response.get_data()
+        response.close()
+        samples.append(time.perf_counter() - began)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{name}: {response.status_code} "
+                               f"{body[:200].decode('utf-8', 'replace')}")
+    results[name] = summarize(samples, time.perf_counter() - start)
+
+
+def run(directory: str, requests: int = 200) -> dict:
+    """Drive every route against a scratch copy of directory."""
+    scratch = tempfile.mkdtemp(prefix="bench-routes-")
+    workdir = os.path.join(scratch, "data-copy")
+    shutil.copytree(directory, workdir)
+    # Relative data and key paths resolve against the copy
+    os.chdir(workdir)
+    os.environ.setdefault("API_KEY", "bench")
+    os.environ.setdefault("SECRET_SESSION_KEY", "bench")
+
+    import application
+    from config import STORAGE_BACKEND, STUDENTS_FILE, SUBJECTS_FILE
+
+    if STORAGE_BACKEND == "sqlite":
+        application.application.test_cli_runner().invoke(
+            args=["import-json", "--reset"]
+        )
+
+    with open(SUBJECTS_FILE, encoding="utf-8") as f:
+        subjects = json.load(f)
+    with open(STUDENTS_FILE, encoding="utf-8") as f:
+        students = json.load(f)
+    subject_id = students[0]["subject_id"]
+    student_ids = [s["student_id"] for s in students[:requests]]
+    records = len(students)
+    del students
+
+    client = application.application.test_client()
+    headers = {"x-api-key": os.environ["API_KEY"]}
+    # Routes whose cost grows with the dataset (whole-file rewrites in
+    # the JSON store, full listings, the export) get fewer requests
+    whole_file = max(5, min(requests, 2_000_000 // records))
+    heavy = max(2, min(requests, 200_000 // records))
+    results: Dict[str, Dict] = {}
+    session_ids = []
+
+    def add_session(i):
+        response = client.post("/add_user_session", headers=headers, json={
+            "name": "Bench", "age": 30, "gender": "Female",
+            "email": f"bench-session-{i}@bench.example"
+        })
+        session_ids.append(response.get_json().get("session_id"))
+        return response
+
+    def add_student(i):
+        return client.post("/add_student", headers=headers, json={
+            "name": f"Bench Student {i}", "age": 21,
+            "email": f"bench-student-{i}@bench.example",
+            "subject_id": subject_id
+        })
+
+    def add_bulk(i):
+        return client.post("/students/bulk", headers=headers, json=[
+            {"name": f"Bulk Student {i}-{n}", "age": 22,
+             "email": f"bench-bulk-{i}-{n}@bench.example",
+             "subject_id": subject_id}
+            for n in range(100)
+        ])
+
+    routes = [
+        ("GET /", lambda i: client.get("/"), requests),
+        ("GET /version", lambda i: client.get("/version"), requests),
+        ("GET /users", lambda i: client.get("/users"), requests),
+        ("POST /add_user_session", add_session, whole_file),
+        ("POST /get_user_info", lambda i: client.post(
+            "/get_user_info", headers=headers,
+            json={"session_id": session_ids[i % len(session_ids)]}
+        ), whole_file),
+        ("POST /add_subject", lambda i: client.post(
+            "/add_subject", headers=headers,
+            json={"subject_name": f"Bench Subject {i}"}
+        ), requests),
+        ("POST /add_student", add_student, whole_file),
+        ("POST /students/bulk", add_bulk, max(2, whole_file // 20)),
+        ("PUT /update_student", lambda i: client.put(
+            "/update_student", headers=headers,
+            json={"student_id": student_ids[i % len(student_ids)],
+                  "name": f"Renamed {i}"}
+        ), whole_file),
+        ("GET /student/<id>", lambda i: client.get(
+            f"/student/{student_ids[i % len(student_ids)]}", headers=headers
+        ), requests),
+        ("POST /students/lookup (100 ids)", lambda i: client.post(
+            "/students/lookup", headers=headers,
+            json={"student_ids": student_ids[:100]}
+        ), requests),
+        ("POST /students_by_subject?limit=100", lambda i: client.post(
+            "/students_by_subject", headers=headers,
+            json={"subject_id": subject_id, "limit": 100}
+        ), requests),
+        ("POST /students/search (age+email)", lambda i: client.post(
+            "/students/search", headers=headers,
+            json={"min_age": 20, "max_age": 25, "email_prefix": "a",
+                  "limit": 100}
+        ), requests),
+        ("POST /students/search (subject+age)", lambda i: client.post(
+            "/students/search", headers=headers,
+            json={"subject_id": subject_id, "min_age": 30, "limit": 100}
+        ), requests),
+        ("POST /students_by_subject", lambda i: client.post(
+            "/students_by_subject", headers=headers,
+            json={"subject_id": subject_id}
+        ), heavy),
+        ("GET /students/export", lambda i: client.get(
+            "/students/export", headers=headers
+        ), heavy),
+        ("GET /subjects", lambda i: client.get(
+            "/subjects", headers=headers
+        ), requests),
+        ("GET /subjects/stats", lambda i: client.get(
+            "/subjects/stats", headers=headers
+        ), requests),
+        ("GET /metrics", lambda i: client.get("/metrics"), requests)
+    ]
+    try:
+        for name, call, count in routes:
+            drive(name, call, count, results)
+    finally:
+        os.chdir(directory)
+        shutil.rmtree(scratch, ignore_errors=True)
+    return {"records": records, "subjects": len(subjects),
+            "requests": requests, "results": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--data", required=True,
+                        help="Dataset directory from benchmarks.datasets")
+    parser.add_argument("--requests", type=int, default=200,
+                        help="Requests per route")
+    args = parser.parse_args()
+    print(json.dumps(run(os.path.abspath(args.data), args.requests),
+                     indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+compare.py
+
+Compares two result files from benchmarks.run, e.g. the base and head of
+a change, and flags every benchmark whose p50 latency (or another
+--metric) got worse by more than --threshold. Exits with status 1 if any
+did, so it can gate CI.
+
+Usage:
+    python -m benchmarks.compare base.json head.json [--threshold 0.10]
+        [--metric p50_ms]
+"""
+
+import argparse
+import json
+import sys
+from typing import Dict, Iterator, Tuple
+
+
+def flatten(report: Dict) -> Iterator[Tuple[str, Dict]]:
+    """Yield ("size/suite/benchmark", summary) for every benchmark."""
+    for size, suites in report.get("sizes", {}).items():
+        for suite, result in suites.items():
+            for name, summary in result.get("results", {}).items():
+                yield f"{size}/{suite}/{name}", summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--metric", default="p50_ms",
+                        help="Summary field to compare (lower is better, "
+                             "except ops_per_s)")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.head, encoding="utf-8") as f:
+        head = json.load(f)
+    base_results = dict(flatten(base))
+    higher_is_better = args.metric == "ops_per_s"
+
+    print(f"base {base['meta'].get('commit', '')[:12]}  "
+          f"head {head['meta'].get('commit', '')[:12]}  "
+          f"metric {args.metric}")
+    print(f"{'benchmark':<58} {'base':>10} {'head':>10} {'change':>8}")
+    regressions = 0
+    for name, summary in flatten(head):
+        if name not in base_results:
+            continue
+        old = base_results[name].get(args.metric)
+        new = summary.get(args.metric)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{name:<58} {old:>10.3f} {new:>10.3f} "
+              f"{change * 100:>+7.1f}%{flag}")
+
+    print(f"{regressions} regression(s) above "
+          f"{args.threshold * 100:.0f}%")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+datasets.py
+
+Deterministic synthetic datasets for the benchmarks.
+
+generate(size, directory) lays out a self-contained copy of the files the
+app reads, relative to directory:
+
+    data/students.json          size students (envelope-encrypted names)
+    data/subjects.json          max(10, size // 1000) subjects
+    data/users.json             1000 users
+    root/database/session/session.json   size sessions
+    root/keys/*.pem             a key pair generated for the dataset
+
+Records come from a seeded random generator, so the same size and seed
+give the same records (up to the encrypted names, whose nonces are
+random). The files are written in the format the app itself writes.
+
+Usage:
+    python -m benchmarks.datasets --sizes 1k 100k 1m [--out bench-data]
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+FIRST_NAMES = ["Alice", "Bob", "Charlie", "Diana", "Ethan", "Fiona",
+               "George", "Hannah", "Ian", "Jasmine", "Kofi", "Lena",
+               "Mateo", "Noor", "Oscar", "Priya", "Quinn", "Rosa"]
+LAST_NAMES = ["Johnson", "Smith", "Okafor", "Garcia", "Nguyen", "Müller",
+              "Rossi", "Kowalski", "Haddad", "Tanaka", "Silva", "Dubois"]
+EPOCH = datetime(2025, 1, 1)
+
+
+def parse_size(value: str) -> int:
+    """Return the record count for "1k"/"100k"/"1m" or a plain number."""
+    return SIZES.get(value.lower()) or int(value)
+
+
+def size_label(size: int) -> str:
+    for label, count in SIZES.items():
+        if count == size:
+            return label
+    return str(size)
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _timestamp(rng: random.Random, index: int) -> str:
+    # Increasing, like records appended over time
+    return (EPOCH + timedelta(seconds=index * 30 + rng.random())).isoformat()
+
+
+def make_subjects(count: int, rng: random.Random) -> List[Dict]:
+    return [
+        {"subject_id": _uuid(rng), "subject_name": f"Subject {i:05d}",
+         "created_at": _timestamp(rng, i)}
+        for i in range(count)
+    ]
+
+
+def make_student_fields(count: int, subjects: List[Dict],
+                        rng: random.Random) -> List[Dict]:
+    """Students with a plaintext "name" instead of name_encrypted."""
+    return [
+        {"student_id": _uuid(rng),
+         "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+         "age": rng.randint(17, 65),
+         "email": f"student{i:07d}@example.com",
+         "subject_id": rng.choice(subjects)["subject_id"],
+         "created_at": _timestamp(rng, i)}
+        for i in range(count)
+    ]
+
+
+def make_users(count: int, rng: random.Random) -> List[Dict]:
+    return [
+        {"id": i + 1, "name": rng.choice(FIRST_NAMES),
+         "age": rng.randint(18, 70),
+         "gender": rng.choice(["Female", "Male"]),
+         "email": f"user{i:05d}@example.com"}
+        for i in range(count)
+    ]
+
+
+def make_sessions(count: int, rng: random.Random) -> Dict[str, Dict]:
+    expires_at = time.time() + 365 * 24 * 3600
+    return {
+        _uuid(rng): {"name": rng.choice(FIRST_NAMES),
+                     "age": rng.randint(18, 70), "gender": "Female",
+                     "email": f"session{i:07d}@example.com",
+                     "_expires_at": expires_at}
+        for i in range(count)
+    }
+
+
+def generate(size: int, directory: str, seed: int = 1) -> str:
+    """Write a dataset of size records under directory; return it."""
+    rng = random.Random(seed)
+    directory = os.path.abspath(directory)
+    os.makedirs(os.path.join(directory, "data"), exist_ok=True)
+    os.makedirs(os.path.join(directory, "root/database/session"),
+                exist_ok=True)
+
+    # Keys and relative data paths resolve against the working directory
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        from helpers import save_students_atomic, save_subjects_atomic
+        from rsa_utils import encrypt_name_fields, get_keys
+
+        get_keys()
+        subjects = make_subjects(max(10, size // 1000), rng)
+        fields = make_student_fields(size, subjects, rng)
+        encrypted = encrypt_name_fields(s["name"] for s in fields)
+        # Same field order as the records add_student writes
+        students = [
+            {"student_id": s["student_id"], "name_encrypted": name_encrypted,
+             "age": s["age"], "email": s["email"],
+             "subject_id": s["subject_id"], "created_at": s["created_at"]}
+            for s, name_encrypted in zip(fields, encrypted)
+        ]
+        del fields
+
+        save_subjects_atomic(subjects, "data/subjects.json")
+        save_students_atomic(students, "data/students.json")
+        with open("data/users.json", "w", encoding="utf-8") as f:
+            json.dump(make_users(1000, rng), f, indent=4)
+        with open("root/database/session/session.json", "w",
+                  encoding="utf-8") as f:
+            json.dump(make_sessions(size, rng), f, indent=4)
+    finally:
+        os.chdir(cwd)
+    return directory
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--sizes", nargs="+", default=["1k", "100k"])
+    parser.add_argument("--out", default="bench-data")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    for label in args.sizes:
+        size = parse_size(label)
+        start = time.perf_counter()
+        path = generate(size, os.path.join(args.out, size_label(size)),
+                        args.seed)
+        print(f"{size_label(size)}: {path} "
+              f"({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+run.py
+
+Runs the benchmark suite and writes its results as one JSON file, so
+runs on different commits can be compared with benchmarks.compare.
+
+For every size, a dataset is generated with benchmarks.datasets (or
+reused if already present under --data-dir), then each suite
+(bench_micro, bench_routes) runs in a fresh interpreter against it, so
+no cache or import state carries over between suites or sizes. The
+output records the git commit, interpreter, machine and storage settings
+next to the numbers.
+
+Usage:
+    python -m benchmarks.run [--sizes 1k 100k 1m] [--suites micro routes]
+        [--output bench-results/<commit>.json] [--data-dir bench-data]
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+from benchmarks.datasets import generate, parse_size, size_label
+
+SUITES = {"micro": "benchmarks.bench_micro",
+          "routes": "benchmarks.bench_routes"}
+# Environment settings that change what is being measured
+SETTINGS = ("STORAGE_BACKEND", "STORAGE_MODE", "SESSION_BACKEND",
+            "NAME_ENCRYPTION_FORMAT", "NAME_CACHE_ENABLED", "DECRYPT_WORKERS",
+            "GROUP_COMMIT_ENABLED", "METRICS_ENABLED")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def git(*args: str) -> str:
+    try:
+        return subprocess.run(
+            ("git",) + args, cwd=ROOT, capture_output=True, text=True,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def environment() -> dict:
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": {name: os.environ[name] for name in SETTINGS
+                     if name in os.environ}
+    }
+
+
+def run_suite(module: str, directory: str, extra) -> dict:
+    """Run one suite module in a fresh interpreter; return its JSON."""
+    completed = subprocess.run(
+        [sys.executable, "-m", module, "--data", directory, *extra],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1:]}
+    return json.loads(completed.stdout)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--sizes", nargs="+", default=["1k", "100k"])
+    parser.add_argument("--suites", nargs="+", choices=sorted(SUITES),
+                        default=sorted(SUITES))
+    parser.add_argument("--data-dir", default="bench-data")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--requests", type=int, default=None,
+                        help="Requests per route (bench_routes)")
+    parser.add_argument("--output", default=None,
+                        help="Default bench-results/<commit>.json")
+    args = parser.parse_args()
+
+    meta = environment()
+    meta["seed"] = args.seed
+    report = {"meta": meta, "sizes": {}}
+    for label in args.sizes:
+        size = parse_size(label)
+        directory = os.path.abspath(
+            os.path.join(args.data_dir, size_label(size))
+        )
+        if not os.path.exists(os.path.join(directory, "data",
+                                           "students.json")):
+            print(f"generating {size_label(size)} dataset in {directory}",
+                  file=sys.stderr)
+            generate(size, directory, args.seed)
+
+        report["sizes"][size_label(size)] = results = {}
+        for suite in args.suites:
+            extra = []
+            if suite == "routes" and args.requests:
+                extra = ["--requests", str(args.requests)]
+            print(f"running {suite} on {size_label(size)}", file=sys.stderr)
+            results[suite] = run_suite(SUITES[suite], directory, extra)
+
+    output = args.output or os.path.join(
+        "bench-results", f"{meta['commit'][:12] or 'unknown'}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
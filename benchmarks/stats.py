@@ -0,0 +1,44 @@
+"""
+stats.py
+
+Latency summaries shared by the benchmark suite.
+"""
+
+import statistics
+import time
+from typing import Callable, Dict, List, Sequence
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summarize(samples: List[float], elapsed: float = None) -> Dict:
+    """
+    Summarize per-operation times in seconds as milliseconds.
+
+    ops_per_s is count / elapsed when the samples ran back to back over
+    elapsed seconds, else count / sum(samples).
+    """
+    total = elapsed if elapsed is not None else sum(samples)
+    return {
+        "count": len(samples),
+        "mean_ms": round(statistics.mean(samples) * 1000, 4),
+        "min_ms": round(min(samples) * 1000, 4),
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 4),
+        "p90_ms": round(percentile(samples, 0.90) * 1000, 4),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 4),
+        "max_ms": round(max(samples) * 1000, 4),
+        "ops_per_s": round(len(samples) / total, 2) if total else None
+    }
+
+
+def measure(func: Callable, repeat: int) -> Dict:
+    """Call func() repeat times and summarize the call times."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
@@ -16,6 +16,78 @@ API_KEY = os.getenv("API_KEY")
 # Path to the session data JSON file
 SESSION_FILE = "root/database/session/session.json"
 
+# Session store: "json" (SESSION_FILE) or "sqlite" (SESSION_DB_FILE)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "json")
+SESSION_DB_FILE = "root/database/session/session.db"
+# Seconds a stored session stays valid (also the Flask session lifetime),
+# and how often a background thread removes expired sessions (0 disables
+# the thread; JSON writes still sweep as they go)
+SESSION_TTL = int(os.getenv("SESSION_TTL", "3600"))
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "60"))
+
+# Paths to the JSON data files
+STUDENTS_FILE = "data/students.json"
+SUBJECTS_FILE = "data/subjects.json"
+USERS_FILE = "data/users.json"
+# On-disk format of the students snapshot: "json" (STUDENTS_FILE) or
+# "binary" (STUDENTS_BINARY_FILE, see student_format.py); convert between
+# them with "flask --app application convert-students"
+STUDENTS_FORMAT = os.getenv("STUDENTS_FORMAT", "json")
+STUDENTS_BINARY_FILE = "data/students.bin"
+# Maximum number of rows accepted by POST /students/bulk
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "50000"))
+# Responses larger than this many bytes are streamed in chunks of this size
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", str(64 * 1024)))
+# Maximum number of student ids accepted by POST /students/lookup
+LOOKUP_MAX_IDS = int(os.getenv("LOOKUP_MAX_IDS", "1000"))
+# Default width in years of the age histogram buckets of /subjects/stats
+STATS_AGE_BUCKET = int(os.getenv("STATS_AGE_BUCKET", "5"))
+# Largest page a paginated listing (students_by_subject "limit") returns
+PAGE_MAX_LIMIT = int(os.getenv("PAGE_MAX_LIMIT", "1000"))
+
+# Storage backend for students/subjects: "json" (data/*.json files) or
+# "sqlite" (SQLAlchemy models in root/database/application.db)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
+
+# Storage mode for the JSON data files: "json" rewrites the whole file on
+# every write, "wal" appends mutation records to <file>.wal and compacts
+# them back into the JSON file in the background
+STORAGE_MODE = os.getenv("STORAGE_MODE", "json")
+# fsync the log after this many appended records or seconds, whichever
+# comes first (commit(), used by the routes, always fsyncs each committed
+# batch before returning)
+WAL_FSYNC_BATCH = int(os.getenv("WAL_FSYNC_BATCH", "32"))
+WAL_FSYNC_INTERVAL = float(os.getenv("WAL_FSYNC_INTERVAL", "0.05"))
+# Compact when the log has grown past this many bytes, checked this often
+WAL_COMPACT_BYTES = int(os.getenv("WAL_COMPACT_BYTES", str(4 * 1024 * 1024)))
+WAL_COMPACT_INTERVAL = float(os.getenv("WAL_COMPACT_INTERVAL", "30"))
+# Group commit of single-record writes (add_student, add_subject,
+# update_student): a committer thread per store persists up to
+# GROUP_COMMIT_MAX_BATCH queued writes with one lock acquisition and one
+# file write, waiting up to GROUP_COMMIT_MAX_WAIT_MS for a batch to fill
+GROUP_COMMIT_ENABLED = os.getenv("GROUP_COMMIT_ENABLED", "true").lower() in (
+    "1", "true", "yes"
+)
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "256"))
+GROUP_COMMIT_MAX_WAIT_MS = float(os.getenv("GROUP_COMMIT_MAX_WAIT_MS", "2"))
+
+# How in-process caches of the data and session files notice writes by
+# other processes (gunicorn workers): "generation" checks a shared
+# counter that writers bump (generation.py), "stat" checks the files'
+# mtime/size/inode on every access. With "generation" the files are
+# still checked every CACHE_RECHECK_INTERVAL seconds, for writers
+# outside the app
+CACHE_COHERENCE = os.getenv("CACHE_COHERENCE", "generation")
+CACHE_RECHECK_INTERVAL = float(os.getenv("CACHE_RECHECK_INTERVAL", "1"))
+
+# Request/stage latency histograms served on /metrics (metrics.py)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in (
+    "1", "true", "yes"
+)
+
+# asgi.py: threads running Flask views for the ASGI build (per process)
+ASGI_THREADS = int(os.getenv("ASGI_THREADS", "32"))
+
 # Required for Flask's session
 SECRET_KEY = os.getenv("SECRET_SESSION_KEY")
 
@@ -25,6 +97,42 @@ SQLALCHEMY_DATABASE_URI = f"sqlite:///{
     os.path.join(BASE_DIR, 'root/database/application.db')
 }"
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+SQLALCHEMY_ENGINE_OPTIONS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+    "pool_timeout": 30,
+    "pool_recycle": 3600,
+    # Pooled connections move between request threads; wait up to 30s on
+    # a locked database instead of failing immediately
+    "connect_args": {"check_same_thread": False, "timeout": 30},
+}
 
 # RSA configuration
 RSA_PASSPHRASE = os.getenv("RSA_PASSPHRASE", "defaultpass")
+
+# Format for newly written name_encrypted values: "v2" (RSA-wrapped data
+# key + AES-GCM) or "legacy" (per-record RSA-OAEP hex)
+NAME_ENCRYPTION_FORMAT = os.getenv("NAME_ENCRYPTION_FORMAT", "v2")
+
+# Batch name decryption: thread-pool size (1 disables the pool) and the
+# number of records handed to a worker at a time
+DECRYPT_WORKERS = int(os.getenv("DECRYPT_WORKERS", os.cpu_count() or 1))
+DECRYPT_CHUNK_SIZE = int(os.getenv("DECRYPT_CHUNK_SIZE", "64"))
+
+# Decrypted-name cache (plaintext names held in memory); set
+# NAME_CACHE_ENABLED=false where plaintext PII must not be cached
+NAME_CACHE_ENABLED = os.getenv("NAME_CACHE_ENABLED", "true").lower() in (
+    "1", "true", "yes"
+)
+NAME_CACHE_SIZE = int(os.getenv("NAME_CACHE_SIZE", "10000"))
+NAME_CACHE_TTL = float(os.getenv("NAME_CACHE_TTL", "300"))
+
+# Streaming export: records parsed and decrypted per pipeline step
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# JSON serializer for data files, WAL lines and responses: "auto" (orjson
+# when installed, else the stdlib json module), "orjson" or "stdlib"
+JSON_BACKEND = os.getenv("JSON_BACKEND", "auto")
+# Indent of the JSON data files; 0 writes compact files (set 4 for the
+# old human-readable layout)
+JSON_INDENT = int(os.getenv("JSON_INDENT", "0"))
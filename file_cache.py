@@ -0,0 +1,89 @@
+"""
+file_cache.py
+
+Per-process cache of a read-mostly JSON file together with its HTTP
+representations.
+
+CachedJsonFile parses the file once per version (mtime, size and inode),
+serializes it once with the app's JSON provider and builds gzip and, when
+the optional brotli package is installed, brotli variants up front. Routes
+can then answer with the prebuilt bytes, an ETag and Last-Modified, and
+a 304 for conditional requests, without parsing or serializing anything.
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, Optional
+
+import serializer
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+
+class CachedFileVersion:
+    """One version of a cached document: data and encoded bodies."""
+
+    def __init__(self, stamp: tuple, data: Any, body: bytes,
+                 last_modified: datetime):
+        self.stamp = stamp
+        self.data = data
+        self.last_modified = last_modified
+        self.etag = hashlib.sha1(body).hexdigest()
+        # Content-Encoding -> body; "identity" is the plain JSON bytes
+        self.bodies: Dict[str, bytes] = {"identity": body}
+        self.bodies["gzip"] = gzip.compress(body, compresslevel=6)
+        if brotli is not None:
+            self.bodies["br"] = brotli.compress(body)
+
+
+class CachedJsonFile:
+    """Cache of a JSON file, rebuilt when the file changes on disk."""
+
+    def __init__(self, file_path: str, dumps=None):
+        self.file_path = file_path
+        self._dumps = dumps or serializer.dumps
+        self._version: Optional[CachedFileVersion] = None
+        self._lock = threading.Lock()
+
+    def _stamp(self) -> tuple:
+        """Return (mtime_ns, size, inode); raises FileNotFoundError."""
+        st = os.stat(self.file_path)
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def get(self) -> CachedFileVersion:
+        """
+        Return the current version of the file.
+
+        Raises FileNotFoundError or serializer.JSONDecodeError.
+        """
+        stamp = self._stamp()
+        version = self._version
+        if version is not None and version.stamp == stamp:
+            return version
+
+        with self._lock:
+            version = self._version
+            if version is None or version.stamp != stamp:
+                # Stat before reading so a concurrent replace is picked up
+                # on the next call
+                data = serializer.load_file(self.file_path)
+                body = (self._dumps(data) + "\n").encode("utf-8")
+                last_modified = datetime.fromtimestamp(
+                    stamp[0] / 1e9, tz=timezone.utc
+                )
+                version = CachedFileVersion(stamp, data, body, last_modified)
+                self._version = version
+            return version
+
+
+def iter_chunks(body: bytes, chunk_size: int) -> Iterator[bytes]:
+    """Yield body in chunk_size pieces for a streamed response."""
+    view = memoryview(body)
+    for start in range(0, len(view), chunk_size):
+        yield bytes(view[start:start + chunk_size])
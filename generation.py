@@ -0,0 +1,87 @@
+"""
+generation.py
+
+Cross-process change counters for the in-process caches
+(CACHE_COHERENCE=generation).
+
+A GenerationCounter is a u64 in a small file next to the data file it
+guards (<file>.gen), mapped into every process with a shared mmap.
+Writers bump it while they hold the data file's FileLock, after the new
+data is on disk. Readers compare it with the value they saw when they
+last refreshed their cache: equal means no writer has touched the file
+since, and the check is one read from shared memory instead of a stat()
+or a parse per request. Gunicorn workers forked from one master, and
+processes started separately, all map the same page, so a write in one
+worker is visible to the others' next check.
+
+Writers outside the app (an editor, a restore) do not bump the counter,
+so readers still fall back to their file checks every
+CACHE_RECHECK_INTERVAL seconds.
+"""
+
+import logging
+import mmap
+import os
+import struct
+from typing import Optional
+
+from config import CACHE_COHERENCE
+
+logger = logging.getLogger(__name__)
+
+COUNTER = struct.Struct("<Q")
+
+
+class GenerationCounter:
+    """A shared, monotonically increasing counter in a mapped file."""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._map: Optional[mmap.mmap] = None
+
+    def _mapped(self) -> mmap.mmap:
+        if self._map is None:
+            os.makedirs(os.path.dirname(self.file_path) or ".",
+                        exist_ok=True)
+            fd = os.open(self.file_path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                # Only ever grow the file: another process may already
+                # have created and bumped it
+                if os.fstat(fd).st_size < COUNTER.size:
+                    os.ftruncate(fd, COUNTER.size)
+                self._map = mmap.mmap(fd, COUNTER.size)
+            finally:
+                os.close(fd)
+        return self._map
+
+    def value(self) -> int:
+        """Return the current generation."""
+        return COUNTER.unpack_from(self._mapped())[0]
+
+    def bump(self) -> int:
+        """
+        Advance the generation and return the new value. Call with the
+        guarded file's FileLock held, after the write it announces.
+        """
+        data = self._mapped()
+        value = COUNTER.unpack_from(data)[0] + 1
+        COUNTER.pack_into(data, 0, value)
+        return value
+
+
+def generation_for(file_path: str) -> Optional[GenerationCounter]:
+    """
+    Return the counter guarding file_path, or None when caches use file
+    checks only (CACHE_COHERENCE=stat) or the counter file cannot be
+    created.
+    """
+    if CACHE_COHERENCE != "generation":
+        return None
+    counter = GenerationCounter(f"{file_path}.gen")
+    try:
+        counter.value()
+    except (OSError, ValueError) as e:
+        logger.warning(f"No generation counter for {file_path}, falling "
+                       f"back to file checks: {str(e)}")
+        return None
+    return counter
@@ -4,12 +4,16 @@ helpers.py
 Utility functions for managing user sessions using a JSON file.
 """
 
+import base64
 import json
+import re
 import uuid
 import os
 from config import SESSION_FILE, API_KEY
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
 from flask import current_app, request, jsonify
+from metrics import timed
+import serializer
 
 
 def validate_api_key():
@@ -22,23 +26,23 @@ def validate_api_key():
 
 
 # Load sessions from JSON
+@timed("sessions.load")
 def load_sessions():
     """Load session dictionary from file or return empty dict if not found."""
     if os.path.exists(SESSION_FILE):
-        with open(SESSION_FILE, "r", encoding="utf-8") as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                return {}
+        try:
+            return serializer.load_file(SESSION_FILE)
+        except serializer.JSONDecodeError:
+            return {}
     return {}
 
 
 # Save sessions to JSON
+@timed("sessions.save")
 def save_sessions(session_data):
     """Ensure the directory exists before saving"""
     os.makedirs(os.path.dirname(SESSION_FILE), exist_ok=True)
-    with open(SESSION_FILE, "w", encoding="utf-8") as f:
-        json.dump(session_data, f, indent=4)
+    serializer.write_file(session_data, SESSION_FILE)
 
 
 # Add user to session and return session ID
@@ -57,14 +61,14 @@ def add_user_to_session(user_data):
     return session_id
 
 
+@timed("subjects.load")
 def load_subjects(file_path: str) -> List[Dict]:
     """Load subjects from JSON file or return empty list."""
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return serializer.load_file(file_path)
     except FileNotFoundError:
         return []
-    except json.JSONDecodeError as e:
+    except serializer.JSONDecodeError as e:
         current_app.logger.error(f"Corrupted subjects file: {str(e)}")
         raise
 
@@ -77,12 +81,12 @@ def is_duplicate_subject(subjects: List[Dict], name: str) -> bool:
     )
 
 
+@timed("subjects.save")
 def save_subjects_atomic(subjects: List[Dict], file_path: str) -> bool:
     """Save subjects to file atomically using a temporary file."""
     temp_path = f"{file_path}.tmp"
     try:
-        with open(temp_path, "w", encoding="utf-8") as f:
-            json.dump(subjects, f, indent=4)
+        serializer.write_file(subjects, temp_path)
         os.replace(temp_path, file_path)
         return True
     except Exception as e:
@@ -92,14 +96,14 @@ def save_subjects_atomic(subjects: List[Dict], file_path: str) -> bool:
         return False
 
 
+@timed("students.load")
 def load_students(file_path: str) -> List[Dict]:
     """Load students from JSON file or return empty list."""
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return serializer.load_file(file_path)
     except FileNotFoundError:
         return []
-    except json.JSONDecodeError as e:
+    except serializer.JSONDecodeError as e:
         current_app.logger.error(f"Corrupted students file: {str(e)}")
         raise
 
@@ -112,12 +116,12 @@ def is_duplicate_student(students: List[Dict], email: str) -> bool:
     )
 
 
+@timed("students.save")
 def save_students_atomic(students: List[Dict], file_path: str) -> bool:
     """Save students to file atomically using a temporary file."""
     temp_path = f"{file_path}.tmp"
     try:
-        with open(temp_path, "w", encoding="utf-8") as f:
-            json.dump(students, f, indent=4)
+        serializer.write_file(students, temp_path)
         os.replace(temp_path, file_path)
         return True
     except Exception as e:
@@ -125,3 +129,129 @@ def save_students_atomic(students: List[Dict], file_path: str) -> bool:
         if os.path.exists(temp_path):
             os.remove(temp_path)
         return False
+
+
+def validate_student_input(data) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    Validate and normalize the fields of a new student.
+
+    Returns:
+        tuple: ({"name", "age", "email", "subject_id"}, None) when valid,
+            otherwise (None, "<error message>").
+    """
+    required_fields = ["name", "age", "email", "subject_id"]
+    if not isinstance(data, dict) or not all(
+        field in data and data[field] for field in required_fields
+    ):
+        return None, "All fields are required and must be non-empty"
+
+    name = str(data["name"]).strip()
+    email = str(data["email"]).strip().lower()
+    subject_id = str(data["subject_id"]).strip()
+
+    # Robust age validation
+    try:
+        age = int(data.get("age"))
+    except (TypeError, ValueError):
+        return None, "Age must be a positive integer"
+
+    if not name or not email or not subject_id or age <= 0:
+        return None, "Invalid field values"
+    if len(name) > 100 or len(email) > 100:
+        return None, "Name/email too long"
+
+    return {
+        "name": name,
+        "age": age,
+        "email": email,
+        "subject_id": subject_id
+    }, None
+
+
+def encode_cursor(key: Tuple[str, str]) -> str:
+    """Encode a (created_at, student_id) page key as an opaque cursor."""
+    raw = json.dumps(list(key), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[str, str]]:
+    """Decode a cursor from encode_cursor, or return None if invalid."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError):
+        return None
+    if (not isinstance(key, list) or len(key) != 2 or
+            not all(isinstance(part, str) for part in key)):
+        return None
+    return key[0], key[1]
+
+
+_json_decoder = json.JSONDecoder()
+_json_whitespace = re.compile(r"[ \t\r\n]*")
+
+
+def iter_json_array(f: TextIO, chunk_size: int = 64 * 1024) -> Iterator:
+    """
+    Yield the elements of the JSON array in the text file f one at a time.
+
+    The file is read chunk_size characters at a time, so memory is bounded
+    by the largest element rather than by the size of the file. Raises
+    json.JSONDecodeError if the file is not a JSON array.
+    """
+    buf = f.read(chunk_size)
+    pos = 0
+    eof = not buf
+
+    def more() -> bool:
+        nonlocal buf, pos, eof
+        if eof:
+            return False
+        data = f.read(chunk_size)
+        eof = not data
+        buf = buf[pos:] + data
+        pos = 0
+        return not eof
+
+    def next_char() -> str:
+        # Skip whitespace, reading more of the file as needed
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf) or not more():
+                return buf[pos] if pos < len(buf) else ""
+
+    def fail(message: str):
+        raise json.JSONDecodeError(message, buf, pos)
+
+    if next_char() != "[":
+        fail("Expecting '['")
+    pos += 1
+    if next_char() == "]":
+        return
+
+    while True:
+        next_char()
+        while True:
+            try:
+                element, end = _json_decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if more():
+                    continue
+                raise
+            # A complete element is followed by ',' or ']'; anything else
+            # may be a number cut off at the end of the chunk
+            after = _json_whitespace.match(buf, end).end()
+            if (after == len(buf) or buf[after] not in ",]") and more():
+                continue
+            break
+        pos = end
+        yield element
+
+        char = next_char()
+        if char == "]":
+            return
+        if char != ",":
+            fail("Expecting ',' delimiter")
+        pos += 1
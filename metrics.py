@@ -0,0 +1,234 @@
+"""
+metrics.py
+
+In-process metrics in the Prometheus text exposition format, served by
+the /metrics route.
+
+- Histogram: fixed-bucket latency (or size) histograms keyed by label
+  values. observe() is a bisect and three additions under a lock, cheap
+  enough for every request and every hot-path stage.
+- span(stage) / timed(stage): time a block or function into
+  stage_duration_seconds{stage=...}.
+- timed_lock(path): a FileLock that records how long callers waited for
+  it (filelock_wait_seconds) and held it (filelock_hold_seconds).
+- register_gauge(): values read from a callback at scrape time (cache and
+  session statistics).
+
+Each process keeps its own numbers; under gunicorn every worker reports
+its own series, which Prometheus can sum across scrapes of the workers.
+METRICS_ENABLED=false turns every observation into a no-op.
+"""
+
+import bisect
+import functools
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from filelock import FileLock
+
+from config import METRICS_ENABLED
+
+PREFIX = "student_api_"
+
+# Seconds; from sub-millisecond index lookups to multi-second rewrites
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+class Histogram:
+    """A Prometheus histogram with one series per label-value tuple."""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str],
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = PREFIX + name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        if not METRICS_ENABLED:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[label_values] = series
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series = {}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}",
+                 f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(k, list(v[0]), v[1], v[2])
+                      for k, v in sorted(self._series.items())]
+        for label_values, counts, total, count in series:
+            labels = _format_labels(self.labels, label_values)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                le = _format_labels(
+                    self.labels + ("le",), label_values + (str(bound),)
+                )
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return (value.replace("\\", "\\\\").replace("\n", "\\n")
+            .replace('"', '\\"'))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+# --- Registry ---
+
+request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time to handle a request, by route template, method and status.",
+    ("route", "method", "status")
+)
+stage_duration = Histogram(
+    "stage_duration_seconds",
+    "Time spent in instrumented stages (file load/save, crypto, commit).",
+    ("stage",)
+)
+lock_wait = Histogram(
+    "filelock_wait_seconds",
+    "Time spent waiting to acquire a FileLock.",
+    ("lock",)
+)
+lock_hold = Histogram(
+    "filelock_hold_seconds",
+    "Time a FileLock was held.",
+    ("lock",)
+)
+commit_batch_size = Histogram(
+    "group_commit_batch_size",
+    "Writes persisted per group commit.",
+    ("store",),
+    buckets=SIZE_BUCKETS
+)
+
+_histograms = [request_duration, stage_duration, lock_wait, lock_hold,
+               commit_batch_size]
+# (name, help, callback returning a number or {label value: number}, label)
+_gauges: List[Tuple[str, str, Callable, Optional[str]]] = []
+
+
+def register_gauge(name: str, help_text: str, callback: Callable,
+                   label: Optional[str] = None) -> None:
+    """
+    Report callback() at scrape time, either a single number or, with
+    label, a dict of label value -> number.
+    """
+    _gauges.append((PREFIX + name, help_text, callback, label))
+
+
+def render() -> str:
+    """Return all metrics in the Prometheus text format."""
+    lines = []
+    for histogram in _histograms:
+        lines.extend(histogram.render())
+    for name, help_text, callback, label in _gauges:
+        try:
+            value = callback()
+        except Exception:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        if label is None:
+            lines.append(f"{name} {value}")
+        else:
+            for label_value, number in sorted(value.items()):
+                lines.append(
+                    f"{name}{_format_labels((label,), (label_value,))} "
+                    f"{number}"
+                )
+    return "\n".join(lines) + "\n"
+
+
+# --- Timing helpers ---
+
+class span:
+    """Context manager timing a block into stage_duration_seconds."""
+
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self) -> "span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        stage_duration.observe(time.perf_counter() - self.start, self.stage)
+
+
+def timed(stage: str) -> Callable:
+    """Decorator timing every call of a function as stage."""
+    def decorator(func: Callable) -> Callable:
+        if not METRICS_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stage_duration.observe(time.perf_counter() - start, stage)
+        return wrapper
+    return decorator
+
+
+class TimedFileLock(FileLock):
+    """FileLock recording wait and hold times under its file's name."""
+
+    def __init__(self, lock_file: str, *args, **kwargs):
+        super().__init__(lock_file, *args, **kwargs)
+        self._metric_label = os.path.basename(lock_file).rsplit(".lock", 1)[0]
+        # Acquisition times; FileLock is reentrant
+        self._acquired_at: List[float] = []
+
+    def __enter__(self) -> "TimedFileLock":
+        start = time.perf_counter()
+        super().__enter__()
+        now = time.perf_counter()
+        lock_wait.observe(now - start, self._metric_label)
+        self._acquired_at.append(now)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        held = time.perf_counter() - self._acquired_at.pop()
+        super().__exit__(*exc)
+        lock_hold.observe(held, self._metric_label)
+
+
+def timed_lock(lock_path: str) -> FileLock:
+    """Return a FileLock for lock_path, timed if metrics are enabled."""
+    if not METRICS_ENABLED:
+        return FileLock(lock_path)
+    return TimedFileLock(lock_path)
@@ -5,33 +5,76 @@ Defines SQLAlchemy models for the student management system:
 - Subject: Represents academic subjects/courses
 - Student: Represents students with encrypted personal information
 
-The Student model uses RSA encryption for name storage to enhance privacy.
+The Student model stores the same encrypted name string as
+data/students.json (envelope or legacy RSA hex) to enhance privacy.
 Relationships:
 - One Subject can have many Students (one-to-many)
 - Each Student must belong to one Subject
+
+Primary keys are the UUID strings used in the JSON data files, so records
+can be moved between the JSON and SQLite backends unchanged.
 """
 
+from typing import Dict, List
+
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, func, inspect
+from sqlalchemy.engine import Engine
 
 # Initialize SQLAlchemy instance
 db = SQLAlchemy()
 
 
+@event.listens_for(Engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Use WAL journaling so readers don't block the writer (SQLite only)."""
+    if type(dbapi_connection).__module__ != "sqlite3":
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
 class Subject(db.Model):
     """
     Subject/Course model.
     Attributes:
-        id (int): Primary key
+        id (str): Primary key, the subject_id UUID
         name (str): Subject name, max length 100 chars
+        created_at (str): ISO timestamp
         students (relationship): One-to-many relationship with Student model
     """
     __tablename__ = 'subjects'
 
-    id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(db.String(36), primary_key=True)
     name = db.Column(db.String(100), nullable=False)
+    created_at = db.Column(db.String(32))
     # Define relationship: one subject can have many students
     students = db.relationship('Student', backref='subject', lazy=True)
 
+    __table_args__ = (
+        # Case-insensitive name lookups (duplicate checks)
+        db.Index('ix_subjects_name_lower', func.lower(name), unique=True),
+    )
+
+    def to_dict(self) -> Dict:
+        """Return the subject in the data/subjects.json record format."""
+        return {
+            "subject_id": self.id,
+            "subject_name": self.name,
+            "created_at": self.created_at
+        }
+
+    @classmethod
+    def from_dict(cls, record: Dict) -> "Subject":
+        return cls(
+            id=record["subject_id"],
+            name=record["subject_name"],
+            created_at=record.get("created_at")
+        )
+
     def __repr__(self):
         """String representation of Subject."""
         return f"<Subject {self.name}>"
@@ -41,26 +84,81 @@ class Student(db.Model):
     """
     Student model with encrypted personal information.
     Attributes:
-        id (int): Primary key
-        name_encrypted (bytes): RSA encrypted student name
+        id (str): Primary key, the student_id UUID
+        name_encrypted (str): Encrypted student name
         age (int): Student age
-        email (str): Student email, unique
-        subject_id (int): Foreign key to subjects table
+        email (str): Student email (lowercased), unique
+        subject_id (str): Foreign key to subjects table
+        created_at / updated_at (str): ISO timestamps
     """
     __tablename__ = 'students'
 
-    id = db.Column(db.Integer, primary_key=True)
-    # Stores RSA encrypted name
-    name_encrypted = db.Column(db.LargeBinary, nullable=False)
+    id = db.Column(db.String(36), primary_key=True)
+    # Stores the encrypted name exactly as in students.json
+    name_encrypted = db.Column(db.Text, nullable=False)
     age = db.Column(db.Integer, nullable=False)
-    email = db.Column(db.String(100), unique=True, nullable=False)
+    email = db.Column(db.String(100), unique=True, index=True, nullable=False)
     subject_id = db.Column(
-        db.Integer,
+        db.String(36),
         db.ForeignKey('subjects.id'),
         nullable=False,
+        index=True,
         doc="References the subject this student is enrolled in"
     )
+    created_at = db.Column(db.String(32))
+    updated_at = db.Column(db.String(32))
+
+    __table_args__ = (
+        # Keyset pagination of a subject's students by (created_at, id)
+        db.Index('ix_students_subject_page', subject_id, created_at, id),
+    )
+
+    def to_dict(self) -> Dict:
+        """Return the student in the data/students.json record format."""
+        record = {
+            "student_id": self.id,
+            "name_encrypted": self.name_encrypted,
+            "age": self.age,
+            "email": self.email,
+            "subject_id": self.subject_id,
+            "created_at": self.created_at
+        }
+        if self.updated_at is not None:
+            record["updated_at"] = self.updated_at
+        return record
+
+    @classmethod
+    def from_dict(cls, record: Dict) -> "Student":
+        return cls(
+            id=record["student_id"],
+            name_encrypted=record["name_encrypted"],
+            age=record["age"],
+            email=record["email"],
+            subject_id=record["subject_id"],
+            created_at=record.get("created_at"),
+            updated_at=record.get("updated_at")
+        )
 
     def __repr__(self):
         """String representation of Student, excluding encrypted data."""
         return f"<Student ID={self.id}, Subject={self.subject_id}>"
+
+
+def outdated_tables() -> List[str]:
+    """
+    Return the names of existing tables whose schema predates these
+    models (integer ids, missing columns). create_all() leaves such
+    tables alone, so they must be dropped and recreated. Call inside an
+    application context.
+    """
+    inspector = inspect(db.engine)
+    existing = set(inspector.get_table_names())
+    outdated = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        columns = {c["name"]: c for c in inspector.get_columns(table.name)}
+        if (set(table.columns.keys()) - set(columns) or
+                not isinstance(columns["id"]["type"], db.String)):
+            outdated.append(table.name)
+    return outdated
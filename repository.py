@@ -0,0 +1,1214 @@
+"""
+repository.py
+
+In-memory, indexed views of data/students.json and data/subjects.json.
+
+Each repository keeps the parsed file in memory together with hash indexes
+and only re-parses the file when its mtime, size or inode changes, so
+lookups by id, email, subject or subject name are O(1)/O(k) instead of a
+full parse plus linear scan per request. With CACHE_COHERENCE=generation
+writers also bump a shared counter (generation.py), and readers only look
+at the files once it moves or CACHE_RECHECK_INTERVAL has passed.
+
+Writes go through insert()/update(), which must be called while holding
+lock() (the same FileLock the routes used before), or through commit(),
+which queues the write for a committer thread. The committer takes the
+lock once for a whole batch of queued writes, runs each write's conflict
+check and persists the accepted ones with a single file write (group
+commit). Two storage modes are supported (config.STORAGE_MODE):
+
+- "json": every write rewrites the whole JSON array with the existing
+  save_*_atomic helpers.
+- "wal": every write appends one JSON-lines mutation record to
+  <file>.wal. State is the JSON array (the snapshot) plus a replay of the
+  log, and other processes replay only the log tail they have not seen.
+  commit() fsyncs the log once per committed batch before answering its
+  callers; other appends are fsynced in batches. A background thread
+  compacts the log back into the snapshot, so the JSON files stay
+  readable as before.
+
+A log left behind by "wal" mode is still read in "json" mode, and the next
+"json" write saves its records into the snapshot and removes it.
+
+With STUDENTS_FORMAT=binary the students snapshot is data/students.bin
+(student_format.py) instead of a JSON array; the log stays JSON lines.
+
+Records handed out by the repositories are shared with the cache and must
+be treated as read-only; use update() to change a record.
+"""
+
+import bisect
+import contextvars
+import copy
+import heapq
+import io
+import logging
+import os
+import queue
+import threading
+import time
+import weakref
+from collections import ChainMap, Counter
+from concurrent.futures import Future
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List
+from typing import Optional, Tuple
+
+from filelock import FileLock
+
+from config import STORAGE_MODE, WAL_FSYNC_BATCH, WAL_FSYNC_INTERVAL
+from config import WAL_COMPACT_BYTES, WAL_COMPACT_INTERVAL
+from config import GROUP_COMMIT_ENABLED, GROUP_COMMIT_MAX_BATCH
+from config import GROUP_COMMIT_MAX_WAIT_MS, STUDENTS_FORMAT
+from config import CACHE_RECHECK_INTERVAL
+from generation import generation_for
+from helpers import iter_json_array, load_students, save_students_atomic
+from helpers import load_subjects, save_subjects_atomic
+from metrics import commit_batch_size, span, timed_lock
+import serializer
+from student_format import StudentFile, iter_students_binary
+from student_format import load_students_binary, save_students_binary
+
+logger = logging.getLogger(__name__)
+
+
+class WriteConflict(Exception):
+    """Raised by a commit() check to reject a write (e.g. duplicate)."""
+
+
+def iter_json_snapshot(f: BinaryIO) -> Iterator[Dict]:
+    """Yield the records of an open JSON array file."""
+    return iter_json_array(io.TextIOWrapper(f, encoding="utf-8"))
+
+
+def page_key(record: Dict) -> Tuple[str, str]:
+    """Sort key used for paging students: (created_at, student_id)."""
+    return (record.get("created_at") or "", record.get("student_id") or "")
+
+
+def _age_entry(record: Dict) -> Optional[Tuple[int, str]]:
+    """Entry of record in the sorted age index (integer ages only)."""
+    age = record.get("age")
+    if type(age) is not int:
+        return None
+    return (age, record.get("student_id") or "")
+
+
+def _email_entry(record: Dict) -> Tuple[str, str]:
+    """Entry of record in the sorted email index."""
+    return (record.get("email", "").lower(), record.get("student_id") or "")
+
+
+def _sorted_remove(entries: List[tuple], entry: Optional[tuple]) -> None:
+    if entry is not None:
+        i = bisect.bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            del entries[i]
+
+
+def subject_age_counts(records: Iterable[Dict]) -> Dict[str, Dict]:
+    """
+    Count students per subject and, per subject, students per (integer)
+    age: {subject_id: {"count": n, "ages": Counter({age: n})}}.
+    """
+    # Counter tallies the (subject, age) pairs in C in one pass; the
+    # Python loop below only runs once per distinct pair
+    pairs = Counter(
+        (r.get("subject_id"),
+         r.get("age") if type(r.get("age")) is int else None)
+        for r in records
+    )
+    stats: Dict[str, Dict] = {}
+    for (subject_id, age), count in pairs.items():
+        entry = stats.setdefault(subject_id, {"count": 0, "ages": Counter()})
+        entry["count"] += count
+        if age is not None:
+            entry["ages"][age] = count
+    return stats
+
+
+def _stats_add(stats: Dict, record: Dict, sign: int) -> None:
+    """Add record to (sign=1) or remove it from (-1) subject stats."""
+    subject = stats.get(record.get("subject_id"))
+    if subject is None:
+        if sign < 0:
+            return
+        subject = stats[record.get("subject_id")] = {
+            "count": 0, "ages": Counter()
+        }
+    subject["count"] += sign
+    age = record.get("age")
+    if type(age) is int:
+        subject["ages"][age] += sign
+        if not subject["ages"][age]:
+            del subject["ages"][age]
+    if not subject["count"]:
+        del stats[record.get("subject_id")]
+
+
+# Live repositories, reset in a forked child by one process-wide hook
+_repositories: "weakref.WeakSet[JsonFileRepository]" = weakref.WeakSet()
+
+
+def _after_fork_in_child() -> None:
+    for repo in list(_repositories):
+        repo._after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+class JsonFileRepository:
+    """Base class: cached records loaded from a JSON array file."""
+
+    # Name of the unique id field of a record; set by subclasses
+    key_field = ""
+
+    def __init__(
+        self,
+        file_path: str,
+        loader: Callable[[str], List[Dict]],
+        saver: Callable[[List[Dict], str], bool],
+        mode: str = STORAGE_MODE,
+        reader: Callable[[BinaryIO], Iterator[Dict]] = iter_json_snapshot
+    ):
+        self.file_path = file_path
+        self.lock_path = f"{file_path}.lock"
+        self.wal_path = f"{file_path}.wal"
+        self.wal = mode == "wal"
+        self._loader = loader
+        self._saver = saver
+        self._reader = reader
+        self._lock = threading.RLock()
+        # Records keyed by key_field, in file/insertion order
+        self._records: Dict[str, Dict] = {}
+        self._indexes = self._new_indexes()
+        self._loaded = False
+        # Bumped whenever the in-memory records change; see version()
+        self._version = 0
+        # Shared counter that writers in every process bump, and the value
+        # it had when this process last checked the files
+        self._generation = generation_for(file_path)
+        self._seen_generation = None
+        self._recheck_at = 0.0
+        self._snapshot_stamp = None
+        self._wal_inode = None
+        self._wal_offset = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._compactor = None
+        self._commit_queue: queue.Queue = queue.Queue()
+        self._committer = None
+        _repositories.add(self)
+
+    def _after_fork(self):
+        """New lock, and no background threads, in a forked child."""
+        self._lock = threading.RLock()
+        self._compactor = None
+        self._commit_queue = queue.Queue()
+        self._committer = None
+
+    # --- Index hooks (subclasses) ---
+
+    def _new_indexes(self) -> Dict:
+        return {}
+
+    def _index(self, indexes: Dict, record: Dict,
+               old: Optional[Dict]) -> None:
+        """Add record to the secondary indexes, replacing old if given."""
+
+    def _unique_keys(self, record: Dict) -> Dict[str, str]:
+        """Return {index name: key} of the unique indexes holding record."""
+        return {}
+
+    # --- Loading ---
+
+    @staticmethod
+    def _stat(path: str) -> Optional[os.stat_result]:
+        try:
+            return os.stat(path)
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _stamp(st: Optional[os.stat_result]) -> Optional[tuple]:
+        return st and (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    @staticmethod
+    def _inode(st: Optional[os.stat_result]) -> Optional[int]:
+        return st and st.st_ino
+
+    def _snapshot_changed(self, st: Optional[os.stat_result]) -> bool:
+        return self._stamp(st) != self._snapshot_stamp
+
+    def _apply(self, op: Dict, records: Optional[Dict] = None,
+               indexes: Optional[Dict] = None) -> None:
+        """Apply one mutation record to the in-memory state."""
+        if records is None:
+            records, indexes = self._records, self._indexes
+
+        if op.get("op") == "insert":
+            record = op["record"]
+        elif op.get("op") == "update":
+            old = records.get(op["key"])
+            if old is None:
+                return
+            record = {**old, **op["changes"]}
+        else:
+            return
+
+        key = record.get(self.key_field)
+        old = records.get(key)
+        records[key] = record
+        self._index(indexes, record, old)
+
+    def _replay_wal(self, records: Optional[Dict] = None,
+                    indexes: Optional[Dict] = None) -> None:
+        """Apply log records appended since the last replay."""
+        try:
+            with open(self.wal_path, "rb") as f:
+                f.seek(self._wal_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+
+        # Ignore a trailing partial line; a writer is still appending it
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if line.strip():
+                self._apply(serializer.loads(line), records, indexes)
+        self._wal_offset += end
+
+    def _reload(self) -> None:
+        """Rebuild the state from the snapshot and, in WAL mode, the log."""
+        while True:
+            snapshot = self._stat(self.file_path)
+            wal = self._stat(self.wal_path)
+            # Build the new state aside; readers keep using the old one
+            records: Dict[str, Dict] = {}
+            indexes = self._new_indexes()
+            for record in (self._loader(self.file_path) if snapshot else []):
+                self._apply({"op": "insert", "record": record},
+                            records, indexes)
+            self._wal_offset = 0
+            if wal:
+                self._replay_wal(records, indexes)
+            # If a compaction replaced the files mid-read, the log we
+            # replayed may not belong to the snapshot; read both again
+            wal_after = self._stat(self.wal_path)
+            if (self._stamp(self._stat(self.file_path))
+                    == self._stamp(snapshot) and
+                    self._inode(wal_after) == self._inode(wal)):
+                break
+        self._indexes = indexes
+        self._records = records
+        self._snapshot_stamp = self._stamp(snapshot)
+        self._wal_inode = self._inode(wal)
+        self._loaded = True
+        self._version += 1
+
+    def _is_stale(self) -> bool:
+        if not self._loaded:
+            return True
+        if self._snapshot_changed(self._stat(self.file_path)):
+            return True
+        wal = self._stat(self.wal_path)
+        return (self._inode(wal) != self._wal_inode or
+                (wal.st_size if wal else 0) != self._wal_offset)
+
+    def _current(self, check_files: bool = False) -> None:
+        """
+        Bring the in-memory state up to date with the files.
+
+        While the generation counter is unchanged since the last check
+        (and CACHE_RECHECK_INTERVAL has not passed) no process has
+        written, so the files are not even stat()ed; writers, which
+        must not miss an edit made outside the app, pass check_files.
+        """
+        generation = self._generation.value() if self._generation else None
+        if (not check_files and generation is not None and self._loaded
+                and generation == self._seen_generation and
+                time.monotonic() < self._recheck_at):
+            return
+
+        if self._is_stale():
+            with self._lock:
+                snapshot = self._stat(self.file_path)
+                wal = self._stat(self.wal_path)
+                if (not self._loaded or self._snapshot_changed(snapshot) or
+                        self._inode(wal) != self._wal_inode or
+                        (wal.st_size if wal else 0) < self._wal_offset):
+                    self._reload()
+                elif wal and wal.st_size > self._wal_offset:
+                    self._replay_wal()
+                    self._version += 1
+        # The counter was read before the files, so a write racing with
+        # this check leaves it ahead of what we record here
+        self._seen_generation = generation
+        self._recheck_at = time.monotonic() + CACHE_RECHECK_INTERVAL
+
+    def _announce(self) -> None:
+        """
+        Bump the generation after a write (lock() held) so that other
+        processes' caches pick it up.
+        """
+        if self._generation is None:
+            return
+        generation = self._generation.bump()
+        # Up to date before the write (writers check the files first), so
+        # up to date after it
+        if self._seen_generation == generation - 1:
+            self._seen_generation = generation
+
+    # --- Reads ---
+
+    def lock(self) -> FileLock:
+        """Return the cross-process lock guarding writes to the file."""
+        os.makedirs(os.path.dirname(self.file_path) or ".", exist_ok=True)
+        return timed_lock(self.lock_path)
+
+    def all(self) -> List[Dict]:
+        """Return all records in file order."""
+        self._current()
+        return list(self._records.values())
+
+    def count(self) -> int:
+        """Return the number of records."""
+        self._current()
+        return len(self._records)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the record whose key_field equals key, or None."""
+        self._current()
+        return self._records.get(key)
+
+    def version(self) -> int:
+        """
+        Return a number that changes whenever the records do (after
+        bringing them up to date with the files), for caches of data
+        derived from them. It is only meaningful within this process.
+        """
+        self._current()
+        return self._version
+
+    def get_many(self, keys: List[str]) -> List[Optional[Dict]]:
+        """Return the record (or None) for each key, in the order given."""
+        self._current()
+        get = self._records.get
+        return [get(key) for key in keys]
+
+    def iter_records(self) -> Iterator[Dict]:
+        """
+        Yield all records in file order straight from the files.
+
+        The snapshot is parsed incrementally rather than loaded, so memory
+        stays flat however large the file is (the in-memory cache is not
+        used or filled). The log (WAL mode), which compaction keeps
+        small, is read first; its updates are applied as records stream
+        past and records it inserted follow the snapshot.
+        """
+        snapshot, wal = self._open_pair()
+        try:
+            overlay = self._read_overlay(wal) if wal else {}
+            if snapshot:
+                for record in self._reader(snapshot):
+                    entry = overlay.pop(record.get(self.key_field), None)
+                    if entry is None:
+                        yield record
+                    elif entry["op"] == "insert":
+                        yield entry["record"]
+                    else:
+                        yield {**record, **entry["changes"]}
+            for entry in overlay.values():
+                if entry["op"] == "insert":
+                    yield entry["record"]
+        finally:
+            for f in (snapshot, wal):
+                if f:
+                    f.close()
+
+    def _open_pair(self) -> tuple:
+        """Open the snapshot and the log (if any) that belongs to it."""
+        while True:
+            try:
+                snapshot = open(self.file_path, "rb")
+            except FileNotFoundError:
+                snapshot = None
+            try:
+                wal = open(self.wal_path, "rb")
+            except FileNotFoundError:
+                wal = None
+            # A compaction between the two opens pairs a stale snapshot
+            # with a fresh log; both paths must still name what we opened
+            opened = [f for f in (snapshot, wal) if f]
+            if all(self._inode(self._stat(f.name)) ==
+                   os.fstat(f.fileno()).st_ino for f in opened):
+                return snapshot, wal
+            for f in opened:
+                f.close()
+
+    def _read_overlay(self, wal) -> Dict[str, Dict]:
+        """Fold the log into {key: insert record or merged changes}."""
+        overlay: Dict[str, Dict] = {}
+        self._fold_overlay(overlay, wal.read())
+        return overlay
+
+    def _fold_overlay(self, overlay: Dict[str, Dict], data: bytes) -> int:
+        """
+        Fold log data into overlay; return the number of bytes used (up
+        to the last complete line).
+        """
+        # Ignore a trailing partial line; a writer is still appending it
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            op = serializer.loads(line)
+            if op.get("op") == "insert":
+                key = op["record"].get(self.key_field)
+                if overlay.get(key, op)["op"] == "update":
+                    # Updates before the insert were no-ops
+                    del overlay[key]
+                overlay[key] = op
+            elif op.get("op") == "update":
+                entry = overlay.get(op["key"])
+                if entry is None:
+                    overlay[op["key"]] = op
+                elif entry["op"] == "insert":
+                    entry["record"] = {**entry["record"], **op["changes"]}
+                else:
+                    entry["changes"] = {**entry["changes"], **op["changes"]}
+        return end
+
+    # --- Writes (caller must hold lock()) ---
+
+    def _write(self, ops: List[Dict]) -> bool:
+        """Persist and apply a list of mutation records as one write."""
+        with self._lock:
+            self._current(check_files=True)
+            if self.wal:
+                if not self._append_wal(ops):
+                    return False
+                for op in ops:
+                    self._apply(op)
+                self._version += 1
+                self._announce()
+                self._ensure_compactor()
+                return True
+
+            # Rewrite the whole file from a copy; memory changes only once
+            # the save has succeeded
+            records = dict(self._records)
+            scratch_indexes = self._new_indexes()
+            for op in ops:
+                self._apply(op, records, scratch_indexes)
+            if not self._saver(list(records.values()), self.file_path):
+                return False
+            if self._wal_inode is not None:
+                # The snapshot now holds the records of a log left by WAL
+                # mode; readers reload when it disappears
+                self._drop_wal()
+            for op in ops:
+                self._apply(op)
+            self._version += 1
+            self._snapshot_stamp = self._stamp(self._stat(self.file_path))
+            self._announce()
+            return True
+
+    def insert(self, record: Dict) -> bool:
+        """Append a record and persist it."""
+        return self._write([{"op": "insert", "record": record}])
+
+    def insert_many(self, records: List[Dict]) -> bool:
+        """Append several records with a single file write."""
+        return self._write([
+            {"op": "insert", "record": record} for record in records
+        ])
+
+    def update(self, key: str, changes: Dict) -> Optional[Dict]:
+        """
+        Apply changes to a record and persist them.
+
+        Returns the updated record, or None if the record does not exist
+        or saving failed.
+        """
+        if self.get(key) is None:
+            return None
+        if not self._write(
+            [{"op": "update", "key": key, "changes": changes}]
+        ):
+            return None
+        return self._records.get(key)
+
+    def replace_all(self, records: List[Dict]) -> bool:
+        """Write records as the new snapshot and, in WAL mode, a new log."""
+        with self._lock:
+            if not self._saver(records, self.file_path):
+                return False
+            if self.wal:
+                self._truncate_wal()
+            else:
+                self._drop_wal()
+            self._reload()
+            self._announce()
+            return True
+
+    # --- Group commit ---
+    #
+    # Writes to a store serialize on its one FileLock, not on per-key
+    # (e.g. per-email) striped locks: every write appends to or rewrites
+    # the same file, so that write is the critical section whatever the
+    # lock granularity, and the uniqueness checks need one consistent view
+    # of all keys. Validation and encryption run before the lock, and the
+    # committer takes it once per batch, so what is serialized is one
+    # round of checks and one file write per batch of writes.
+
+    def commit(self, ops: List[Dict],
+               check: Optional[Callable] = None) -> bool:
+        """
+        Persist a list of mutation records as one all-or-nothing write,
+        without the caller holding lock().
+
+        check(repo), if given, runs under the lock just before the write
+        and may raise WriteConflict to reject it; repo reflects the stored
+        state plus the writes accepted before this one in the same batch.
+        Returns False if saving failed.
+        """
+        if not GROUP_COMMIT_ENABLED:
+            with self.lock():
+                with self._lock:
+                    self._current(check_files=True)
+                    if check is not None:
+                        check(self)
+                    return self._write(ops) and self._sync_committed()
+        return self.submit(ops, check).result()
+
+    def submit(self, ops: List[Dict],
+               check: Optional[Callable] = None) -> Future:
+        """Queue a commit() and return a Future for its result."""
+        future: Future = Future()
+        self._commit_queue.put(
+            (ops, check, future, contextvars.copy_context())
+        )
+        self._ensure_committer()
+        return future
+
+    def _ensure_committer(self) -> None:
+        if self._committer is None or not self._committer.is_alive():
+            with self._lock:
+                if self._committer is None or not self._committer.is_alive():
+                    self._committer = threading.Thread(
+                        target=self._commit_loop,
+                        name=f"commit-{os.path.basename(self.file_path)}",
+                        daemon=True
+                    )
+                    self._committer.start()
+
+    def _commit_loop(self) -> None:
+        commit_queue = self._commit_queue
+        while True:
+            batch = [commit_queue.get()]
+            deadline = time.monotonic() + GROUP_COMMIT_MAX_WAIT_MS / 1000
+            while len(batch) < GROUP_COMMIT_MAX_BATCH:
+                try:
+                    batch.append(commit_queue.get(
+                        timeout=max(0.0, deadline - time.monotonic())
+                    ))
+                except queue.Empty:
+                    break
+            # Run in the first caller's context so that helpers logging
+            # through Flask's current_app keep working
+            context = batch[0][3]
+            try:
+                context.run(self._commit_batch, batch)
+            except Exception as e:
+                logger.error(f"Group commit to {self.file_path} failed: "
+                             f"{str(e)}")
+                for _, _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _commit_batch(self, batch: List[tuple]) -> None:
+        """Check and persist a batch of queued writes with one write."""
+        commit_batch_size.observe(len(batch),
+                                  os.path.basename(self.file_path))
+        with span("group_commit"), self.lock():
+            with self._lock:
+                self._current(check_files=True)
+                # Writes accepted so far in this batch, visible to the
+                # checks of the writes after them
+                records: Dict[str, Dict] = {}
+                indexes = self._new_indexes()
+                view = self._batch_view(records, indexes)
+                accepted = []
+                for ops, check, future, _ in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        if check is not None:
+                            with span("commit.check"):
+                                check(view)
+                    except Exception as e:
+                        future.set_exception(e)
+                        continue
+                    for op in ops:
+                        key = op.get("key")
+                        if key is not None and key not in records and \
+                                key in self._records:
+                            records[key] = self._records[key]
+                        old = records.get(key) if key is not None else None
+                        self._apply(op, records, indexes)
+                        if old is not None:
+                            self._hide_released(indexes, old, records[key])
+                    accepted.append((ops, future))
+
+                saved = bool(accepted) and self._write(
+                    [op for ops, _ in accepted for op in ops]
+                ) and self._sync_committed()
+                for _, future in accepted:
+                    future.set_result(saved)
+
+    def _sync_committed(self) -> bool:
+        """
+        Make a commit durable before its callers are answered. In WAL
+        mode the log is fsynced once for the whole batch; JSON mode
+        commits with the snapshot's atomic rename, as before. Returns
+        False if the fsync fails.
+        """
+        if not self.wal:
+            return True
+        try:
+            with span("wal.fsync"):
+                self.sync()
+        except OSError as e:
+            logger.error(f"Failed to fsync {self.wal_path}: {str(e)}")
+            return False
+        return True
+
+    def _hide_released(self, indexes: Dict, old: Dict,
+                       record: Dict) -> None:
+        """
+        Tombstone the unique keys old gave up in the batch indexes. The
+        batch view falls through to the stored indexes, which still map
+        them to the stored record; None makes them read as free.
+        """
+        kept = self._unique_keys(record)
+        for name, key in self._unique_keys(old).items():
+            if key != kept.get(name) and key not in indexes[name]:
+                indexes[name][key] = None
+
+    def _batch_view(self, records: Dict, indexes: Dict):
+        """
+        Return a read-only copy of this repository whose lookups see
+        records and indexes (the batch so far) before the stored state.
+        """
+        view = copy.copy(self)
+        view._records = ChainMap(records, self._records)
+        view._indexes = {
+            name: ChainMap(index, self._indexes[name])
+            for name, index in indexes.items()
+        }
+        # The committer holds the lock and has just brought the state
+        # up to date
+        view._current = lambda: None
+        return view
+
+    # --- Write-ahead log ---
+
+    def _append_wal(self, ops: List[Dict]) -> bool:
+        data = b"".join(serializer.dumps_bytes(op) + b"\n" for op in ops)
+        try:
+            with span("wal.append"), open(self.wal_path, "ab") as f:
+                st = os.fstat(f.fileno())
+                if st.st_ino == self._wal_inode and \
+                        st.st_size > self._wal_offset:
+                    # A torn record left by a crashed writer (we hold the
+                    # lock, so nobody is appending it); replay skipped it
+                    logger.warning(f"Dropping a partial record at the end "
+                                   f"of {self.wal_path}")
+                    f.truncate(self._wal_offset)
+                f.write(data)
+                f.flush()
+                self._unsynced += len(ops)
+                if (self._unsynced >= WAL_FSYNC_BATCH or
+                        time.monotonic() - self._last_sync
+                        >= WAL_FSYNC_INTERVAL):
+                    os.fsync(f.fileno())
+                    self._mark_synced()
+                # The append may have created the log
+                self._wal_inode = os.fstat(f.fileno()).st_ino
+        except OSError as e:
+            logger.error(f"Failed to append to {self.wal_path}: {str(e)}")
+            return False
+        self._wal_offset += len(data)
+        return True
+
+    def _mark_synced(self) -> None:
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def sync(self) -> None:
+        """fsync log records appended by this process."""
+        if not self._unsynced:
+            return
+        with self._lock:
+            try:
+                fd = os.open(self.wal_path, os.O_RDONLY)
+            except FileNotFoundError:
+                return
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self._mark_synced()
+
+    def _truncate_wal(self) -> None:
+        # Replacing the log gives it a new inode, which tells other
+        # processes to reload from the new snapshot
+        temp_path = f"{self.wal_path}.tmp"
+        with open(temp_path, "wb") as f:
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.wal_path)
+        self._mark_synced()
+
+    def _drop_wal(self) -> None:
+        try:
+            os.remove(self.wal_path)
+        except FileNotFoundError:
+            pass
+        self._wal_inode = None
+        self._wal_offset = 0
+
+    def compact(self) -> bool:
+        """Fold the log into the JSON snapshot and start an empty log."""
+        if not self.wal:
+            return False
+        with self.lock():
+            with self._lock:
+                self._current(check_files=True)
+                return self.replace_all(list(self._records.values()))
+
+    def _ensure_compactor(self) -> None:
+        if self._compactor is None or not self._compactor.is_alive():
+            self._compactor = threading.Thread(
+                target=self._compact_loop,
+                name=f"compact-{os.path.basename(self.file_path)}",
+                daemon=True
+            )
+            self._compactor.start()
+
+    def _compact_loop(self) -> None:
+        last_check = time.monotonic()
+        while True:
+            time.sleep(WAL_FSYNC_INTERVAL)
+            try:
+                self.sync()
+                if time.monotonic() - last_check < WAL_COMPACT_INTERVAL:
+                    continue
+                last_check = time.monotonic()
+                wal = self._stat(self.wal_path)
+                if wal and wal.st_size >= WAL_COMPACT_BYTES:
+                    self.compact()
+            except Exception as e:
+                logger.error(
+                    f"Background compaction of {self.file_path} failed: "
+                    f"{str(e)}"
+                )
+
+
+class StudentRepository(JsonFileRepository):
+    """
+    Students indexed by student_id, lowercased email and subject_id.
+
+    With fmt="binary" the snapshot is a student_format.py file instead of
+    a JSON array. Until something loads the whole store, get() then reads
+    single records through the file's memory-mapped index.
+    """
+
+    key_field = "student_id"
+
+    def __init__(self, file_path: str, mode: str = STORAGE_MODE,
+                 fmt: str = STUDENTS_FORMAT):
+        self.binary = fmt == "binary"
+        # Snapshot mapping and folded log of _cold_view()
+        self._cold: Optional[Dict] = None
+        if self.binary:
+            super().__init__(file_path, load_students_binary,
+                             save_students_binary, mode,
+                             reader=iter_students_binary)
+        else:
+            super().__init__(file_path, load_students, save_students_atomic,
+                             mode)
+
+    def count(self) -> int:
+        if self.binary and not self._loaded:
+            with self._lock:
+                # A load may have finished (and closed the mapping)
+                if not self._loaded:
+                    students, overlay = self._cold_view()
+                    inserted = sum(
+                        1 for key, entry in overlay.items()
+                        if entry["op"] == "insert" and
+                        (students is None or
+                         students.offset_of(key) is None)
+                    )
+                    return ((len(students) if students is not None else 0)
+                            + inserted)
+        return super().count()
+
+    def get(self, key: str) -> Optional[Dict]:
+        if self.binary and not self._loaded:
+            return self._lookup_many([key])[0]
+        return super().get(key)
+
+    def get_many(self, keys: List[str]) -> List[Optional[Dict]]:
+        if self.binary and not self._loaded:
+            return self._lookup_many(keys)
+        return super().get_many(keys)
+
+    def _cold_view(self) -> Tuple[Optional[StudentFile], Dict[str, Dict]]:
+        """
+        Return the mapped snapshot and the folded log used to read single
+        students before the store is loaded.
+
+        Both are kept between calls: the snapshot is mapped again only
+        when it is replaced, and only log records appended since the
+        last call are read. Like _current(), the files are not checked
+        while the generation counter has not moved.
+        """
+        with self._lock:
+            generation = (self._generation.value() if self._generation
+                          else None)
+            cold = self._cold
+            if (cold is not None and generation is not None and
+                    cold["generation"] == generation and
+                    time.monotonic() < cold["recheck_at"]):
+                return cold["students"], cold["overlay"]
+
+            snapshot = self._stat(self.file_path)
+            wal = self._stat(self.wal_path)
+            if (cold is None or
+                    cold["snapshot"] != self._stamp(snapshot) or
+                    cold["wal_inode"] != self._inode(wal) or
+                    (wal.st_size if wal else 0) < cold["wal_offset"]):
+                cold = self._open_cold()
+            elif wal and wal.st_size > cold["wal_offset"]:
+                with open(self.wal_path, "rb") as f:
+                    f.seek(cold["wal_offset"])
+                    cold["wal_offset"] += self._fold_overlay(
+                        cold["overlay"], f.read()
+                    )
+            cold["generation"] = generation
+            cold["recheck_at"] = time.monotonic() + CACHE_RECHECK_INTERVAL
+            return cold["students"], cold["overlay"]
+
+    def _open_cold(self) -> Dict:
+        """Map the current snapshot and fold its log (self._lock held)."""
+        snapshot, wal = self._open_pair()
+        try:
+            overlay: Dict[str, Dict] = {}
+            wal_offset = self._fold_overlay(overlay, wal.read()) if wal else 0
+            cold = {
+                # The mapping outlives the file object
+                "students": StudentFile(snapshot) if snapshot else None,
+                "snapshot": (self._stamp(os.fstat(snapshot.fileno()))
+                             if snapshot else None),
+                "wal_inode": os.fstat(wal.fileno()).st_ino if wal else None,
+                "wal_offset": wal_offset,
+                "overlay": overlay
+            }
+        finally:
+            for f in (snapshot, wal):
+                if f:
+                    f.close()
+        if self._cold is not None and self._cold["students"] is not None:
+            self._cold["students"].close()
+        self._cold = cold
+        return cold
+
+    def _reload(self) -> None:
+        super()._reload()
+        # Loaded stores answer from memory; release the cold mapping
+        if self._cold is not None:
+            if self._cold["students"] is not None:
+                self._cold["students"].close()
+            self._cold = None
+
+    def _lookup_many(self, keys: List[str]) -> List[Optional[Dict]]:
+        """Read students from the files without loading the store."""
+        with self._lock:
+            if self._loaded:
+                # Loaded since the caller checked; the mapping is closed
+                return super().get_many(keys)
+            students, overlay = self._cold_view()
+            found = []
+            for key in keys:
+                entry = overlay.get(key)
+                if entry is not None and entry["op"] == "insert":
+                    found.append(entry["record"])
+                    continue
+                record = students.get(key) if students is not None else None
+                if record is not None and entry is not None:
+                    record = {**record, **entry["changes"]}
+                found.append(record)
+            return found
+
+    def _new_indexes(self) -> Dict:
+        # by_subject maps subject_id -> {student_id: record}, in insertion
+        # order, so a student can be moved or replaced in O(1).
+        # sorted_subject caches, per subject, the (created_at, student_id)
+        # keys and records in page order; it is rebuilt lazily after the
+        # subject changes.
+        # search holds the sorted (age, student_id), (email, student_id)
+        # and page-order (created_at, student_id) lists used by search(),
+        # and subject_stats the
+        # per-subject counts of subject_stats(); each is built on first
+        # use and kept up to date by _index() from then on.
+        return {"by_email": {}, "by_subject": {}, "sorted_subject": {},
+                "search": {}, "subject_stats": {}}
+
+    def _index(self, indexes: Dict, record: Dict,
+               old: Optional[Dict]) -> None:
+        by_email = indexes["by_email"]
+        by_subject = indexes["by_subject"]
+        student_id = record.get("student_id")
+
+        if old is not None:
+            old_email = old.get("email", "").lower()
+            if by_email.get(old_email) is old:
+                del by_email[old_email]
+            if old.get("subject_id") != record.get("subject_id"):
+                by_subject.get(old.get("subject_id"), {}).pop(
+                    student_id, None
+                )
+
+        by_email[record.get("email", "").lower()] = record
+        by_subject.setdefault(record.get("subject_id"), {})[
+            student_id
+        ] = record
+
+        sorted_subject = indexes["sorted_subject"]
+        sorted_subject.pop(record.get("subject_id"), None)
+        if old is not None:
+            sorted_subject.pop(old.get("subject_id"), None)
+
+        search = indexes["search"]
+        if search:
+            ages, emails = search["by_age"], search["by_email"]
+            pages = search["by_page"]
+            if old is not None:
+                _sorted_remove(ages, _age_entry(old))
+                _sorted_remove(emails, _email_entry(old))
+                _sorted_remove(pages, page_key(old))
+            entry = _age_entry(record)
+            if entry is not None:
+                bisect.insort(ages, entry)
+            bisect.insort(emails, _email_entry(record))
+            bisect.insort(pages, page_key(record))
+
+        stats = indexes["subject_stats"]
+        if stats:
+            if old is not None:
+                _stats_add(stats, old, -1)
+            _stats_add(stats, record, 1)
+
+    def _unique_keys(self, record: Dict) -> Dict[str, str]:
+        return {"by_email": record.get("email", "").lower()}
+
+    def get_by_email(self, email: str) -> Optional[Dict]:
+        """Return the student with email (case insensitive), or None."""
+        self._current()
+        return self._indexes["by_email"].get(email.lower())
+
+    def by_subject(self, subject_id: str) -> List[Dict]:
+        """Return students enrolled in subject_id, in insertion order."""
+        self._current()
+        return list(self._indexes["by_subject"].get(subject_id, {}).values())
+
+    def page_by_subject(
+        self,
+        subject_id: str,
+        after: Optional[Tuple[str, str]],
+        limit: int
+    ) -> Tuple[List[Dict], bool]:
+        """
+        Return up to limit students of subject_id ordered by
+        (created_at, student_id), starting after the key after, and
+        whether more students follow.
+        """
+        self._current()
+        ordered = self._indexes["sorted_subject"].get(subject_id)
+        if ordered is None:
+            # Sort under the lock so a concurrent write cannot change the
+            # subject (and drop its cache entry) between sort and store
+            with self._lock:
+                indexes = self._indexes
+                ordered = indexes["sorted_subject"].get(subject_id)
+                if ordered is None:
+                    records = sorted(
+                        indexes["by_subject"].get(subject_id, {}).values(),
+                        key=page_key
+                    )
+                    ordered = ([page_key(r) for r in records], records)
+                    indexes["sorted_subject"][subject_id] = ordered
+
+        keys, records = ordered
+        start = bisect.bisect_right(keys, after) if after else 0
+        return records[start:start + limit], start + limit < len(records)
+
+    def _search_index(self) -> Dict:
+        search = self._indexes["search"]
+        if not search:
+            with self._lock:
+                search = self._indexes["search"]
+                if not search:
+                    records = self._records.values()
+                    search["by_email"] = sorted(map(_email_entry, records))
+                    search["by_age"] = sorted(
+                        entry for entry in map(_age_entry, records)
+                        if entry is not None
+                    )
+                    search["by_page"] = sorted(map(page_key, records))
+        return search
+
+    def subject_stats(self, rebuild: bool = False) -> Dict[str, Dict]:
+        """
+        Return {subject_id: {"count": n, "ages": {age: n}}} for every
+        subject with students.
+
+        The counts are computed from all records on first use (or with
+        rebuild=True) and then updated as students are added, changed or
+        moved between subjects.
+        """
+        self._current()
+        indexes = self._indexes
+        if rebuild or not indexes["subject_stats"]:
+            with self._lock:
+                stats = indexes["subject_stats"]
+                if rebuild or not stats:
+                    stats.clear()
+                    stats.update(subject_age_counts(self._records.values()))
+        with self._lock:
+            return {
+                subject_id: {"count": entry["count"],
+                             "ages": dict(entry["ages"])}
+                for subject_id, entry in indexes["subject_stats"].items()
+            }
+
+    def search(
+        self,
+        subject_id: Optional[str] = None,
+        min_age: Optional[int] = None,
+        max_age: Optional[int] = None,
+        email_prefix: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+        limit: int = 100
+    ) -> Tuple[List[Dict], bool]:
+        """
+        Return up to limit students matching every given filter, ordered
+        by (created_at, student_id) and starting after the key after, and
+        whether more students follow.
+
+        Each filter gives a posting list of student ids: a bisected slice
+        of the sorted age or email index, or the subject's entry in the
+        subject index. Only the smallest list is built; its students are
+        checked against the other filters directly. Without filters, the
+        page is a bisected slice of the index kept in page order.
+        """
+        has_range = min_age is not None or max_age is not None
+        filtered = has_range or email_prefix is not None
+        if not filtered and subject_id is not None:
+            return self.page_by_subject(subject_id, after, limit)
+
+        self._current()
+        search = self._search_index()
+        records = self._records
+        if not filtered:
+            by_page = search["by_page"]
+            start = bisect.bisect_right(by_page, after) if after else 0
+            page = [records[student_id]
+                    for _, student_id in by_page[start:start + limit]
+                    if student_id in records]
+            return page, start + limit < len(by_page)
+
+        # Posting list sizes, known from the indexes without building them
+        sizes = {}
+        if subject_id is not None:
+            in_subject = self._indexes["by_subject"].get(subject_id, {})
+            sizes["subject"] = len(in_subject)
+        if has_range:
+            by_age = search["by_age"]
+            age_lo = (bisect.bisect_left(by_age, (min_age,))
+                      if min_age is not None else 0)
+            age_hi = (bisect.bisect_left(by_age, (max_age + 1,))
+                      if max_age is not None else len(by_age))
+            sizes["age"] = age_hi - age_lo
+        if email_prefix is not None:
+            by_email = search["by_email"]
+            prefix = email_prefix.lower()
+            email_lo = bisect.bisect_left(by_email, (prefix,))
+            email_hi = bisect.bisect_left(by_email, (prefix + "\U0010ffff",))
+            sizes["email"] = email_hi - email_lo
+
+        smallest = min(sizes, key=sizes.get)
+        if smallest == "subject":
+            keys = list(in_subject)
+        elif smallest == "age":
+            keys = [student_id for _, student_id in by_age[age_lo:age_hi]]
+        else:
+            keys = [student_id
+                    for _, student_id in by_email[email_lo:email_hi]]
+
+        def matches(record: Dict) -> bool:
+            if (subject_id is not None and
+                    record.get("subject_id") != subject_id):
+                return False
+            if has_range:
+                age = record.get("age")
+                if (type(age) is not int or
+                        (min_age is not None and age < min_age) or
+                        (max_age is not None and age > max_age)):
+                    return False
+            return (email_prefix is None or
+                    record.get("email", "").lower().startswith(prefix))
+
+        found = []
+        for key in keys:
+            record = records.get(key)
+            if (record is not None and matches(record) and
+                    (not after or page_key(record) > after)):
+                found.append(record)
+        page = heapq.nsmallest(limit, found, key=page_key)
+        return page, len(found) > limit
+
+
+class SubjectRepository(JsonFileRepository):
+    """
+    The subject catalog: subjects indexed by subject_id and by
+    case-folded subject_name (so "STRASSE" and "Straße" are one name).
+    """
+
+    key_field = "subject_id"
+
+    def __init__(self, file_path: str, mode: str = STORAGE_MODE):
+        super().__init__(file_path, load_subjects, save_subjects_atomic, mode)
+
+    def _new_indexes(self) -> Dict:
+        return {"by_name": {}}
+
+    def _index(self, indexes: Dict, record: Dict,
+               old: Optional[Dict]) -> None:
+        by_name = indexes["by_name"]
+        if old is not None:
+            old_name = old.get("subject_name", "").casefold()
+            if by_name.get(old_name) is old:
+                del by_name[old_name]
+        by_name[record.get("subject_name", "").casefold()] = record
+
+    def _unique_keys(self, record: Dict) -> Dict[str, str]:
+        return {"by_name": record.get("subject_name", "").casefold()}
+
+    def get_by_name(self, name: str) -> Optional[Dict]:
+        """Return the subject named name (case insensitive), or None."""
+        self._current()
+        return self._indexes["by_name"].get(name.casefold())
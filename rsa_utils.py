@@ -1,14 +1,31 @@
+import hashlib
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from cryptography.hazmat.primitives.asymmetric import rsa, padding
 from cryptography.hazmat.primitives import serialization, hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.backends import default_backend
-from config import RSA_PASSPHRASE
+from config import RSA_PASSPHRASE, NAME_ENCRYPTION_FORMAT
+from config import DECRYPT_WORKERS, DECRYPT_CHUNK_SIZE
+from config import NAME_CACHE_ENABLED, NAME_CACHE_SIZE, NAME_CACHE_TTL
+from config import EXPORT_BATCH_SIZE
+from metrics import timed
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 KEYS_DIR = "root/keys"
+# Prefix of envelope-encrypted name_encrypted values; anything without a
+# prefix is a legacy hex RSA-OAEP blob
+ENVELOPE_PREFIX = "v2"
+NONCE_SIZE = 12
 PRIVATE_KEY_PATH = os.path.join(KEYS_DIR, "private_key.pem")
 PUBLIC_KEY_PATH = os.path.join(KEYS_DIR, "public_key.pem")
 
 
+@timed("keys.load")
 def generate_or_load_keys():
     """Generate RSA key pair if not exists, else load existing keys."""
     os.makedirs(KEYS_DIR, exist_ok=True)
@@ -58,20 +75,433 @@ def generate_or_load_keys():
     return private_key, public_key
 
 
+class KeyProvider:
+    """
+    Process-wide holder for the RSA key pair.
+
+    Keys are loaded lazily on first use and kept in memory, so routes no
+    longer re-read both PEM files and re-run the passphrase KDF per request.
+    The PEM files are stat'ed on access and reloaded when their mtime/size
+    changes (key rotation). After a fork (gunicorn prefork) the child drops
+    the inherited state and reloads on first use.
+    """
+
+    def __init__(self):
+        self._reset()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        """Forget cached keys; used at startup and in forked children."""
+        self._lock = threading.Lock()
+        self._keys = None
+        self._stamp = None
+        self._data_key = None
+        self._pid = os.getpid()
+
+    @staticmethod
+    def _file_stamp():
+        """Return (mtime_ns, size) for both PEM files, or None if missing."""
+        try:
+            priv = os.stat(PRIVATE_KEY_PATH)
+            pub = os.stat(PUBLIC_KEY_PATH)
+        except FileNotFoundError:
+            return None
+        return (priv.st_mtime_ns, priv.st_size,
+                pub.st_mtime_ns, pub.st_size)
+
+    def get_keys(self):
+        """Return (private_key, public_key), loading or reloading if needed."""
+        if self._pid != os.getpid():
+            self._reset()
+
+        stamp = self._file_stamp()
+        keys = self._keys
+        if keys is not None and stamp == self._stamp:
+            return keys
+
+        with self._lock:
+            stamp = self._file_stamp()
+            if self._keys is None or stamp != self._stamp:
+                self._keys = generate_or_load_keys()
+                self._stamp = self._file_stamp()
+                self._data_key = None
+            return self._keys
+
+    def get_data_key(self):
+        """
+        Return (data_key, wrapped_data_key) used for new name records.
+
+        The AES-256 data key is generated once per process and key pair and
+        wrapped with the RSA public key, so encrypting a name costs one
+        AES-GCM operation instead of an RSA operation.
+        """
+        _, public_key = self.get_keys()
+        data_key = self._data_key
+        if data_key is not None and data_key[2] is public_key:
+            return data_key[0], data_key[1]
+
+        with self._lock:
+            if self._data_key is None or self._data_key[2] is not public_key:
+                key = AESGCM.generate_key(bit_length=256)
+                self._data_key = (key, encrypt_name_bytes(key, public_key),
+                                  public_key)
+            return self._data_key[0], self._data_key[1]
+
+    def own_data_key(self, wrapped: bytes) -> Optional[bytes]:
+        """Return this process's data key if it matches wrapped, else None."""
+        data_key = self._data_key
+        if data_key is not None and data_key[1] == wrapped:
+            return data_key[0]
+        return None
+
+    def invalidate(self):
+        """Drop cached keys so the next access reloads them from disk."""
+        with self._lock:
+            self._keys = None
+            self._stamp = None
+            self._data_key = None
+
+
+key_provider = KeyProvider()
+
+
+def get_keys():
+    """Return the cached (private_key, public_key) pair."""
+    return key_provider.get_keys()
+
+
 # Encrypt & Decrypt
+def _oaep():
+    return padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()),
+                        algorithm=hashes.SHA256(),
+                        label=None)
+
+
+@timed("rsa.encrypt")
+def encrypt_name_bytes(data: bytes, public_key) -> bytes:
+    return public_key.encrypt(data, _oaep())
+
+
+@timed("rsa.decrypt")
+def decrypt_name_bytes(encrypted: bytes, private_key) -> bytes:
+    return private_key.decrypt(encrypted, _oaep())
+
+
 def encrypt_name(name: str, public_key) -> bytes:
-    return public_key.encrypt(
-        name.encode(),
-        padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                     algorithm=hashes.SHA256(),
-                     label=None)
-    )
+    return encrypt_name_bytes(name.encode(), public_key)
 
 
 def decrypt_name(encrypted_name: bytes, private_key) -> str:
-    return private_key.decrypt(
-        encrypted_name,
-        padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                     algorithm=hashes.SHA256(),
-                     label=None)
+    return decrypt_name_bytes(encrypted_name, private_key).decode()
+
+
+# Envelope (v2) name_encrypted values
+#
+#   v2:<rsa-wrapped data key hex>:<nonce hex>:<aes-gcm ciphertext hex>
+#
+# Legacy values are the bare hex of an RSA-OAEP ciphertext.
+def is_envelope(value: str) -> bool:
+    """Return True if a stored name_encrypted value uses the v2 format."""
+    return value.startswith(ENVELOPE_PREFIX + ":")
+
+
+@timed("name.encrypt")
+def encrypt_name_field(name: str, public_key=None) -> str:
+    """
+    Encrypt a name into the string stored in name_encrypted.
+
+    Uses the envelope format unless NAME_ENCRYPTION_FORMAT is "legacy".
+    public_key is only needed for the legacy format; the envelope format
+    wraps the process data key with the provider's current public key.
+    """
+    if NAME_ENCRYPTION_FORMAT == "legacy":
+        if public_key is None:
+            _, public_key = key_provider.get_keys()
+        return encrypt_name(name, public_key).hex()
+
+    data_key, wrapped = key_provider.get_data_key()
+    nonce = os.urandom(NONCE_SIZE)
+    ciphertext = AESGCM(data_key).encrypt(nonce, name.encode(), None)
+    return ":".join(
+        (ENVELOPE_PREFIX, wrapped.hex(), nonce.hex(), ciphertext.hex())
+    )
+
+
+@timed("name.encrypt_batch")
+def encrypt_name_fields(names: Iterable[str], public_key=None) -> List[str]:
+    """
+    Encrypt many names for name_encrypted, looking up the data key once.
+    """
+    if NAME_ENCRYPTION_FORMAT == "legacy":
+        return [encrypt_name_field(name, public_key) for name in names]
+
+    data_key, wrapped = key_provider.get_data_key()
+    cipher = AESGCM(data_key)
+    prefix = f"{ENVELOPE_PREFIX}:{wrapped.hex()}:"
+    values = []
+    for name in names:
+        nonce = os.urandom(NONCE_SIZE)
+        ciphertext = cipher.encrypt(nonce, name.encode(), None)
+        values.append(f"{prefix}{nonce.hex()}:{ciphertext.hex()}")
+    return values
+
+
+def _unwrap_data_key(wrapped_hex: str, private_key,
+                     unwrapped: Dict[str, AESGCM]) -> AESGCM:
+    """Return the AESGCM cipher for a wrapped key, unwrapping at most once."""
+    cipher = unwrapped.get(wrapped_hex)
+    if cipher is None:
+        wrapped = bytes.fromhex(wrapped_hex)
+        data_key = key_provider.own_data_key(wrapped)
+        if data_key is None:
+            data_key = decrypt_name_bytes(wrapped, private_key)
+        cipher = AESGCM(data_key)
+        unwrapped[wrapped_hex] = cipher
+    return cipher
+
+
+def _decrypt_field(value: str, private_key,
+                   unwrapped: Dict[str, AESGCM]) -> str:
+    if not is_envelope(value):
+        return decrypt_name(bytes.fromhex(value), private_key)
+    _, wrapped_hex, nonce_hex, ciphertext_hex = value.split(":")
+    cipher = _unwrap_data_key(wrapped_hex, private_key, unwrapped)
+    return cipher.decrypt(
+        bytes.fromhex(nonce_hex), bytes.fromhex(ciphertext_hex), None
     ).decode()
+
+
+class NameCache:
+    """
+    Bounded LRU cache of decrypted names keyed by a SHA-256 digest of the
+    stored ciphertext, with per-entry TTL.
+
+    Disable it (NAME_CACHE_ENABLED=false) where plaintext PII must not be
+    kept in memory beyond a request.
+    """
+
+    def __init__(self, max_size: int, ttl: float, enabled: bool = True):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.enabled = enabled and max_size > 0
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _digest(value: str) -> bytes:
+        return hashlib.sha256(value.encode()).digest()
+
+    def get(self, value: str) -> Optional[str]:
+        """Return the cached name for a ciphertext, or None on a miss."""
+        if not self.enabled:
+            return None
+        key = self._digest(value)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, name = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return name
+
+    def put(self, value: str, name: str) -> None:
+        if not self.enabled:
+            return
+        key = self._digest(value)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, name)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, value: str) -> None:
+        """Forget the name cached for a ciphertext (e.g. after a rename)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries.pop(self._digest(value), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+
+name_cache = NameCache(NAME_CACHE_SIZE, NAME_CACHE_TTL, NAME_CACHE_ENABLED)
+
+
+@timed("name.decrypt")
+def decrypt_name_field(value: str, private_key) -> str:
+    """Decrypt a stored name_encrypted value (v2 or legacy hex)."""
+    name = name_cache.get(value)
+    if name is None:
+        name = _decrypt_field(value, private_key, {})
+        name_cache.put(value, name)
+    return name
+
+
+# Parallel decryption
+#
+# OpenSSL releases the GIL during RSA private-key operations, so legacy
+# records decrypt in parallel on a thread pool. Pools are created lazily per
+# worker count and dropped in forked children.
+_pools: Dict[int, ThreadPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def _reset_pools():
+    global _pools_lock
+    _pools.clear()
+    _pools_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_pools)
+
+
+def _get_pool(workers: int) -> ThreadPoolExecutor:
+    pool = _pools.get(workers)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(workers)
+            if pool is None:
+                pool = ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix="decrypt"
+                )
+                _pools[workers] = pool
+    return pool
+
+
+def _decrypt_chunk(values: List[str], private_key,
+                   unwrapped: Dict[str, AESGCM],
+                   error_value: Optional[str],
+                   cache: bool = True) -> List[str]:
+    names = []
+    for value in values:
+        try:
+            name = _decrypt_field(value, private_key, unwrapped)
+        except Exception:
+            if error_value is None:
+                raise
+            names.append(error_value)
+            continue
+        if cache:
+            name_cache.put(value, name)
+        names.append(name)
+    return names
+
+
+@timed("name.decrypt_batch")
+def decrypt_name_fields(values: Iterable[str], private_key,
+                        error_value: Optional[str] = None,
+                        workers: Optional[int] = None,
+                        chunk_size: Optional[int] = None,
+                        cache: bool = True) -> List[str]:
+    """
+    Decrypt many name_encrypted values in one call.
+
+    Each distinct wrapped data key is unwrapped once per batch, so a batch
+    of envelope records costs a handful of RSA operations rather than one
+    per record. Values that fail to decrypt are returned as error_value,
+    or raise if error_value is None.
+
+    Batches larger than one chunk are split into chunks of chunk_size
+    (DECRYPT_CHUNK_SIZE) and decrypted on a pool of workers
+    (DECRYPT_WORKERS) threads; results keep the input order.
+
+    With cache=False the name cache is neither read nor filled, for
+    one-off scans (exports) that would otherwise evict the hot entries.
+    """
+    values = list(values)
+    workers = DECRYPT_WORKERS if workers is None else workers
+    chunk_size = max(1, chunk_size or DECRYPT_CHUNK_SIZE)
+    unwrapped: Dict[str, AESGCM] = {}
+
+    # Serve what we can from the name cache; only misses are decrypted
+    names: List[Optional[str]] = [
+        name_cache.get(v) if cache else None for v in values
+    ]
+    missing = [i for i, name in enumerate(names) if name is None]
+    pending = [values[i] for i in missing]
+
+    if workers <= 1 or len(pending) <= chunk_size:
+        decrypted = _decrypt_chunk(pending, private_key, unwrapped,
+                                   error_value, cache)
+    else:
+        chunks = [
+            pending[i:i + chunk_size]
+            for i in range(0, len(pending), chunk_size)
+        ]
+        decrypted = []
+        for chunk_names in _get_pool(workers).map(
+            lambda chunk: _decrypt_chunk(
+                chunk, private_key, unwrapped, error_value, cache
+            ),
+            chunks
+        ):
+            decrypted.extend(chunk_names)
+
+    for i, name in zip(missing, decrypted):
+        names[i] = name
+    return names
+
+
+def iter_decrypted(records: Iterable[Dict], private_key,
+                   error_value: Optional[str] = None,
+                   batch_size: Optional[int] = None
+                   ) -> Iterator[Tuple[Dict, str]]:
+    """
+    Yield (record, decrypted name) for a stream of student records.
+
+    Records are taken batch_size (EXPORT_BATCH_SIZE) at a time and each
+    batch is decrypted with decrypt_name_fields on a background thread
+    while the previous batch is being consumed and the next one read, so
+    only about two batches are held in memory. The name cache is bypassed.
+    """
+    batch_size = max(1, batch_size or EXPORT_BATCH_SIZE)
+    records = iter(records)
+    prefetch = ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix="decrypt-prefetch"
+    )
+    try:
+        previous = None
+        while True:
+            batch = list(islice(records, batch_size))
+            current = batch and (batch, prefetch.submit(
+                decrypt_name_fields,
+                [r.get("name_encrypted", "") for r in batch],
+                private_key, error_value, cache=False
+            ))
+            if previous:
+                yield from zip(previous[0], previous[1].result())
+            if not current:
+                return
+            previous = current
+    finally:
+        prefetch.shutdown(wait=False, cancel_futures=True)
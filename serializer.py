@@ -0,0 +1,131 @@
+"""
+serializer.py
+
+One JSON serializer for the data files, the WAL, the session store and
+HTTP responses.
+
+orjson is used when installed (JSON_BACKEND=auto) and the stdlib json
+module otherwise, or either one can be forced with JSON_BACKEND. Both
+produce the same compact UTF-8 layout: no spaces, non-ASCII characters
+unescaped, keys in insertion order. So files written by one backend
+read back identically with the other, and switching backends does not
+rewrite anything. Values orjson rejects (integers beyond 64 bits, NaN
+literals on input) fall back to the stdlib, so anything the old code
+read or wrote still works.
+
+JSONProvider plugs the serializer into Flask for jsonify() and
+request.get_json().
+"""
+
+import json
+from typing import Any, Callable, Optional
+
+from flask.json.provider import DefaultJSONProvider
+
+from config import JSON_BACKEND, JSON_INDENT
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+if JSON_BACKEND not in ("auto", "orjson", "stdlib"):
+    raise ValueError(f"Unknown JSON_BACKEND {JSON_BACKEND!r}")
+if JSON_BACKEND == "orjson" and orjson is None:
+    raise ImportError("JSON_BACKEND=orjson but orjson is not installed")
+
+# orjson's decode error subclasses this one, so callers catch just it
+JSONDecodeError = json.JSONDecodeError
+BACKEND = ("orjson" if orjson is not None and JSON_BACKEND != "stdlib"
+           else "stdlib")
+
+_COMPACT = (",", ":")
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _stdlib_dumps(obj: Any, indent: int = 0, sort_keys: bool = False,
+                  default: Optional[Callable] = None) -> str:
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=indent,
+                          sort_keys=sort_keys, default=default)
+    return json.dumps(obj, ensure_ascii=False, separators=_COMPACT,
+                      sort_keys=sort_keys, default=default)
+
+
+def dumps_bytes(obj: Any, indent: int = 0, sort_keys: bool = False,
+                default: Optional[Callable] = None) -> bytes:
+    """Serialize obj to UTF-8 JSON, compact unless indent is set."""
+    if BACKEND == "orjson" and indent in (0, 2):
+        option = _ORJSON_OPTIONS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if default is not None:
+            # Let default format datetimes, as the stdlib path does
+            option |= orjson.OPT_PASSTHROUGH_DATETIME
+        try:
+            return orjson.dumps(obj, default=default, option=option)
+        except orjson.JSONEncodeError:
+            pass
+    return _stdlib_dumps(obj, indent, sort_keys, default).encode("utf-8")
+
+
+def dumps(obj: Any, indent: int = 0, sort_keys: bool = False,
+          default: Optional[Callable] = None) -> str:
+    """Serialize obj to a JSON string, compact unless indent is set."""
+    if BACKEND == "orjson":
+        return dumps_bytes(obj, indent, sort_keys, default).decode("utf-8")
+    return _stdlib_dumps(obj, indent, sort_keys, default)
+
+
+def loads(data: Any) -> Any:
+    """Parse JSON from str or UTF-8 bytes."""
+    if BACKEND == "orjson":
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # Let the stdlib accept what it always did (NaN, huge ints),
+            # or raise its own error for corrupt input
+            pass
+    return json.loads(data)
+
+
+def load_file(file_path: str) -> Any:
+    """Parse a JSON file; raises FileNotFoundError or JSONDecodeError."""
+    with open(file_path, "rb") as f:
+        return loads(f.read())
+
+
+def write_file(obj: Any, file_path: str, indent: int = JSON_INDENT) -> None:
+    """Write obj as JSON to file_path (JSON_INDENT unless indent given)."""
+    with open(file_path, "wb") as f:
+        f.write(dumps_bytes(obj, indent))
+
+
+class JSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider on the serializer. jsonify() keeps Flask's sorted
+    keys, its compact (or, in debug, indented) layout and its conversion
+    of dates, UUIDs and dataclasses; non-ASCII characters are sent as
+    UTF-8 instead of \\u escapes.
+    """
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        indent = kwargs.pop("indent", None) or 0
+        kwargs.pop("separators", None)
+        kwargs.pop("ensure_ascii", None)
+        sort_keys = kwargs.pop("sort_keys", self.sort_keys)
+        default = kwargs.pop("default", self.default)
+        if kwargs:
+            # Options the serializer does not cover
+            return super().dumps(obj, indent=indent or None,
+                                 sort_keys=sort_keys, default=default,
+                                 **kwargs)
+        return dumps(obj, indent, sort_keys, default)
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return loads(s)
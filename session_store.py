@@ -0,0 +1,344 @@
+"""
+session_store.py
+
+Pluggable storage for the user sessions created by /add_user_session.
+
+- JsonSessionStore: the original root/database/session/session.json file,
+  now written under a FileLock so concurrent logins don't lose entries.
+  With CACHE_COHERENCE=generation the parsed file is cached and reused
+  until a writer in any process bumps the file's generation counter.
+- SqliteSessionStore: one row per session in a SQLite database with a
+  primary key on session_id and a unique index on email, so lookups and
+  duplicate-email checks are O(1)/O(log n) and an insert touches one row
+  instead of rewriting the whole file.
+
+Sessions expire SESSION_TTL seconds after creation. Expired sessions are
+ignored on read (lazy expiry) and removed by sweep(), which runs on every
+JSON write (the file is being rewritten anyway) and on a background
+thread every SESSION_SWEEP_INTERVAL seconds.
+
+config.SESSION_BACKEND selects the store returned by create_session_store().
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+from config import SESSION_BACKEND, SESSION_FILE, SESSION_DB_FILE
+from config import SESSION_TTL, SESSION_SWEEP_INTERVAL
+from config import CACHE_RECHECK_INTERVAL
+from generation import generation_for
+from helpers import load_sessions, save_sessions
+from metrics import timed_lock
+import serializer
+
+logger = logging.getLogger(__name__)
+
+# Key holding the expiry timestamp inside a session.json entry
+EXPIRES_KEY = "_expires_at"
+
+
+class SessionStore:
+    """Interface implemented by the session stores."""
+
+    def __init__(self, ttl: float = SESSION_TTL,
+                 sweep_interval: float = SESSION_SWEEP_INTERVAL):
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        # Sessions alive after the last sweep, and sessions this process
+        # has evicted since it started
+        self.live = 0
+        self.evicted = 0
+        self.last_sweep = None
+        self._sweeper = None
+        self._sweeper_pid = None
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        """Return the user data stored for session_id, or None."""
+        raise NotImplementedError
+
+    def email_exists(self, email: str) -> bool:
+        """Return True if any live session has this email."""
+        raise NotImplementedError
+
+    def add(self, user_data: Dict) -> Optional[str]:
+        """
+        Store user_data under a new session ID and return the ID.
+
+        Returns None if another live session already uses the same email;
+        the check and the insert are atomic.
+        """
+        raise NotImplementedError
+
+    def sweep(self) -> int:
+        """Remove expired sessions and return how many were removed."""
+        raise NotImplementedError
+
+    def stats(self) -> Dict:
+        return {
+            "live": self.live,
+            "evicted": self.evicted,
+            "last_sweep": self.last_sweep
+        }
+
+    def _record_sweep(self, evicted: int, live: int) -> None:
+        self.evicted += evicted
+        self.live = live
+        self.last_sweep = time.time()
+
+    def _ensure_sweeper(self) -> None:
+        """Start the background sweeper (again, after a fork) if enabled."""
+        if self.sweep_interval <= 0:
+            return
+        if (self._sweeper_pid == os.getpid() and
+                self._sweeper is not None and self._sweeper.is_alive()):
+            return
+        self._sweeper_pid = os.getpid()
+        self._sweeper = threading.Thread(
+            target=self._sweep_loop, name="session-sweeper", daemon=True
+        )
+        self._sweeper.start()
+
+    def _sweep_loop(self) -> None:
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Session sweep failed: {str(e)}")
+
+
+class JsonSessionStore(SessionStore):
+    """Sessions kept in a single JSON object file (config.SESSION_FILE)."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.lock_path = f"{SESSION_FILE}.lock"
+        self._generation = generation_for(SESSION_FILE)
+        # (generation, file stamp, recheck deadline, sessions); the
+        # cached dict is never modified, writers cache a new one
+        self._cache = None
+
+    @staticmethod
+    def _stamp() -> Optional[tuple]:
+        try:
+            st = os.stat(SESSION_FILE)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _sessions(self) -> Dict:
+        """Return the sessions, parsing the file only when it changed."""
+        if self._generation is None:
+            return load_sessions()
+        generation = self._generation.value()
+        cache = self._cache
+        if cache is not None and cache[0] == generation:
+            if time.monotonic() < cache[2]:
+                return cache[3]
+            # Recheck for writers outside the app
+            if cache[1] == self._stamp():
+                self._cache = (generation, cache[1],
+                               time.monotonic() + CACHE_RECHECK_INTERVAL,
+                               cache[3])
+                return cache[3]
+        stamp = self._stamp()
+        sessions = load_sessions()
+        self._cache = (generation, stamp,
+                       time.monotonic() + CACHE_RECHECK_INTERVAL, sessions)
+        return sessions
+
+    def _saved(self, sessions: Dict) -> None:
+        """Announce a save (lock held) and cache what was written."""
+        if self._generation is None:
+            return
+        generation = self._generation.bump()
+        self._cache = (generation, self._stamp(),
+                       time.monotonic() + CACHE_RECHECK_INTERVAL, sessions)
+
+    @staticmethod
+    def _is_live(entry: Dict, now: float) -> bool:
+        # Entries written before expiry existed are live until the next
+        # sweep stamps them
+        return entry.get(EXPIRES_KEY, now + 1) > now
+
+    def _prune(self, sessions: Dict, now: float) -> int:
+        """Drop expired entries in place; stamp unstamped ones."""
+        expired = [
+            session_id for session_id, entry in sessions.items()
+            if not self._is_live(entry, now)
+        ]
+        for session_id in expired:
+            del sessions[session_id]
+        for entry in sessions.values():
+            entry.setdefault(EXPIRES_KEY, now + self.ttl)
+        return len(expired)
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        self._ensure_sweeper()
+        entry = self._sessions().get(session_id)
+        if entry is None or not self._is_live(entry, time.time()):
+            return None
+        return {k: v for k, v in entry.items() if k != EXPIRES_KEY}
+
+    def email_exists(self, email: str) -> bool:
+        now = time.time()
+        return any(
+            user.get("email") == email and self._is_live(user, now)
+            for user in self._sessions().values()
+        )
+
+    def add(self, user_data: Dict) -> Optional[str]:
+        self._ensure_sweeper()
+        os.makedirs(os.path.dirname(SESSION_FILE), exist_ok=True)
+        with timed_lock(self.lock_path):
+            now = time.time()
+            sessions = load_sessions()
+            # Amortized sweep: the file is rewritten below anyway
+            evicted = self._prune(sessions, now)
+            if any(user.get("email") == user_data.get("email")
+                   for user in sessions.values()):
+                return None
+            session_id = str(uuid.uuid4())
+            sessions[session_id] = {**user_data, EXPIRES_KEY: now + self.ttl}
+            save_sessions(sessions)
+            self._saved(sessions)
+            self._record_sweep(evicted, len(sessions))
+            return session_id
+
+    def sweep(self) -> int:
+        if not os.path.exists(SESSION_FILE):
+            return 0
+        with timed_lock(self.lock_path):
+            sessions = load_sessions()
+            unstamped = any(EXPIRES_KEY not in e for e in sessions.values())
+            evicted = self._prune(sessions, time.time())
+            if evicted or unstamped:
+                save_sessions(sessions)
+                self._saved(sessions)
+            self._record_sweep(evicted, len(sessions))
+            return evicted
+
+
+class SqliteSessionStore(SessionStore):
+    """Sessions kept in a SQLite table with an email index."""
+
+    def __init__(self, db_path: str = SESSION_DB_FILE, **kwargs):
+        super().__init__(**kwargs)
+        self.db_path = db_path
+        self._local = threading.local()
+        self._pid = os.getpid()
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " session_id TEXT PRIMARY KEY,"
+                " email TEXT NOT NULL,"
+                " data TEXT NOT NULL,"
+                " expires_at REAL)"
+            )
+            columns = [
+                row[1] for row in conn.execute("PRAGMA table_info(sessions)")
+            ]
+            if "expires_at" not in columns:
+                conn.execute("ALTER TABLE sessions ADD COLUMN expires_at REAL")
+            conn.execute(
+                "UPDATE sessions SET expires_at = ? WHERE expires_at IS NULL",
+                (now + self.ttl,)
+            )
+            conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ix_sessions_email"
+                " ON sessions (email)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_sessions_expires_at"
+                " ON sessions (expires_at)"
+            )
+            # First run: carry over sessions from the JSON file
+            if conn.execute("SELECT 1 FROM sessions LIMIT 1").fetchone() \
+                    is None:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO sessions"
+                    " (session_id, email, data, expires_at)"
+                    " VALUES (?, ?, ?, ?)",
+                    [(session_id, user.get("email"),
+                      serializer.dumps({k: v for k, v in user.items()
+                                        if k != EXPIRES_KEY}),
+                      user.get(EXPIRES_KEY, now + self.ttl))
+                     for session_id, user in load_sessions().items()]
+                )
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection (a new one after fork)."""
+        if self._pid != os.getpid():
+            self._local = threading.local()
+            self._pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        self._ensure_sweeper()
+        row = self._connect().execute(
+            "SELECT data FROM sessions"
+            " WHERE session_id = ? AND expires_at > ?",
+            (session_id, time.time())
+        ).fetchone()
+        return serializer.loads(row[0]) if row else None
+
+    def email_exists(self, email: str) -> bool:
+        row = self._connect().execute(
+            "SELECT 1 FROM sessions WHERE email = ? AND expires_at > ?",
+            (email, time.time())
+        ).fetchone()
+        return row is not None
+
+    def add(self, user_data: Dict) -> Optional[str]:
+        self._ensure_sweeper()
+        session_id = str(uuid.uuid4())
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                # An expired session must not block its email
+                cursor = conn.execute(
+                    "DELETE FROM sessions WHERE email = ? AND expires_at <= ?",
+                    (user_data.get("email"), now)
+                )
+                self.evicted += cursor.rowcount
+                conn.execute(
+                    "INSERT INTO sessions"
+                    " (session_id, email, data, expires_at)"
+                    " VALUES (?, ?, ?, ?)",
+                    (session_id, user_data.get("email"),
+                     serializer.dumps(user_data), now + self.ttl)
+                )
+        except sqlite3.IntegrityError:
+            # Unique email index: another session already has this email
+            return None
+        return session_id
+
+    def sweep(self) -> int:
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "DELETE FROM sessions WHERE expires_at <= ?", (time.time(),)
+            )
+            evicted = cursor.rowcount
+            live = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        self._record_sweep(evicted, live)
+        return evicted
+
+
+def create_session_store(backend: str = SESSION_BACKEND) -> SessionStore:
+    """Return the session store configured by SESSION_BACKEND."""
+    if backend == "sqlite":
+        return SqliteSessionStore()
+    return JsonSessionStore()
@@ -0,0 +1,276 @@
+"""
+sql_repository.py
+
+SQLite-backed repositories built on the SQLAlchemy models in models.py.
+
+They expose the same interface as the JSON repositories in repository.py
+(get/get_many/get_by_email/by_subject/search/subject_stats/all/count/
+version/insert/update/commit/replace_all and lock()), so application.py can
+switch between backends with config.STORAGE_BACKEND. Records go in and
+out as the same dicts that are stored in data/*.json.
+
+Lookups are served by the indexes on students.id, students.email,
+students.subject_id and lower(subjects.name); the database runs in WAL
+journal mode (see models.py), so readers do not block the writer.
+Methods must be called inside an application context.
+"""
+
+import os
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from filelock import FileLock
+from flask import current_app
+from sqlalchemy import and_, func, or_
+from sqlalchemy.exc import SQLAlchemyError
+
+from metrics import span, timed_lock
+from models import db, Student, Subject
+
+# Keys bound per "IN (...)" query, well under SQLite's variable limit
+SQL_IN_BATCH = 500
+
+
+class SqlRepository:
+    """Base class: common plumbing for a model-backed repository."""
+
+    model = None
+    # Record field holding the primary key
+    key_field = ""
+
+    def __init__(self, lock_path: str):
+        self.lock_path = lock_path
+        self.file_path = None
+
+    def lock(self) -> FileLock:
+        """
+        Return the cross-process lock the routes hold around
+        check-then-write sequences (duplicate checks, updates).
+        """
+        os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+        return timed_lock(self.lock_path)
+
+    def _commit(self, action: str) -> bool:
+        try:
+            with span("db.commit"):
+                db.session.commit()
+            return True
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            current_app.logger.error(f"Failed to {action}: {str(e)}")
+            return False
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the record with primary key key, or None."""
+        row = db.session.get(self.model, key)
+        return row.to_dict() if row else None
+
+    def version(self) -> None:
+        """
+        Always None: the database has no cheap change counter, so data
+        derived from the table is not cached.
+        """
+        return None
+
+    def get_many(self, keys: List[str]) -> List[Optional[Dict]]:
+        """
+        Return the record (or None) for each key, in the order given,
+        with one query per SQL_IN_BATCH keys.
+        """
+        found = {}
+        distinct = list(dict.fromkeys(keys))
+        for start in range(0, len(distinct), SQL_IN_BATCH):
+            query = db.select(self.model).where(
+                self.model.id.in_(distinct[start:start + SQL_IN_BATCH])
+            )
+            for row in db.session.scalars(query):
+                found[row.id] = row.to_dict()
+        return [found.get(key) for key in keys]
+
+    def all(self) -> List[Dict]:
+        """Return all records in insertion order."""
+        query = db.select(self.model).order_by(
+            self.model.created_at, self.model.id
+        )
+        return [row.to_dict() for row in db.session.scalars(query)]
+
+    def iter_records(self, batch_size: int = 1000) -> Iterator[Dict]:
+        """
+        Yield all records in insertion order, fetching batch_size rows at
+        a time instead of materializing the whole table.
+        """
+        query = db.select(self.model).order_by(
+            self.model.created_at, self.model.id
+        ).execution_options(yield_per=batch_size)
+        for row in db.session.scalars(query):
+            yield row.to_dict()
+            # Rows already handed out need not stay in the identity map
+            db.session.expunge(row)
+
+    def count(self) -> int:
+        """Return the number of records."""
+        return db.session.scalar(
+            db.select(func.count()).select_from(self.model)
+        )
+
+    def insert(self, record: Dict) -> bool:
+        """Insert a record and commit."""
+        db.session.add(self.model.from_dict(record))
+        return self._commit(f"insert into {self.model.__tablename__}")
+
+    def insert_many(self, records: List[Dict]) -> bool:
+        """Insert several records in one transaction."""
+        db.session.add_all(self.model.from_dict(r) for r in records)
+        return self._commit(f"insert into {self.model.__tablename__}")
+
+    def commit(self, ops: List[Dict], check=None) -> bool:
+        """
+        Apply a list of mutation records in one transaction under lock().
+
+        check(repo), if given, runs first and may raise WriteConflict to
+        reject the write. There is no committer thread: SQLite already
+        makes each transaction a single WAL append.
+        """
+        with self.lock():
+            if check is not None:
+                check(self)
+            for op in ops:
+                if op.get("op") == "insert":
+                    db.session.add(self.model.from_dict(op["record"]))
+                elif op.get("op") == "update":
+                    row = db.session.get(self.model, op["key"])
+                    if row is not None:
+                        self._set_fields(row, op["changes"])
+            return self._commit(f"write to {self.model.__tablename__}")
+
+    def _set_fields(self, row, changes: Dict) -> None:
+        # Record keys match the column names apart from the primary key
+        for field, value in changes.items():
+            if field != self.key_field:
+                setattr(row, field, value)
+
+    def replace_all(self, records: List[Dict]) -> bool:
+        """Replace every row with records in one transaction."""
+        db.session.execute(db.delete(self.model))
+        db.session.add_all(self.model.from_dict(r) for r in records)
+        return self._commit(f"replace {self.model.__tablename__}")
+
+    def compact(self) -> bool:
+        """Nothing to compact; SQLite checkpoints its own WAL."""
+        return False
+
+
+class SqlStudentRepository(SqlRepository):
+    """Students stored in the students table."""
+
+    model = Student
+    key_field = "student_id"
+
+    def get_by_email(self, email: str) -> Optional[Dict]:
+        """Return the student with email (case insensitive), or None."""
+        row = db.session.scalars(
+            db.select(Student).filter_by(email=email.lower())
+        ).first()
+        return row.to_dict() if row else None
+
+    def by_subject(self, subject_id: str) -> List[Dict]:
+        """Return students enrolled in subject_id, in insertion order."""
+        query = (
+            db.select(Student)
+            .filter_by(subject_id=subject_id)
+            .order_by(Student.created_at, Student.id)
+        )
+        return [row.to_dict() for row in db.session.scalars(query)]
+
+    def page_by_subject(
+        self,
+        subject_id: str,
+        after: Optional[Tuple[str, str]],
+        limit: int
+    ) -> Tuple[List[Dict], bool]:
+        """
+        Return up to limit students of subject_id ordered by
+        (created_at, student_id), starting after the key after, and
+        whether more students follow.
+        """
+        return self.search(subject_id=subject_id, after=after, limit=limit)
+
+    def search(
+        self,
+        subject_id: Optional[str] = None,
+        min_age: Optional[int] = None,
+        max_age: Optional[int] = None,
+        email_prefix: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+        limit: int = 100
+    ) -> Tuple[List[Dict], bool]:
+        """
+        Return up to limit students matching every given filter, ordered
+        by (created_at, student_id) and starting after the key after, and
+        whether more students follow.
+        """
+        created_at = func.coalesce(Student.created_at, "")
+        query = db.select(Student)
+        if subject_id is not None:
+            query = query.filter_by(subject_id=subject_id)
+        if min_age is not None:
+            query = query.where(Student.age >= min_age)
+        if max_age is not None:
+            query = query.where(Student.age <= max_age)
+        if email_prefix is not None:
+            query = query.where(Student.email.startswith(
+                email_prefix.lower(), autoescape=True
+            ))
+        if after:
+            query = query.where(or_(
+                created_at > after[0],
+                and_(created_at == after[0], Student.id > after[1])
+            ))
+        query = query.order_by(created_at, Student.id).limit(limit + 1)
+        rows = list(db.session.scalars(query))
+        return [row.to_dict() for row in rows[:limit]], len(rows) > limit
+
+    def subject_stats(self, rebuild: bool = False) -> Dict[str, Dict]:
+        """
+        Return {subject_id: {"count": n, "ages": {age: n}}} for every
+        subject with students, aggregated by the database (rebuild is
+        accepted for interface compatibility; there is nothing cached).
+        """
+        stats: Dict[str, Dict] = {}
+        query = db.select(
+            Student.subject_id, Student.age, func.count()
+        ).group_by(Student.subject_id, Student.age)
+        for subject_id, age, count in db.session.execute(query):
+            entry = stats.setdefault(subject_id, {"count": 0, "ages": {}})
+            entry["count"] += count
+            if age is not None:
+                entry["ages"][age] = count
+        return stats
+
+    def update(self, student_id: str, changes: Dict) -> Optional[Dict]:
+        """
+        Apply changes to a student and commit.
+
+        Returns the updated record, or None if the student does not exist
+        or saving failed.
+        """
+        row = db.session.get(Student, student_id)
+        if row is None:
+            return None
+        self._set_fields(row, changes)
+        if not self._commit("update student"):
+            return None
+        return row.to_dict()
+
+
+class SqlSubjectRepository(SqlRepository):
+    """Subjects stored in the subjects table."""
+
+    model = Subject
+    key_field = "subject_id"
+
+    def get_by_name(self, name: str) -> Optional[Dict]:
+        """Return the subject named name (case insensitive), or None."""
+        row = db.session.scalars(
+            db.select(Subject).where(func.lower(Subject.name) == name.lower())
+        ).first()
+        return row.to_dict() if row else None
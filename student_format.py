@@ -0,0 +1,368 @@
+"""
+student_format.py
+
+Compact binary file format for student records (STUDENTS_FORMAT=binary),
+an alternative to data/students.json that stores the ciphertext as raw
+bytes and can be memory-mapped for lookups without parsing the file.
+
+Layout (little-endian):
+
+    header    magic "STDB", version, flags, record count, offset of the
+              key table, offset of the index
+    records   one per student: u32 body length, body
+    key table u32 count, then per RSA-wrapped data key: u16 length, bytes
+    index     per record: 16-byte key, u64 record offset; sorted by key
+
+A record body starts with a layout byte:
+
+- LAYOUT_STUDENT: records with exactly the fields the app writes
+  (student_id, name_encrypted, age, email, subject_id, created_at and
+  optionally updated_at) and UUID ids. Ids are 16 raw bytes, the age an
+  i32, the name ciphertext raw bytes with its nonce, and the RSA-wrapped
+  data key an index into the key table. Every name encrypted by a
+  process shares that one wrapped key (about 512 hex characters per
+  record in JSON).
+- LAYOUT_JSON: any other record, as JSON (serializer.py).
+
+Both layouts decode to a dict equal to the one encoded, so converting
+JSON -> binary -> JSON gives back the same records in the same order
+(LAYOUT_STUDENT fields come back in the order the app writes them).
+
+The index key is the student_id's UUID bytes, or a 16-byte BLAKE2b
+digest for an id that is not a UUID. StudentFile.get() finds a record by
+binary search over the mapped index and decodes that record only.
+"""
+
+import hashlib
+import logging
+import mmap
+import os
+import re
+import struct
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from metrics import timed
+import serializer
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"STDB"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIQQ")
+LENGTH = struct.Struct("<I")
+KEY_LENGTH = struct.Struct("<H")
+INDEX_ENTRY = struct.Struct("<16sQ")
+
+LAYOUT_JSON = 0
+LAYOUT_STUDENT = 1
+# layout, student_id + subject_id, age, key index, nonce length,
+# ciphertext length, email length, created_at length, updated_at length;
+# followed by the nonce, ciphertext, email, created_at and updated_at
+STUDENT = struct.Struct("<B32siHBHBBB")
+# A LAYOUT_STUDENT record with its length prefix
+RECORD_STUDENT = struct.Struct("<IB32siHBHBBB")
+STUDENT_KEYS = ("student_id", "name_encrypted", "age", "email",
+                "subject_id", "created_at")
+STUDENT_FIELDS = frozenset(STUDENT_KEYS)
+STUDENT_FIELDS_UPDATED = STUDENT_FIELDS | {"updated_at"}
+# Key index of a legacy (bare RSA-OAEP hex) name; no nonce or data key
+LEGACY_NAME = 0xFFFF
+# updated_at length when the record has no updated_at
+NO_UPDATED = 0xFF
+MAX_TEXT = 0xFE
+AGE_RANGE = (-2 ** 31, 2 ** 31 - 1)
+# The lowercase form uuid4() produces; anything else round-trips as JSON
+UUID_PATTERN = re.compile(
+    r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+)
+
+
+def _uuid_bytes(value) -> Optional[bytes]:
+    """Return the 16 bytes of a canonical UUID string, else None."""
+    if type(value) is not str or not UUID_PATTERN.fullmatch(value):
+        return None
+    return bytes.fromhex(value.replace("-", ""))
+
+
+def _hex_bytes(value: str) -> Optional[bytes]:
+    """Return the bytes of a lowercase hex string, else None."""
+    try:
+        data = bytes.fromhex(value)
+    except ValueError:
+        return None
+    return data if data.hex() == value else None
+
+
+def index_key(student_id) -> bytes:
+    """Return the 16-byte index key of a student_id."""
+    key = _uuid_bytes(student_id)
+    if key is None:
+        key = hashlib.blake2b(str(student_id).encode("utf-8"),
+                              digest_size=16).digest()
+    return key
+
+
+# --- Encoding ---
+
+def _split_name(value) -> Optional[Tuple[Optional[str], bytes, bytes]]:
+    """
+    Return (wrapped key hex or None, nonce, ciphertext) of a stored name.
+    The wrapped key is checked when it is added to the key table.
+    """
+    if type(value) is not str:
+        return None
+    if not value.startswith("v2:"):
+        ciphertext = _hex_bytes(value)
+        return (None, b"", ciphertext) if ciphertext else None
+    parts = value.split(":")
+    if len(parts) != 4:
+        return None
+    nonce = _hex_bytes(parts[2])
+    ciphertext = _hex_bytes(parts[3])
+    if nonce is None or ciphertext is None:
+        return None
+    return parts[1], nonce, ciphertext
+
+
+def _text(value) -> Optional[bytes]:
+    if not isinstance(value, str):
+        return None
+    data = value.encode("utf-8")
+    return data if len(data) <= MAX_TEXT else None
+
+
+def _encode_student(record: Dict, keys: Dict[str, int]) -> Optional[bytes]:
+    """Encode record with LAYOUT_STUDENT, or None if it does not fit."""
+    fields = record.keys()
+    if fields != STUDENT_FIELDS and fields != STUDENT_FIELDS_UPDATED:
+        return None
+    student_id = _uuid_bytes(record["student_id"])
+    subject_id = _uuid_bytes(record["subject_id"])
+    age = record["age"]
+    name = _split_name(record["name_encrypted"])
+    email = _text(record["email"])
+    created = _text(record["created_at"])
+    updated = _text(record["updated_at"]) if "updated_at" in record else b""
+    if (student_id is None or subject_id is None or name is None or
+            email is None or created is None or updated is None or
+            type(age) is not int or not AGE_RANGE[0] <= age <= AGE_RANGE[1]):
+        return None
+
+    wrapped, nonce, ciphertext = name
+    if wrapped is None:
+        key_index = LEGACY_NAME
+    else:
+        key_index = keys.get(wrapped)
+        if key_index is None:
+            if _hex_bytes(wrapped) is None or len(keys) >= LEGACY_NAME:
+                return None
+            key_index = keys[wrapped] = len(keys)
+    if len(nonce) > 0xFF or len(ciphertext) > 0xFFFF:
+        return None
+
+    return b"".join((
+        STUDENT.pack(
+            LAYOUT_STUDENT, student_id + subject_id, age, key_index,
+            len(nonce), len(ciphertext), len(email), len(created),
+            len(updated) if "updated_at" in record else NO_UPDATED
+        ),
+        nonce, ciphertext, email, created, updated
+    ))
+
+
+def encode_records(records: List[Dict]) -> bytes:
+    """Return the binary file contents for records."""
+    # Wrapped data key hex -> key table index
+    keys: Dict[str, int] = {}
+    chunks = [b""]  # header, filled in below
+    index = []
+    offset = HEADER.size
+    for record in records:
+        body = _encode_student(record, keys)
+        if body is None:
+            body = bytes((LAYOUT_JSON,)) + serializer.dumps_bytes(record)
+            key = index_key(record.get("student_id"))
+        else:
+            key = body[1:17]
+        chunks.append(LENGTH.pack(len(body)))
+        chunks.append(body)
+        index.append((key, offset))
+        offset += LENGTH.size + len(body)
+
+    keys_offset = offset
+    chunks.append(LENGTH.pack(len(keys)))
+    for wrapped in map(bytes.fromhex, keys):
+        chunks.append(KEY_LENGTH.pack(len(wrapped)))
+        chunks.append(wrapped)
+        offset += KEY_LENGTH.size + len(wrapped)
+    offset += LENGTH.size
+
+    index.sort()
+    chunks.extend(INDEX_ENTRY.pack(key, pos) for key, pos in index)
+    chunks[0] = HEADER.pack(MAGIC, VERSION, 0, len(records), keys_offset,
+                            offset)
+    return b"".join(chunks)
+
+
+# --- Decoding ---
+
+class StudentFile:
+    """
+    Read-only view of a binary students file, mapped into memory.
+
+    Iterating decodes every record in file order; get() looks one up by
+    student_id through the index. Use as a context manager, or close().
+    """
+
+    def __init__(self, f: BinaryIO):
+        size = os.fstat(f.fileno()).st_size
+        if size < HEADER.size:
+            raise ValueError(f"{f.name} is not a students file")
+        self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, _, self.count, self._keys_offset,
+         self._index_offset) = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f"{f.name} is not a students file "
+                             f"(version {VERSION})")
+        self._keys_hex: Optional[List[str]] = None
+
+    @classmethod
+    def open(cls, file_path: str) -> "StudentFile":
+        with open(file_path, "rb") as f:
+            return cls(f)
+
+    def close(self) -> None:
+        self._map.close()
+
+    def __enter__(self) -> "StudentFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _wrapped_keys(self) -> List[str]:
+        """Return the key table as the hex strings used in records."""
+        if self._keys_hex is None:
+            data = self._map
+            (count,) = LENGTH.unpack_from(data, self._keys_offset)
+            pos = self._keys_offset + LENGTH.size
+            keys = []
+            for _ in range(count):
+                (length,) = KEY_LENGTH.unpack_from(data, pos)
+                pos += KEY_LENGTH.size
+                keys.append(data[pos:pos + length].hex())
+                pos += length
+            self._keys_hex = keys
+        return self._keys_hex
+
+    def _decode(self, pos: int) -> Tuple[Dict, int]:
+        """Decode the record at pos; return it and the next position."""
+        data = self._map
+        if data[pos + LENGTH.size] == LAYOUT_JSON:
+            (length,) = LENGTH.unpack_from(data, pos)
+            end = pos + LENGTH.size + length
+            return serializer.loads(data[pos + LENGTH.size + 1:end]), end
+
+        (length, _, ids, age, key_index, nonce_len, ct_len, email_len,
+         created_len, updated_len) = RECORD_STUDENT.unpack_from(data, pos)
+        end = pos + LENGTH.size + length
+        ids = ids.hex()
+        pos += RECORD_STUDENT.size
+        # Nonce and ciphertext are adjacent; hex them in one go
+        name = data[pos:pos + nonce_len + ct_len].hex()
+        pos += nonce_len + ct_len
+        if key_index != LEGACY_NAME:
+            split = 2 * nonce_len
+            name = (f"v2:{self._wrapped_keys()[key_index]}:"
+                    f"{name[:split]}:{name[split:]}")
+        email = data[pos:pos + email_len].decode("utf-8")
+        pos += email_len
+        record = {
+            "student_id": (f"{ids[:8]}-{ids[8:12]}-{ids[12:16]}-"
+                           f"{ids[16:20]}-{ids[20:32]}"),
+            "name_encrypted": name,
+            "age": age,
+            "email": email,
+            "subject_id": (f"{ids[32:40]}-{ids[40:44]}-{ids[44:48]}-"
+                           f"{ids[48:52]}-{ids[52:]}"),
+            "created_at": data[pos:pos + created_len].decode("utf-8")
+        }
+        if updated_len != NO_UPDATED:
+            pos += created_len
+            record["updated_at"] = data[pos:pos + updated_len].decode("utf-8")
+        return record, end
+
+    def __iter__(self) -> Iterator[Dict]:
+        decode = self._decode
+        pos = HEADER.size
+        for _ in range(self.count):
+            record, pos = decode(pos)
+            yield record
+
+    def offset_of(self, student_id: str) -> Optional[int]:
+        """Return the file offset of a student's record, or None."""
+        key = index_key(student_id)
+        data = self._map
+        base = self._index_offset
+        size = INDEX_ENTRY.size
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if data[base + mid * size:base + mid * size + 16] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        # Non-UUID ids can share a digest in theory; check every match
+        while lo < self.count:
+            entry_key, offset = INDEX_ENTRY.unpack_from(data, base + lo * size)
+            if entry_key != key:
+                return None
+            record, _ = self._decode(offset)
+            if record.get("student_id") == student_id:
+                return offset
+            lo += 1
+        return None
+
+    def get(self, student_id: str) -> Optional[Dict]:
+        """Return the student with student_id, decoding only that record."""
+        offset = self.offset_of(student_id)
+        return None if offset is None else self._decode(offset)[0]
+
+
+# --- Files ---
+
+@timed("students.load")
+def load_students_binary(file_path: str) -> List[Dict]:
+    """Load students from a binary file or return an empty list."""
+    try:
+        with StudentFile.open(file_path) as students:
+            return list(students)
+    except FileNotFoundError:
+        return []
+
+
+@timed("students.save")
+def save_students_binary(students: List[Dict], file_path: str) -> bool:
+    """Save students to a binary file atomically using a temporary file."""
+    temp_path = f"{file_path}.tmp"
+    try:
+        data = encode_records(students)
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, file_path)
+        return True
+    except Exception as e:
+        logger.error(f"Failed to save students: {str(e)}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
+
+
+def iter_students_binary(f: BinaryIO) -> Iterator[Dict]:
+    """Yield the students of an open binary file in file order."""
+    with StudentFile(f) as students:
+        yield from students
@@ -0,0 +1,70 @@
+"""
+Shared fixtures for the test suite.
+
+Run from the repository root with: python -m pytest tests
+"""
+
+import os
+import shutil
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+# config.py reads these at import time
+os.environ.setdefault("API_KEY", "test-api-key")
+os.environ.setdefault("SECRET_SESSION_KEY", "test-secret")
+
+
+def make_student(n: int, subject_id: str = "subject-1", **fields) -> dict:
+    """Return a student record numbered n."""
+    return {
+        "student_id": f"student-{n:05d}",
+        "name_encrypted": "",
+        "age": 18 + n % 50,
+        "email": f"student{n}@example.com",
+        "subject_id": subject_id,
+        "created_at": f"2025-01-01T00:00:{n % 60:02d}.{n:06d}",
+        **fields
+    }
+
+
+@pytest.fixture
+def students_path(tmp_path):
+    """Path of an empty students file in a fresh data directory."""
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    return str(data_dir / "students.json")
+
+
+@pytest.fixture(scope="session")
+def app_dir(tmp_path_factory):
+    """
+    A copy of the data files to run the application in. The app uses
+    paths relative to the working directory, so the session runs there.
+    """
+    root = tmp_path_factory.mktemp("app")
+    shutil.copytree(os.path.join(REPO_DIR, "data"), root / "data")
+    cwd = os.getcwd()
+    os.chdir(root)
+    yield root
+    os.chdir(cwd)
+
+
+@pytest.fixture(scope="session")
+def app_module(app_dir):
+    """The application module, imported inside app_dir."""
+    import application
+    return application
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.application.test_client()
+
+
+@pytest.fixture
+def api_headers():
+    return {"x-api-key": os.environ["API_KEY"]}
@@ -0,0 +1,118 @@
+"""The ASGI adapter in asgi.py, driven without a server."""
+
+import asyncio
+import json
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def asgi(app_module):
+    import asgi
+    return asgi
+
+
+def call(app, scope, messages, disconnect_after_body=False):
+    """
+    Run one ASGI call; receive() hands out messages, then blocks (or
+    reports a disconnect). Return the messages sent.
+    """
+    sent = []
+
+    async def run():
+        pending = list(messages)
+        gone = asyncio.Event()
+
+        async def receive():
+            if pending:
+                return pending.pop(0)
+            if not disconnect_after_body:
+                await gone.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        await app(scope, receive, send)
+
+    asyncio.run(run())
+    return sent
+
+
+def http_scope(method, path, headers=()):
+    return {
+        "type": "http", "method": method, "path": path,
+        "query_string": b"", "root_path": "", "scheme": "http",
+        "http_version": "1.1", "server": ("testserver", 80),
+        "client": ("127.0.0.1", 50000),
+        "headers": [(k.encode("latin-1"), v.encode("latin-1"))
+                    for k, v in headers]
+    }
+
+
+def test_chunked_request_body(asgi, app_module, api_headers):
+    name = f"Chunked {uuid.uuid4().hex}"
+    body = json.dumps({"subject_name": name}).encode()
+    parts = [body[:5], body[5:12], body[12:]]
+    messages = [{"type": "http.request", "body": part, "more_body": True}
+                for part in parts[:-1]]
+    messages.append({"type": "http.request", "body": parts[-1]})
+    scope = http_scope("POST", "/add_subject", [
+        ("content-type", "application/json"),
+        ("x-api-key", api_headers["x-api-key"]),
+    ])
+
+    sent = call(asgi.app, scope, messages)
+
+    assert sent[0]["type"] == "http.response.start"
+    assert sent[0]["status"] == 201
+    assert app_module.subjects_repo.get_by_name(name) is not None
+
+
+def test_streamed_ndjson_response(asgi, app_module, api_headers,
+                                  monkeypatch):
+    # One line per chunk
+    monkeypatch.setattr(app_module, "STREAM_CHUNK_SIZE", 1)
+    scope = http_scope("GET", "/students/export",
+                       [("x-api-key", api_headers["x-api-key"])])
+
+    sent = call(asgi.app, scope, [{"type": "http.request", "body": b""}])
+
+    start, *bodies = sent
+    assert start["status"] == 200
+    assert (b"content-type", b"application/x-ndjson") in start["headers"]
+    assert all(m["more_body"] for m in bodies[:-1])
+    assert not bodies[-1].get("more_body")
+    lines = b"".join(m["body"] for m in bodies).splitlines()
+    students = app_module.students_repo.all()
+    assert len(bodies) == len(students) + 1
+    assert [json.loads(line)["student_id"] for line in lines] == [
+        s["student_id"] for s in students
+    ]
+
+
+def test_streaming_stops_when_the_client_disconnects(asgi, app_module,
+                                                     api_headers,
+                                                     monkeypatch):
+    monkeypatch.setattr(app_module, "STREAM_CHUNK_SIZE", 1)
+    assert app_module.students_repo.count() > 2
+    scope = http_scope("GET", "/students/export",
+                       [("x-api-key", api_headers["x-api-key"])])
+
+    sent = call(asgi.app, scope, [{"type": "http.request", "body": b""}],
+                disconnect_after_body=True)
+
+    assert sent[0]["status"] == 200
+    assert len(sent) - 1 < app_module.students_repo.count()
+
+
+def test_lifespan_events(asgi, app_module):
+    app = asgi.WsgiToAsgi(app_module.application, threads=1)
+    sent = call(app, {"type": "lifespan"}, [
+        {"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}
+    ])
+
+    assert [m["type"] for m in sent] == [
+        "lifespan.startup.complete", "lifespan.shutdown.complete"
+    ]
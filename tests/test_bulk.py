@@ -0,0 +1,63 @@
+"""POST /students/bulk."""
+
+import uuid
+
+
+def test_bulk_reports_each_rejected_row(app_module, client, api_headers):
+    subject_id = app_module.subjects_repo.all()[0]["subject_id"]
+    stored = app_module.students_repo.all()[0]["email"]
+    email = f"bulk-{uuid.uuid4().hex}@example.com"
+    rows = [
+        {"name": "One", "age": 20, "email": email, "subject_id": subject_id},
+        {"name": "Two", "age": 21, "email": email, "subject_id": subject_id},
+        {"name": "Three", "age": 22, "email": stored,
+         "subject_id": subject_id},
+        {"name": "Four", "age": 23, "email": f"x{email}",
+         "subject_id": "no-such-subject"},
+    ]
+
+    response = client.post("/students/bulk", json=rows, headers=api_headers)
+
+    assert response.status_code == 200
+    assert response.json["created"] == 1
+    assert [r.get("error") for r in response.json["results"]] == [
+        None, "Duplicate email in batch", "Email already exists",
+        "Invalid subject_id"
+    ]
+
+
+def test_bulk_rechecks_subject_under_lock(app_module, client, api_headers,
+                                          monkeypatch):
+    subjects = app_module.subjects_repo
+    response = client.post("/add_subject", headers=api_headers,
+                           json={"subject_name": f"Bulk {uuid.uuid4().hex}"})
+    removed = response.json["subject_id"]
+    kept = subjects.all()[0]["subject_id"]
+    encrypt = app_module.encrypt_name_fields
+
+    def encrypt_then_remove_subject(names, public_key):
+        # The subject disappears between validation and the write
+        encrypted = encrypt(names, public_key)
+        with subjects.lock():
+            subjects.replace_all(
+                [s for s in subjects.all() if s["subject_id"] != removed]
+            )
+        return encrypted
+
+    monkeypatch.setattr(app_module, "encrypt_name_fields",
+                        encrypt_then_remove_subject)
+    tag = uuid.uuid4().hex
+    rows = [
+        {"name": "Gone", "age": 20, "email": f"gone-{tag}@example.com",
+         "subject_id": removed},
+        {"name": "Kept", "age": 20, "email": f"kept-{tag}@example.com",
+         "subject_id": kept},
+    ]
+
+    response = client.post("/students/bulk", json=rows, headers=api_headers)
+
+    assert response.json["created"] == 1
+    assert response.json["results"][0]["error"] == "Invalid subject_id"
+    assert response.json["results"][1]["status"] == "created"
+    assert app_module.students_repo.get_by_email(f"gone-{tag}@example.com") \
+        is None
@@ -0,0 +1,59 @@
+"""Caches in one process see writes made by another (forked) process."""
+
+import os
+
+import pytest
+
+import generation
+import repository
+import session_store
+from conftest import make_student
+from repository import StudentRepository, SubjectRepository
+from session_store import JsonSessionStore
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+@pytest.mark.parametrize("coherence", ["generation", "stat"])
+def test_parent_sees_writes_of_a_forked_writer(coherence, tmp_path,
+                                               monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(generation, "CACHE_COHERENCE", coherence)
+    # Far beyond the test: only the counter or the file checks can help
+    monkeypatch.setattr(repository, "CACHE_RECHECK_INTERVAL", 3600.0)
+    monkeypatch.setattr(session_store, "CACHE_RECHECK_INTERVAL", 3600.0)
+    os.makedirs("data")
+    students = StudentRepository("data/students.json", mode="json",
+                                 fmt="json")
+    subjects = SubjectRepository("data/subjects.json", mode="json")
+    sessions = JsonSessionStore(sweep_interval=0)
+    assert (students._generation is None) == (coherence == "stat")
+    # Warm every cache before the other process writes
+    assert students.count() == 0
+    assert subjects.get_by_name("Forked") is None
+    assert not sessions.email_exists("forked@example.com")
+
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            os.close(read_end)
+            with students.lock():
+                students.insert(make_student(1))
+            with subjects.lock():
+                subjects.insert({"subject_id": "subject-forked",
+                                 "subject_name": "Forked"})
+            session_id = sessions.add({"email": "forked@example.com"})
+            os.write(write_end, session_id.encode())
+            status = 0
+        finally:
+            os._exit(status)
+    os.close(write_end)
+    session_id = os.read(read_end, 100).decode()
+    os.close(read_end)
+    assert os.waitpid(pid, 0)[1] == 0
+
+    assert students.get("student-00001") == make_student(1)
+    assert students.count() == 1
+    assert subjects.get_by_name("forked")["subject_id"] == "subject-forked"
+    assert sessions.get(session_id) == {"email": "forked@example.com"}
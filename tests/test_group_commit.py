@@ -0,0 +1,119 @@
+"""Group commit: commit()/submit() and the write routes that use them."""
+
+import contextvars
+import json
+import os
+import threading
+import uuid
+from collections import Counter
+from concurrent.futures import Future
+
+import pytest
+
+import repository
+from conftest import make_student
+from repository import StudentRepository, WriteConflict
+
+
+def email_check(email, student_id):
+    def check(repo):
+        other = repo.get_by_email(email)
+        if other and other.get("student_id") != student_id:
+            raise WriteConflict("Email already exists")
+    return check
+
+
+def test_batch_reuses_an_email_released_earlier_in_it(students_path):
+    repo = StudentRepository(students_path, mode="json", fmt="json")
+    with repo.lock():
+        assert repo.insert(make_student(0, email="old@example.com"))
+    writes = [
+        ([{"op": "update", "key": "student-00000",
+           "changes": {"email": "new@example.com"}}],
+         email_check("new@example.com", "student-00000")),
+        ([{"op": "insert",
+           "record": make_student(1, email="old@example.com")}],
+         email_check("old@example.com", "student-00001")),
+        ([{"op": "insert",
+           "record": make_student(2, email="new@example.com")}],
+         email_check("new@example.com", "student-00002")),
+    ]
+    batch = [(ops, check, Future(), contextvars.copy_context())
+             for ops, check in writes]
+
+    repo._commit_batch(batch)
+
+    futures = [future for _, _, future, _ in batch]
+    assert futures[0].result() is True
+    assert futures[1].result() is True
+    with pytest.raises(WriteConflict):
+        futures[2].result()
+    assert repo.get_by_email("old@example.com")["student_id"] == \
+        "student-00001"
+    assert repo.get_by_email("new@example.com")["student_id"] == \
+        "student-00000"
+    assert repo.count() == 2
+
+
+def test_concurrent_duplicate_adds_create_one_student_per_email(
+        app_module, api_headers):
+    subject_id = app_module.subjects_repo.all()[0]["subject_id"]
+    tag = uuid.uuid4().hex
+    emails = [f"dup{n}-{tag}@example.com" for n in range(4)]
+    attempts = 6
+    statuses = Counter()
+    start = threading.Barrier(len(emails) * attempts)
+
+    def add(email):
+        client = app_module.application.test_client()
+        start.wait()
+        response = client.post("/add_student", headers=api_headers, json={
+            "name": "Dup", "age": 20, "email": email,
+            "subject_id": subject_id
+        })
+        statuses[(email, response.status_code)] += 1
+
+    threads = [threading.Thread(target=add, args=(email,))
+               for email in emails for _ in range(attempts)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for email in emails:
+        assert statuses[(email, 201)] == 1
+        assert statuses[(email, 409)] == attempts - 1
+    students = app_module.students_repo
+    with open(students.file_path) as f:
+        assert students.count() == len(json.load(f))
+
+
+def test_wal_commit_is_fsynced_before_the_future_resolves(students_path,
+                                                          monkeypatch):
+    repo = StudentRepository(students_path, mode="wal", fmt="json")
+    # Leave the fsync to commit(), not to the append's own batching
+    monkeypatch.setattr(repository, "WAL_FSYNC_BATCH", 10 ** 6)
+    monkeypatch.setattr(repository, "WAL_FSYNC_INTERVAL", 3600.0)
+    synced = []
+    fsync = os.fsync
+
+    def recording_fsync(fd):
+        fsync(fd)
+        if os.readlink(f"/proc/self/fd/{fd}") == \
+                os.path.realpath(repo.wal_path):
+            with open(repo.wal_path, "rb") as f:
+                synced.append(f.read())
+
+    monkeypatch.setattr(repository.os, "fsync", recording_fsync)
+    seen_at_resolution = []
+    record = make_student(7)
+
+    future = repo.submit([{"op": "insert", "record": record}])
+    future.add_done_callback(
+        lambda _: seen_at_resolution.append(list(synced))
+    )
+
+    assert future.result() is True
+    assert any(record["student_id"].encode() in data
+               for data in seen_at_resolution[0])
+    assert repo._unsynced == 0
@@ -0,0 +1,76 @@
+"""StudentRepository.search() against a brute-force filter."""
+
+import itertools
+
+import pytest
+
+from conftest import make_student
+from repository import StudentRepository, page_key
+
+
+@pytest.fixture
+def repo(students_path):
+    repo = StudentRepository(students_path, mode="json", fmt="json")
+    records = [make_student(n, subject_id=f"subject-{n % 3}",
+                            email=f"{'ab'[n % 2]}{n}@example.com")
+               for n in range(120)]
+    # Equal created_at values are ordered by student_id
+    records[5]["created_at"] = records[6]["created_at"]
+    records[7]["age"] = "unknown"
+    assert repo.replace_all(records)
+    return repo
+
+
+def expected(repo, subject_id=None, min_age=None, max_age=None,
+             email_prefix=None):
+    found = []
+    for r in repo.all():
+        age = r["age"]
+        if subject_id is not None and r["subject_id"] != subject_id:
+            continue
+        if (min_age is not None or max_age is not None) and (
+                type(age) is not int or
+                (min_age is not None and age < min_age) or
+                (max_age is not None and age > max_age)):
+            continue
+        if email_prefix is not None and \
+                not r["email"].lower().startswith(email_prefix.lower()):
+            continue
+        found.append(r)
+    return sorted(found, key=page_key)
+
+
+def all_pages(repo, limit, **filters):
+    pages, after = [], None
+    while True:
+        page, has_more = repo.search(after=after, limit=limit, **filters)
+        pages.extend(page)
+        if not has_more:
+            return pages
+        after = page_key(page[-1])
+
+
+@pytest.mark.parametrize("subject_id, ages, email_prefix", itertools.product(
+    [None, "subject-1", "no-such-subject"],
+    [(None, None), (20, None), (None, 30), (25, 40)],
+    [None, "a", "B1", "zzz"]
+))
+def test_search_matches_brute_force(repo, subject_id, ages, email_prefix):
+    filters = {"subject_id": subject_id, "min_age": ages[0],
+               "max_age": ages[1], "email_prefix": email_prefix}
+
+    assert all_pages(repo, 7, **filters) == expected(repo, **filters)
+
+
+def test_unfiltered_pages_follow_writes(repo):
+    # Build the page-order index, so the writes update it in place
+    repo.search(limit=1)
+    with repo.lock():
+        assert repo.insert(make_student(500, created_at="2000-01-01"))
+        assert repo.update("student-00010", {"created_at": "2100-01-01"})
+
+    pages = all_pages(repo, 25)
+
+    assert pages == expected(repo)
+    assert pages[0]["student_id"] == "student-00500"
+    assert pages[-1]["student_id"] == "student-00010"
@@ -0,0 +1,63 @@
+"""serializer.py: every backend round-trips the existing data files."""
+
+import glob
+import json
+import os
+
+import pytest
+
+import serializer
+from conftest import REPO_DIR
+from config import SESSION_FILE
+
+DATA_FILES = sorted(glob.glob(os.path.join(REPO_DIR, "data", "*.json"))) + [
+    os.path.join(REPO_DIR, SESSION_FILE)
+]
+BACKENDS = ["stdlib", pytest.param("orjson", marks=pytest.mark.skipif(
+    serializer.orjson is None, reason="orjson is not installed"
+))]
+
+
+def reference(path):
+    with open(path, "rb") as f:
+        return json.load(f)
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, monkeypatch):
+    monkeypatch.setattr(serializer, "BACKEND", request.param)
+    return request.param
+
+
+@pytest.mark.parametrize("path", DATA_FILES, ids=os.path.basename)
+def test_round_trip_matches_stdlib_parse(backend, path):
+    data = serializer.load_file(path)
+
+    assert data == reference(path)
+    assert serializer.loads(serializer.dumps(data)) == reference(path)
+    assert serializer.loads(serializer.dumps_bytes(data)) == reference(path)
+
+
+@pytest.mark.parametrize("indent", [0, 4])
+@pytest.mark.parametrize("path", DATA_FILES, ids=os.path.basename)
+def test_written_layouts_read_back(backend, path, indent, tmp_path):
+    written = str(tmp_path / "out.json")
+
+    serializer.write_file(serializer.load_file(path), written, indent)
+
+    assert serializer.load_file(written) == reference(path)
+    # Readable by the stdlib whichever backend wrote it
+    assert reference(written) == reference(path)
+
+
+@pytest.mark.skipif(serializer.orjson is None,
+                    reason="orjson is not installed")
+@pytest.mark.parametrize("path", DATA_FILES, ids=os.path.basename)
+def test_backends_write_identical_compact_files(path, monkeypatch):
+    data = reference(path)
+    output = set()
+    for name in ("stdlib", "orjson"):
+        monkeypatch.setattr(serializer, "BACKEND", name)
+        output.add(serializer.dumps_bytes(data))
+
+    assert len(output) == 1
@@ -0,0 +1,85 @@
+"""Binary students files (student_format.py) and their cold lookups."""
+
+import os
+
+import pytest
+
+import serializer
+from conftest import REPO_DIR, make_student
+from repository import StudentRepository
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return {"json": str(tmp_path / "students.json"),
+            "binary": str(tmp_path / "students.bin")}
+
+
+def test_convert_students_round_trips_byte_for_byte(app_module, paths,
+                                                    monkeypatch):
+    records = serializer.load_file(
+        os.path.join(REPO_DIR, "data", "students.json")
+    )
+    # The layout the JSON saver writes
+    serializer.write_file(records, paths["json"])
+    with open(paths["json"], "rb") as f:
+        original = f.read()
+    monkeypatch.setattr(app_module, "STUDENTS_PATHS", paths)
+    runner = app_module.application.test_cli_runner()
+
+    result = runner.invoke(args=["convert-students", "--to", "binary"])
+    assert result.exit_code == 0, result.output
+    os.remove(paths["json"])
+    result = runner.invoke(args=["convert-students", "--to", "json"])
+    assert result.exit_code == 0, result.output
+
+    with open(paths["json"], "rb") as f:
+        assert f.read() == original
+
+
+def test_cold_lookups_do_not_load_the_store(paths, monkeypatch):
+    records = [make_student(n, student_id=f"{n:08d}-0000-4000-8000-"
+                            f"{n:012d}") for n in range(50)]
+    StudentRepository(paths["binary"], mode="wal",
+                      fmt="binary").replace_all(records)
+    # Another process's writes, still in the log
+    writer = StudentRepository(paths["binary"], mode="wal", fmt="binary")
+    added = make_student(99, student_id="new-student")
+    with writer.lock():
+        assert writer.insert(added)
+        assert writer.update(records[3]["student_id"], {"age": 99})
+
+    repo = StudentRepository(paths["binary"], mode="wal", fmt="binary")
+
+    def no_full_load():
+        raise AssertionError("the store was loaded")
+
+    monkeypatch.setattr(repo, "_reload", no_full_load)
+
+    assert repo.get(records[10]["student_id"]) == records[10]
+    assert repo.get("missing") is None
+    assert repo.get_many([records[3]["student_id"], "missing",
+                          "new-student"]) == [
+        {**records[3], "age": 99}, None, added
+    ]
+    assert repo.count() == 51
+    assert not repo._loaded
+    assert repo._cold is not None
+
+
+def test_full_load_releases_the_cold_mapping(paths):
+    records = [make_student(n) for n in range(5)]
+    StudentRepository(paths["binary"], mode="json",
+                      fmt="binary").replace_all(records)
+    repo = StudentRepository(paths["binary"], mode="json", fmt="binary")
+    assert repo.get(records[0]["student_id"]) == records[0]
+    mapping = repo._cold["students"]
+
+    assert len(repo.all()) == 5
+
+    assert repo._cold is None
+    with pytest.raises(ValueError):
+        mapping.get(records[0]["student_id"])
+    assert repo.get_many([records[1]["student_id"], "missing"]) == [
+        records[1], None
+    ]